@@ -0,0 +1,192 @@
+# backend/activities/analytics.py - Check-in arrival-time analytics (NumPy)
+"""
+How early or late do people check in relative to ``Activity.start_time``?
+
+Arrival offsets (minutes, negative = early) of QR check-ins are pulled for
+a set of activities with a single ``values_list`` query and summarized with vectorized
+NumPy operations: percentiles, a fixed-width histogram, early / on-time / late
+shares overall and per activity category, and the check-in window the data
+actually supports compared with the one ``is_qr_checkin_allowed`` enforces.
+
+Offsets of completed activities don't change any more, so they are cached
+per activity (a float32 array each) and only in-progress activities are read
+from the database on every request. The cache is dropped whenever attendance
+for the activity changes (see signals.py).
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Attendance
+
+# v2: offsets cached before manual marks were excluded are not reused
+CACHE_KEY = 'analytics:arrival:v2:{}'
+
+# is_qr_checkin_allowed: from 30 minutes before to 2 hours after start
+CURRENT_WINDOW = (-30, 120)
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+
+def _cache_key(activity_id):
+    return CACHE_KEY.format(activity_id)
+
+
+def invalidate_arrival_offsets(*activity_ids):
+    cache.delete_many([_cache_key(activity_id) for activity_id in activity_ids])
+
+
+def _fetch_offsets(activity_ids):
+    """Arrival offsets in minutes per activity, from one values_list query
+
+    Only QR check-ins count: a manual or bulk mark's timestamp is when the
+    instructor marked it, not when the student arrived.
+    """
+    rows = Attendance.objects.filter(
+        activity_id__in=activity_ids, status='present', verification_method='qr_code'
+    ).values_list('activity_id', 'activity__start_time', 'timestamp')
+
+    offsets = {activity_id: np.empty(0, dtype=np.float32) for activity_id in activity_ids}
+    if not rows:
+        return offsets
+
+    ids, starts, timestamps = zip(*rows)
+    ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+    starts = np.fromiter((value.timestamp() for value in starts), dtype=np.float64, count=len(ids))
+    timestamps = np.fromiter((value.timestamp() for value in timestamps), dtype=np.float64, count=len(ids))
+    minutes = ((timestamps - starts) / 60).astype(np.float32)
+
+    # Group by activity: sort once, then split at the boundaries
+    order = np.argsort(ids, kind='stable')
+    unique_ids, first_index = np.unique(ids[order], return_index=True)
+    for activity_id, chunk in zip(unique_ids.tolist(), np.split(minutes[order], first_index[1:])):
+        offsets[activity_id] = chunk
+    return offsets
+
+
+def load_arrival_offsets(activities):
+    """Offsets per activity id, served from the cache for completed activities
+
+    Returns ``(offsets, cached_count)``.
+    """
+    completed = {activity.id for activity in activities if activity.status == 'completed'}
+    cached = cache.get_many([_cache_key(activity_id) for activity_id in completed])
+    offsets = {
+        activity_id: cached[_cache_key(activity_id)]
+        for activity_id in completed
+        if _cache_key(activity_id) in cached
+    }
+
+    missing = [activity.id for activity in activities if activity.id not in offsets]
+    if missing:
+        fetched = _fetch_offsets(missing)
+        offsets.update(fetched)
+        cache.set_many(
+            {_cache_key(activity_id): fetched[activity_id] for activity_id in missing if activity_id in completed},
+            settings.ARRIVAL_ANALYTICS_CACHE_TIMEOUT,
+        )
+    return offsets, len(offsets) - len(missing)
+
+
+def arrival_categories(offsets):
+    """Early / on time / late counts for an array of offsets"""
+    early = int(np.count_nonzero(offsets < -settings.ARRIVAL_EARLY_MINUTES))
+    late = int(np.count_nonzero(offsets > settings.ARRIVAL_LATE_MINUTES))
+    return {
+        'early': early,
+        'on_time': int(offsets.size) - early - late,
+        'late': late,
+    }
+
+
+def _shares(counts, total):
+    return {key: round(value / total, 4) if total else 0.0 for key, value in counts.items()}
+
+
+def summarize_offsets(offsets, histogram=True):
+    """Vectorized summary of an array of arrival offsets (minutes)"""
+    count = int(offsets.size)
+    categories = arrival_categories(offsets)
+    summary = {
+        'count': count,
+        'categories': categories,
+        'category_shares': _shares(categories, count),
+    }
+    if not count:
+        return summary
+
+    percentiles = np.percentile(offsets, PERCENTILES)
+    summary.update({
+        'mean_minutes': round(float(offsets.mean()), 2),
+        'std_minutes': round(float(offsets.std()), 2),
+        'percentiles': {f'p{p}': round(float(value), 2) for p, value in zip(PERCENTILES, percentiles)},
+    })
+
+    if histogram:
+        bin_minutes = settings.ARRIVAL_HISTOGRAM_BIN_MINUTES
+        low, high = settings.ARRIVAL_HISTOGRAM_RANGE
+        edges = np.arange(low, high + bin_minutes, bin_minutes)
+        counts, _ = np.histogram(offsets, bins=edges)
+        summary['histogram'] = {
+            'bin_minutes': bin_minutes,
+            'edges': edges.tolist(),
+            'counts': counts.tolist(),
+            'below_range': int(np.count_nonzero(offsets < low)),
+            'above_range': int(np.count_nonzero(offsets >= edges[-1])),
+        }
+
+        # The window that would have admitted 95% of arrivals, rounded out to whole bins
+        p_low, p_high = np.percentile(offsets, (2.5, 97.5))
+        opens, closes = CURRENT_WINDOW
+        inside = np.count_nonzero((offsets >= opens) & (offsets <= closes))
+        summary['checkin_window'] = {
+            'current': {'opens_minutes': opens, 'closes_minutes': closes,
+                        'coverage': round(inside / count, 4)},
+            'suggested': {
+                'opens_minutes': int(np.floor(p_low / bin_minutes) * bin_minutes),
+                'closes_minutes': int(np.ceil(p_high / bin_minutes) * bin_minutes),
+                'coverage': 0.95,
+            },
+        }
+    return summary
+
+
+def arrival_analytics(activities):
+    """Arrival-time analytics for a list of activities (with ``category`` loaded)"""
+    offsets, cached_count = load_arrival_offsets(activities)
+
+    # Activity category labels, one per offset, for the per-category breakdown
+    by_category = defaultdict(list)
+    per_activity = []
+    for activity in activities:
+        activity_offsets = offsets[activity.id]
+        category = activity.category.name if activity.category else 'Uncategorized'
+        by_category[category].append(activity_offsets)
+        per_activity.append({
+            'activity_id': activity.id,
+            'title': activity.title,
+            'category': category,
+            'status': activity.status,
+            'count': int(activity_offsets.size),
+            'median_minutes': round(float(np.median(activity_offsets)), 2) if activity_offsets.size else None,
+            'late_share': round(
+                float(np.count_nonzero(activity_offsets > settings.ARRIVAL_LATE_MINUTES)) / activity_offsets.size, 4
+            ) if activity_offsets.size else None,
+        })
+
+    all_offsets = np.concatenate(list(offsets.values())) if offsets else np.empty(0, dtype=np.float32)
+    return {
+        'thresholds': {
+            'early_before_minutes': -settings.ARRIVAL_EARLY_MINUTES,
+            'late_after_minutes': settings.ARRIVAL_LATE_MINUTES,
+        },
+        'activities_analyzed': len(activities),
+        'activities_from_cache': cached_count,
+        'overall': summarize_offsets(all_offsets),
+        'by_category': {
+            category: summarize_offsets(np.concatenate(arrays), histogram=False)
+            for category, arrays in sorted(by_category.items())
+        },
+        'by_activity': per_activity,
+    }
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0005_activity_qr_code_attendance_qr_code_used'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0006_attendance_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='qr_rotation_enabled',
+            field=models.BooleanField(default=False, help_text='Only accept rotating signed QR tokens; the static qr_code is rejected'),
+        ),
+    ]
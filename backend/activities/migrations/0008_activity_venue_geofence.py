@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0007_activity_qr_rotation_enabled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='geofence_radius_m',
+            field=models.PositiveIntegerField(blank=True, help_text='Reject check-ins scanned farther than this from the venue (meters)', null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='venue_latitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='activity',
+            name='venue_longitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_qr_checkins(apps, schema_editor):
+    Attendance = apps.get_model('activities', 'Attendance')
+    Attendance.objects.filter(qr_code_used__isnull=False).exclude(qr_code_used='').update(verification_method='qr_code')
+
+
+def unmark_qr_checkins(apps, schema_editor):
+    Attendance = apps.get_model('activities', 'Attendance')
+    Attendance.objects.filter(verification_method='qr_code').update(verification_method='manual')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0008_activity_venue_geofence'),
+        ('attendance', '0006_qrscanlog_geofence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.useragent'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='client_address',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.clientaddress'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='qr_code',
+            field=models.ForeignKey(blank=True, help_text='Per-session QR code used for check-in (if applicable)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='attendance.activityqrcode'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='qr_scanned_at',
+            field=models.DateTimeField(blank=True, help_text='When QR was scanned', null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='verification_method',
+            field=models.CharField(choices=[('qr_code', 'QR Code'), ('manual', 'Manual Entry')], default='manual', max_length=20),
+        ),
+        migrations.RunPython(mark_qr_checkins, unmark_qr_checkins),
+    ]
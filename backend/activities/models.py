@@ -1,5 +1,9 @@
 # backend/activities/models.py - Complete Fixed Version
 from django.db import models
+from django.db.models import (
+    Case, Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
@@ -46,6 +50,10 @@ class Activity(models.Model):
     # QR Code for attendance
     qr_code = models.CharField(max_length=100, unique=True, blank=True, null=True, 
                               help_text="QR code for attendance marking")
+    qr_rotation_enabled = models.BooleanField(
+        default=False,
+        help_text="Only accept rotating signed QR tokens; the static qr_code is rejected"
+    )
     
     # Enhanced fields for coordinator functionality
     category = models.ForeignKey(
@@ -63,6 +71,15 @@ class Activity(models.Model):
     is_virtual = models.BooleanField(default=False)
     virtual_link = models.URLField(blank=True, help_text="Zoom, Teams, or other virtual meeting link")
     
+    # Venue geofence for QR check-in (optional; see attendance/geofence.py)
+    venue_latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    venue_longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    geofence_radius_m = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Reject check-ins scanned farther than this from the venue (meters)"
+    )
+    
     # Timing
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
@@ -225,6 +242,39 @@ class Activity(models.Model):
             'draft': queryset.filter(status='draft').count(),
         }
     
+    @classmethod
+    def with_attendance_summary(cls, queryset=None):
+        """Annotate attendance figures as correlated subqueries (no per-row queries)
+
+        Each count is its own subquery so the enrollment and attendance joins
+        never multiply each other's rows.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+
+        def count_of(model, **filters):
+            rows = model.objects.filter(activity=OuterRef('pk'), **filters).order_by()
+            return Coalesce(
+                Subquery(rows.values('activity').annotate(total=Count('pk')).values('total')[:1]),
+                Value(0),
+            )
+
+        return queryset.annotate(
+            attendance_marked=Exists(Attendance.objects.filter(activity=OuterRef('pk'))),
+            enrolled_total=count_of(Enrollment, status__in=['enrolled', 'completed']),
+            present_count=count_of(Attendance, status='present'),
+            absent_count=count_of(Attendance, status='absent'),
+        ).annotate(
+            attendance_rate=Case(
+                When(enrolled_total=0, then=Value(0.0)),
+                default=ExpressionWrapper(
+                    F('present_count') * 100.0 / F('enrolled_total'),
+                    output_field=FloatField(),
+                ),
+                output_field=FloatField(),
+            ),
+        )
+
     @classmethod
     def export_activities(cls, queryset=None):
         """Export activities to list of dictionaries - fixes export functionality"""
@@ -358,48 +408,66 @@ class Enrollment(models.Model):
         return f"{self.user} - {self.activity.title} ({self.status})"
 
 class Attendance(models.Model):
+    """The single attendance table
+    
+    attendance.models.Attendance is a compatibility view of these same rows
+    with the QR check-in field names (student, verified_by, checked_in_at).
+    """
     STATUS_CHOICES = [
         ('present', 'Present'),
         ('absent', 'Absent'),
         ('excused', 'Excused'),
     ]
+    VERIFICATION_CHOICES = [
+        ('qr_code', 'QR Code'),
+        ('manual', 'Manual Entry'),
+    ]
     
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_attendance_records')
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='activity_attendance_records')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES)
     marked_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='attendance_marked_by_user')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     notes = models.TextField(blank=True)
+    verification_method = models.CharField(max_length=20, choices=VERIFICATION_CHOICES, default='manual')
     
     # QR Code verification
     qr_code_used = models.CharField(max_length=100, blank=True, null=True,
                                    help_text="QR code that was scanned for this attendance")
+    qr_code = models.ForeignKey(
+        'attendance.ActivityQRCode',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        help_text="Per-session QR code used for check-in (if applicable)"
+    )
+    qr_scanned_at = models.DateTimeField(null=True, blank=True, help_text="When QR was scanned")
+    
+    # Where the check-in was scanned (optional)
+    latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    client_address = models.ForeignKey(
+        'attendance.ClientAddress', on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
+    agent = models.ForeignKey(
+        'attendance.UserAgent', on_delete=models.PROTECT, null=True, blank=True, related_name='+'
+    )
     
     class Meta:
         unique_together = ['user', 'activity']
     
-    def save(self, *args, **kwargs):
+    def save(self, *args, sync_enrollment=True, **kwargs):
         super().save(*args, **kwargs)
         
-        # Update enrollment status if attendance is marked as present
-        if self.status == 'present':
-            try:
-                enrollment = Enrollment.objects.get(
-                    user=self.user,
-                    activity=self.activity
-                )
-                if enrollment.status == 'enrolled':
-                    enrollment.status = 'completed'
-                    enrollment.save()
-                    enrollment.award_points()
-            except Enrollment.DoesNotExist:
-                # Create enrollment if it doesn't exist
-                enrollment = Enrollment.objects.create(
-                    user=self.user,
-                    activity=self.activity,
-                    status='completed'
-                )
-                enrollment.award_points()
+        # Callers that complete the enrollment themselves (e.g. the QR check-in
+        # fast path) pass sync_enrollment=False to skip this
+        if sync_enrollment and self.status == 'present':
+            from .services import complete_enrollments
+            
+            # Complete the enrollment (creating it if missing) and award points
+            points_reward = self.activity.points_reward if Attendance.activity.is_cached(self) else None
+            complete_enrollments(self.activity_id, [self.user_id], points_reward, create_missing=True)
     
     def __str__(self):
         return f"{self.user} - {self.activity.title} ({self.status})"
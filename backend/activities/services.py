@@ -0,0 +1,146 @@
+# backend/activities/services.py - Set-based attendance operations
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, PositiveIntegerField, Subquery, Value, When
+from django.utils import timezone
+
+from attendance.live import publish_resync
+from .analytics import invalidate_arrival_offsets
+from .models import Activity, Attendance, Enrollment
+
+User = get_user_model()
+
+VALID_ATTENDANCE_STATUSES = {choice for choice, _ in Attendance.STATUS_CHOICES}
+
+
+def complete_enrollments(activity_id, user_ids, points_reward=None, create_missing=False):
+    """Complete the enrollments of students who attended and award points.
+
+    One conditional UPDATE moves ``enrolled`` rows to ``completed`` and, where
+    no points were awarded yet, sets ``points_awarded`` to the activity's
+    ``points_reward`` (read inside the same statement unless the caller
+    already has it). Works the same for one student or a whole roster.
+
+    With ``create_missing``, students with no enrollment at all (walk-ins)
+    get a completed one: only when the UPDATE didn't cover everyone, the
+    missing ids are looked up and inserted (insert_completed_enrollments).
+    Returns the number of enrollments completed or inserted by this call.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return 0
+
+    if points_reward is None:
+        points = Subquery(Activity.objects.filter(pk=activity_id).values('points_reward')[:1])
+    else:
+        points = Value(points_reward)
+
+    completed = Enrollment.objects.filter(
+        activity_id=activity_id, user_id__in=user_ids, status='enrolled'
+    ).update(
+        status='completed',
+        points_awarded=Case(
+            When(points_awarded=0, then=points),
+            default=F('points_awarded'),
+            output_field=PositiveIntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+    if not create_missing or completed == len(user_ids):
+        return completed
+
+    enrolled_ids = set(Enrollment.objects.filter(
+        activity_id=activity_id, user_id__in=user_ids
+    ).values_list('user_id', flat=True))
+    missing_ids = [user_id for user_id in user_ids if user_id not in enrolled_ids]
+    if missing_ids:
+        if points_reward is None:
+            points_reward = Activity.objects.values_list('points_reward', flat=True).get(pk=activity_id)
+        completed += insert_completed_enrollments(activity_id, missing_ids, points_reward)
+    return completed
+
+
+def insert_completed_enrollments(activity_id, user_ids, points_reward):
+    """Insert completed enrollments for students who had none; returns how many were inserted
+
+    One INSERT normally. If a concurrent request enrolled some of them since
+    they were looked up, the INSERT is rolled back and the rows go in one by
+    one, so students enrolled meanwhile are neither duplicated nor counted.
+    """
+    rows = [
+        Enrollment(user_id=user_id, activity_id=activity_id, status='completed', points_awarded=points_reward)
+        for user_id in user_ids
+    ]
+    try:
+        with transaction.atomic():
+            Enrollment.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+    except IntegrityError:
+        inserted = 0
+        for row in rows:
+            _, created = Enrollment.objects.get_or_create(
+                user_id=row.user_id,
+                activity_id=activity_id,
+                defaults={'status': 'completed', 'points_awarded': points_reward},
+            )
+            inserted += created
+        return inserted
+
+
+def bulk_mark_attendance(activity, records, marked_by=None):
+    """Upsert a whole roster of attendance marks for one activity.
+
+    ``records`` is the list posted by the instructor UI:
+    ``[{'student_id': 1, 'status': 'present'}, ...]``.
+
+    Runs a fixed number of queries regardless of roster size: one lookup to
+    validate student ids, one upsert for attendance and, for students marked
+    present, the set-based enrollment completion of complete_enrollments.
+    """
+    statuses = {}
+    skipped = []
+    for record in records:
+        try:
+            student_id = int(record.get('student_id'))
+        except (TypeError, ValueError):
+            skipped.append(record.get('student_id'))
+            continue
+        status_value = record.get('status', 'absent')
+        if status_value not in VALID_ATTENDANCE_STATUSES:
+            skipped.append(student_id)
+            continue
+        statuses[student_id] = status_value
+
+    valid_ids = set(User.objects.filter(id__in=statuses.keys()).values_list('id', flat=True))
+    skipped.extend(student_id for student_id in statuses if student_id not in valid_ids)
+
+    rows = [
+        Attendance(user_id=student_id, activity=activity, status=statuses[student_id], marked_by=marked_by)
+        for student_id in valid_ids
+    ]
+    present_ids = [student_id for student_id in valid_ids if statuses[student_id] == 'present']
+
+    completed = 0
+    with transaction.atomic():
+        Attendance.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user', 'activity'],
+            update_fields=['status', 'marked_by'],
+            batch_size=500,
+        )
+
+        # Attendance.save creates an enrollment for walk-ins; keep that behaviour
+        completed = complete_enrollments(
+            activity.id, present_ids, activity.points_reward, create_missing=True
+        )
+        # Marks may flip between present and absent, so live watchers reload
+        publish_resync(activity.id)
+    # bulk_create sends no signals
+    invalidate_arrival_offsets(activity.id)
+
+    return {
+        'marked': len(rows),
+        'completed': completed,
+        'skipped': skipped,
+    }
@@ -0,0 +1,19 @@
+# activities/signals.py - Keep cached arrival analytics in step with attendance
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .analytics import invalidate_arrival_offsets
+from .models import Activity, Attendance
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def drop_arrival_offsets_on_attendance_change(sender, instance, **kwargs):
+    invalidate_arrival_offsets(instance.activity_id)
+
+
+@receiver(post_save, sender=Activity)
+def drop_arrival_offsets_on_activity_save(sender, instance, created, **kwargs):
+    """Offsets are relative to start_time, which may have moved"""
+    if not created:
+        invalidate_arrival_offsets(instance.id)
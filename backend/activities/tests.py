@@ -1,3 +1,180 @@
+from datetime import timedelta
+
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from beyond_eams.testing import attend, enroll, make_activity, make_user
+from .analytics import arrival_analytics
+from .models import Activity, Attendance, Enrollment
+from .services import bulk_mark_attendance, complete_enrollments, insert_completed_enrollments
+
+
+class ArrivalAnalyticsTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(days=1)
+        self.activity = make_activity(self.start, hours=2, title='Orientation', status='completed')
+
+    def _attend(self, username, minutes, verification_method):
+        attend(
+            self.activity, make_user(username),
+            timestamp=self.start + timedelta(minutes=minutes),
+            verification_method=verification_method,
+        )
+
+    def test_only_qr_checkins_are_arrivals(self):
+        self._attend('early', -5, 'qr_code')
+        self._attend('on-time', 0, 'qr_code')
+        # Marked by the instructor the next morning; says nothing about arrival
+        self._attend('marked-later', 18 * 60, 'manual')
+
+        result = arrival_analytics([self.activity])
+
+        activity = result['by_activity'][0]
+        self.assertEqual(activity['count'], 2)
+        self.assertEqual(activity['median_minutes'], -2.5)
+        self.assertEqual(activity['late_share'], 0.0)
+
+    def test_non_integer_category_is_a_bad_request(self):
+        client = APIClient()
+        client.force_authenticate(make_user('coordinator', role='coordinator'))
+
+        response = client.get(reverse('arrival_analytics'), {'category': 'sports'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class CompleteEnrollmentsTests(TestCase):
+    def setUp(self):
+        self.activity = make_activity(points_reward=10)
+        self.students = [make_user(f'student{i}') for i in range(3)]
+        self.ids = [student.pk for student in self.students]
+
+    def test_completes_enrolled_and_inserts_missing(self):
+        enroll(self.activity, self.students[0])
+        completed = complete_enrollments(self.activity.pk, self.ids, create_missing=True)
+        self.assertEqual(completed, 3)
+        self.assertEqual(
+            Enrollment.objects.filter(activity=self.activity, status='completed', points_awarded=10).count(), 3
+        )
+
+    def test_rows_enrolled_concurrently_are_not_counted(self):
+        # student0 enrolled between the lookup and the INSERT
+        enroll(self.activity, self.students[0])
+        inserted = insert_completed_enrollments(self.activity.pk, self.ids, 10)
+        self.assertEqual(inserted, 2)
+        self.assertEqual(Enrollment.objects.filter(activity=self.activity).count(), 3)
+        self.assertEqual(Enrollment.objects.get(activity=self.activity, user=self.students[0]).status, 'enrolled')
+
+
+class VenueFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        start = timezone.now() + timedelta(days=1)
+        self.payload = {
+            'title': 'Survey walk',
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=1)).isoformat(),
+        }
+
+    def test_zero_coordinates_are_kept_on_create(self):
+        response = self.client.post(
+            reverse('create_activity'),
+            {**self.payload, 'venue_latitude': 0.0, 'venue_longitude': 0.0, 'geofence_radius_m': 50},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, 201)
+        activity = Activity.objects.get(pk=response.data['activity_id'])
+        self.assertEqual(activity.venue_latitude, 0)
+        self.assertEqual(activity.venue_longitude, 0)
+
+    def test_create_rejects_what_update_rejects(self):
+        response = self.client.post(
+            reverse('create_activity'), {**self.payload, 'venue_latitude': 'north'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('venue_latitude', response.data['error'])
+        self.assertFalse(Activity.objects.exists())
+
+
+class InstructorActivityBoardTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.busy = make_activity(now - timedelta(days=1), title='Busy', status='completed')
+        self.empty = make_activity(now - timedelta(days=2), title='Empty', status='completed')
+        students = [make_user(f'student{i}') for i in range(5)]
+        enroll(self.busy, *students[:3])
+        enroll(self.busy, students[3], status='completed')
+        enroll(self.busy, students[4], status='cancelled')
+        attend(self.busy, students[0])
+        attend(self.busy, students[1])
+        attend(self.busy, students[2], status='absent')
+
+    def test_summary_counts_without_multiplying_joins(self):
+        busy, empty = Activity.with_attendance_summary().filter(
+            pk__in=[self.busy.pk, self.empty.pk]
+        ).order_by('-start_time')
+
+        self.assertEqual(
+            (busy.attendance_marked, busy.enrolled_total, busy.present_count, busy.absent_count, busy.attendance_rate),
+            (True, 4, 2, 1, 50.0),
+        )
+        self.assertEqual(
+            (empty.attendance_marked, empty.enrolled_total, empty.present_count, empty.attendance_rate),
+            (False, 0, 0, 0.0),
+        )
+
+    def test_board_pages_with_a_cursor(self):
+        client = APIClient()
+        url = reverse('instructor_activity_board')
+
+        first = client.get(url, {'page_size': 1})
+        second = client.get(first.data['next'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(
+            [(row['title'], row['enrolled_count'], row['present_count'], row['attendance_rate'])
+             for row in first.data['results'] + second.data['results']],
+            [('Busy', 4, 2, 50.0), ('Empty', 0, 0, 0.0)],
+        )
+        self.assertIsNone(second.data['next'])
+
+
+class BulkMarkAttendanceTests(TestCase):
+    def setUp(self):
+        self.activity = make_activity(points_reward=10, status='ongoing')
+        self.instructor = make_user('instructor', role='instructor')
+        self.students = [make_user(f'student{i}') for i in range(4)]
+        enroll(self.activity, *self.students[:2])
+
+    def test_upserts_the_roster_and_completes_present_enrollments(self):
+        # Marked absent earlier; the roster flips them to present
+        attend(self.activity, self.students[0], status='absent')
+        walk_in = self.students[2]
+        records = [
+            {'student_id': self.students[0].pk, 'status': 'present'},
+            {'student_id': self.students[1].pk, 'status': 'absent'},
+            {'student_id': walk_in.pk, 'status': 'present'},
+            {'student_id': 999999, 'status': 'present'},
+            {'student_id': self.students[3].pk, 'status': 'late'},
+            {'student_id': 'abc'},
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = bulk_mark_attendance(self.activity, records, marked_by=self.instructor)
 
-# Create your tests here.
+        self.assertEqual(result['marked'], 3)
+        self.assertEqual(result['completed'], 2)
+        self.assertCountEqual(result['skipped'], [999999, self.students[3].pk, 'abc'])
+        self.assertEqual(
+            dict(Attendance.objects.filter(activity=self.activity).values_list('user_id', 'status')),
+            {self.students[0].pk: 'present', self.students[1].pk: 'absent', walk_in.pk: 'present'},
+        )
+        self.assertFalse(Attendance.objects.filter(activity=self.activity).exclude(marked_by=self.instructor).exists())
+        self.assertEqual(
+            dict(Enrollment.objects.filter(activity=self.activity).values_list('user_id', 'status')),
+            {self.students[0].pk: 'completed', self.students[1].pk: 'enrolled', walk_in.pk: 'completed'},
+        )
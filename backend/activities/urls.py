@@ -35,6 +35,7 @@ urlpatterns = [
     path('coordinator/stats/', views.get_coordinator_stats, name='coordinator_stats'),
     path('coordinator/activities/', views.get_coordinator_activities, name='coordinator_activities'),
     path('coordinator/reports/', views.get_activity_reports, name='coordinator_reports'),
+    path('coordinator/arrival-analytics/', views.get_arrival_analytics, name='arrival_analytics'),
     
     # Activity Management (CRUD)
     path('coordinator/activities/create/', views.create_activity, name='create_activity'),
@@ -63,6 +64,7 @@ urlpatterns = [
     
     path('instructor/stats/', views.get_instructor_stats, name='instructor_stats'),
     path('instructor/activities/', views.get_instructor_activities, name='instructor_activities'),
+    path('instructor/activity-board/', views.get_instructor_activity_board, name='instructor_activity_board'),
     path('instructor/students/', views.get_instructor_students, name='instructor_students'),
     path('instructor/student/<int:student_id>/participation/', views.get_student_participation, name='instructor_student_participation'),
     path('instructor/reject-hours/<int:verification_id>/', views.reject_volunteer_hours, name='instructor_reject_hours'),
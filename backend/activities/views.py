@@ -1,14 +1,16 @@
 # backend/activities/views.py - COMPLETE FIXED VERSION WITH ALL MISSING FUNCTIONS
 from rest_framework.decorators import api_view, permission_classes, parser_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Sum, Avg, Q
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
 import json
@@ -16,6 +18,8 @@ from .models import (
     Activity, Enrollment, Attendance, VolunteerApplication, 
     VolunteerOpportunity, Notification, ActivityCategory
 )
+from .analytics import arrival_analytics
+from .services import bulk_mark_attendance
 
 # Get the User model
 User = get_user_model()
@@ -628,6 +632,23 @@ def get_activity_reports(request):
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+VENUE_FIELDS = ('venue_latitude', 'venue_longitude', 'geofence_radius_m')
+
+
+def _set_venue_fields(activity, data):
+    """Copy the geofence fields present in ``data`` and validate them.
+
+    Blank values clear a field; 0 is a real coordinate, so only '' and None do.
+    Raises ValidationError for values the model fields reject.
+    """
+    for field in VENUE_FIELDS:
+        if field in data:
+            setattr(activity, field, None if data[field] in ('', None) else data[field])
+    activity.full_clean(exclude=[
+        field.name for field in Activity._meta.fields if field.name not in VENUE_FIELDS
+    ])
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_activity(request):
@@ -635,7 +656,7 @@ def create_activity(request):
     try:
         data = request.data
         
-        activity = Activity.objects.create(
+        activity = Activity(
             title=data.get('title', ''),
             description=data.get('description', ''),
             location=data.get('location', ''),
@@ -645,6 +666,8 @@ def create_activity(request):
             status='draft',
             created_by=request.user if hasattr(request, 'user') and request.user.is_authenticated else None,
         )
+        _set_venue_fields(activity, data)
+        activity.save()
         
         return Response({
             'success': True,
@@ -652,6 +675,8 @@ def create_activity(request):
             'activity_id': activity.id
         }, status=status.HTTP_201_CREATED)
         
+    except ValidationError as e:
+        return Response({'error': e.message_dict}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -669,7 +694,7 @@ def update_activity(request, activity_id):
             activity.description = data['description']
         if 'location' in data:
             activity.location = data['location']
-        
+        _set_venue_fields(activity, data)
         activity.save()
         
         return Response({
@@ -677,6 +702,8 @@ def update_activity(request, activity_id):
             'message': 'Activity updated successfully'
         })
         
+    except ValidationError as e:
+        return Response({'error': e.message_dict}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -928,8 +955,10 @@ def get_instructor_stats(request):
 def get_instructor_activities(request):
     """Get instructor activities from database"""
     try:
-        activities = Activity.objects.annotate(
-            enrollment_count=Count('activity_enrollments', filter=Q(activity_enrollments__status='enrolled'))
+        activities = Activity.with_attendance_summary(
+            Activity.objects.annotate(
+                enrolled_participants=Count('activity_enrollments', filter=Q(activity_enrollments__status='enrolled'))
+            )
         ).order_by('-created_at')[:10]
         
         data = []
@@ -941,13 +970,124 @@ def get_instructor_activities(request):
                 'location': activity.location,
                 'start_time': activity.start_time.isoformat(),
                 'status': activity.status,
-                'enrolled_count': activity.enrollment_count,
-                'attendance_marked': Attendance.objects.filter(activity=activity).exists(),
+                'enrolled_count': activity.enrolled_participants,
+                'attendance_marked': activity.attendance_marked,
             })
         return Response(data)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class InstructorActivityCursorPagination(CursorPagination):
+    """Stable cursor over start_time so deep pages cost the same as the first"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-start_time', '-id')
+
+def _parse_window_bound(value, end_of_day=False):
+    """Accept either an ISO date or datetime for the board's date window"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        parsed = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def get_instructor_activity_board(request):
+    """Cursor-paginated instructor board with attendance figures per activity
+
+    Query params: start / end (date window on start_time), status, page_size, cursor.
+    """
+    try:
+        activities = Activity.objects.select_related('category')
+        
+        try:
+            if request.GET.get('start'):
+                activities = activities.filter(start_time__gte=_parse_window_bound(request.GET['start']))
+            if request.GET.get('end'):
+                activities = activities.filter(
+                    start_time__lte=_parse_window_bound(request.GET['end'], end_of_day=True)
+                )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.GET.get('status'):
+            activities = activities.filter(status=request.GET['status'])
+        
+        paginator = InstructorActivityCursorPagination()
+        page = paginator.paginate_queryset(Activity.with_attendance_summary(activities), request)
+        
+        data = []
+        for activity in page:
+            data.append({
+                'id': activity.id,
+                'title': activity.title,
+                'location': activity.location,
+                'category': activity.category.name if activity.category else None,
+                'start_time': activity.start_time.isoformat(),
+                'end_time': activity.end_time.isoformat(),
+                'status': activity.status,
+                'enrolled_count': activity.enrolled_total,
+                'attendance_marked': activity.attendance_marked,
+                'present_count': activity.present_count,
+                'absent_count': activity.absent_count,
+                'attendance_rate': round(activity.attendance_rate, 2),
+            })
+        return paginator.get_paginated_response(data)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_arrival_analytics(request):
+    """When people check in relative to start_time, for a set of activities
+
+    Query params: activity_ids (comma separated), or filters category,
+    start / end (date window on start_time) and status (default: completed).
+    """
+    if request.user.role not in ['instructor', 'coordinator', 'admin'] and not request.user.is_staff:
+        return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        activities = Activity.objects.select_related('category').only(
+            'id', 'title', 'status', 'start_time', 'category__name'
+        )
+        
+        if request.GET.get('activity_ids'):
+            try:
+                activity_ids = [int(value) for value in request.GET['activity_ids'].split(',') if value.strip()]
+            except ValueError:
+                return Response({'error': 'activity_ids must be a comma separated list of ids'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            activities = activities.filter(id__in=activity_ids)
+        else:
+            try:
+                if request.GET.get('start'):
+                    activities = activities.filter(start_time__gte=_parse_window_bound(request.GET['start']))
+                if request.GET.get('end'):
+                    activities = activities.filter(
+                        start_time__lte=_parse_window_bound(request.GET['end'], end_of_day=True)
+                    )
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if request.GET.get('category'):
+                try:
+                    category_id = int(request.GET['category'])
+                except ValueError:
+                    return Response({'error': 'category must be a category id'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                activities = activities.filter(category_id=category_id)
+            activities = activities.filter(status=request.GET.get('status', 'completed'))
+        
+        return Response(arrival_analytics(list(activities.order_by('start_time'))))
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_instructor_students(request):
@@ -1076,28 +1216,18 @@ def mark_attendance(request, activity_id):
         activity = get_object_or_404(Activity, id=activity_id)
         attendance_data = request.data.get('attendance', [])
         
-        marked_count = 0
-        for attendance_record in attendance_data:
-            student_id = attendance_record.get('student_id')
-            status_value = attendance_record.get('status', 'absent')
-            
-            try:
-                student = User.objects.get(id=student_id)
-                attendance, created = Attendance.objects.update_or_create(
-                    user=student,
-                    activity=activity,
-                    defaults={
-                        'status': status_value,
-                        'marked_by': request.user if hasattr(request, 'user') and request.user.is_authenticated else None,
-                    }
-                )
-                marked_count += 1
-            except User.DoesNotExist:
-                continue
+        result = bulk_mark_attendance(
+            activity,
+            attendance_data,
+            marked_by=request.user if hasattr(request, 'user') and request.user.is_authenticated else None,
+        )
         
         return Response({
             'success': True,
-            'message': f'Attendance marked for {marked_count} students',
+            'message': f'Attendance marked for {result["marked"]} students',
+            'marked_count': result['marked'],
+            'completed_count': result['completed'],
+            'skipped_student_ids': result['skipped'],
         })
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -4,11 +4,21 @@ from .models import Attendance, ActivityQRCode
 
 @admin.register(Attendance)
 class AttendanceAdmin(admin.ModelAdmin):
+    """Read-only view of check-ins; the rows belong to activities.Attendance, edit them there"""
     list_display = ['activity', 'student', 'checked_in_at', 'verification_method']
     list_filter = ['verification_method', 'checked_in_at', 'activity']
     search_fields = ['student__username', 'student__first_name', 'student__last_name', 'activity__title']
     readonly_fields = ['checked_in_at']
 
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(ActivityQRCode)
 class ActivityQRCodeAdmin(admin.ModelAdmin):
     list_display = ['activity', 'code', 'is_active', 'created_at']
@@ -0,0 +1,117 @@
+# attendance/checkin.py - Cached validation for the QR check-in hot path
+"""
+Everything a QR scan needs to validate lives in one cache entry per activity:
+the activity's QR code, its venue geofence, a few display fields and the
+enrolled roster packed into a sorted ``array`` of user ids. Validation is then a cache read plus a
+binary search, and the only database work left per scan is the attendance
+INSERT and the enrollment UPDATE.
+
+Entries are warmed when an activity becomes ``ongoing`` (see signals.py and
+the ``warm_checkin_cache`` command), rebuilt lazily on a miss, and dropped
+whenever the activity or one of its enrollments changes. Only activities
+whose status accepts check-ins (CACHED_STATUSES) are cached; a scan for any
+other activity is validated from a fresh read, so ids of drafts and
+cancelled activities don't fill the cache with rosters nobody checks into.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from activities.models import Activity, Enrollment
+from .geofence import build_fence
+from .tokens import InvalidToken, is_rotating_token, verify_rotating_token
+
+CACHE_KEY = 'checkin:activity:{}'
+CACHED_STATUSES = ('upcoming', 'ongoing')
+
+
+def _cache_key(activity_id):
+    return CACHE_KEY.format(activity_id)
+
+
+def _pack_roster(user_ids):
+    """Pack user ids into a sorted array (4 bytes per id where they fit)"""
+    user_ids = sorted(user_ids)
+    typecode = 'Q' if user_ids and user_ids[-1] > 0xFFFFFFFF else 'I'
+    return array(typecode, user_ids)
+
+
+def build_checkin_entry(activity):
+    """Build the cache entry for an activity from the database (one roster query)"""
+    roster = Enrollment.objects.filter(
+        activity=activity, status='enrolled'
+    ).values_list('user_id', flat=True)
+
+    return {
+        'activity_id': activity.id,
+        'qr_code': activity.qr_code,
+        'qr_rotation_enabled': activity.qr_rotation_enabled,
+        'title': activity.title,
+        'location': activity.location,
+        'start_time': activity.start_time,
+        'points_reward': activity.points_reward,
+        'geofence': build_fence(activity.venue_latitude, activity.venue_longitude, activity.geofence_radius_m),
+        'roster': _pack_roster(roster),
+    }
+
+
+def warm_checkin_entry(activity):
+    """Build and store the entry for an activity, returning it"""
+    entry = build_checkin_entry(activity)
+    cache.set(_cache_key(activity.id), entry, settings.CHECKIN_CACHE_TIMEOUT)
+    return entry
+
+
+def get_checkin_entry(activity_id):
+    """Return the cached entry for an activity, building it on a miss
+
+    Returns None when the activity does not exist. Activities outside
+    CACHED_STATUSES get an entry built for this scan only.
+    """
+    entry = cache.get(_cache_key(activity_id))
+    if entry is not None:
+        return entry
+
+    try:
+        activity = Activity.objects.get(id=activity_id)
+    except Activity.DoesNotExist:
+        return None
+    if activity.status not in CACHED_STATUSES:
+        return build_checkin_entry(activity)
+    return warm_checkin_entry(activity)
+
+
+def invalidate_checkin_entry(activity_id):
+    """Drop an activity's entry so the next scan rebuilds it"""
+    cache.delete(_cache_key(activity_id))
+
+
+def is_enrolled(entry, user_id):
+    """Binary search of the packed roster"""
+    roster = entry['roster']
+    index = bisect_left(roster, user_id)
+    return index < len(roster) and roster[index] == user_id
+
+
+def check_scan_code(entry, code, at=None):
+    """Return an error message if ``code`` does not admit a scan for the entry's activity
+
+    Accepts either a rotating token (verified statelessly, see tokens.py) or
+    the activity's static QR code when rotation is not enforced.
+    """
+    if is_rotating_token(code):
+        try:
+            token_activity_id = verify_rotating_token(code, at=at)
+        except InvalidToken as e:
+            return str(e)
+        if token_activity_id != entry['activity_id']:
+            return 'Invalid QR code for this activity'
+        return None
+
+    if entry['qr_rotation_enabled']:
+        return 'This activity uses rotating QR codes, please scan the code on screen'
+    if not entry['qr_code'] or entry['qr_code'] != code:
+        return 'Invalid QR code for this activity'
+    return None
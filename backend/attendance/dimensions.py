@@ -0,0 +1,96 @@
+# attendance/dimensions.py - Interned user-agent and IP address lookups
+"""
+QRScanLog and Attendance rows reference the client's User-Agent string and IP
+address through small foreign keys into UserAgent / ClientAddress instead of
+repeating the text on every row. A semester of scans only ever sees a few
+hundred distinct agents, so the string-to-id lookup is kept in a per-process
+LRU (SCAN_DIMENSION_CACHE_SIZE entries) and the database is only touched the
+first time a value is seen.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ClientAddress, UserAgent
+
+# Longer values are truncated before interning; real browsers stay well below this
+MAX_USER_AGENT_LENGTH = 1000
+
+
+class _LRU:
+    def __init__(self):
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > settings.SCAN_DIMENSION_CACHE_SIZE:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_user_agents = _LRU()
+_addresses = _LRU()
+
+
+def _remember(lru, key, pk):
+    # Only cache ids that are committed, so a rolled-back transaction can't
+    # leave the LRU pointing at a row that doesn't exist
+    transaction.on_commit(lambda: lru.put(key, pk))
+
+
+def user_agent_hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def intern_user_agent(value):
+    """Return the UserAgent id for a User-Agent string (None for empty values)"""
+    if not value:
+        return None
+    value = value[:MAX_USER_AGENT_LENGTH]
+    pk = _user_agents.get(value)
+    if pk is None:
+        pk = UserAgent.objects.get_or_create(
+            value_hash=user_agent_hash(value), defaults={'value': value}
+        )[0].pk
+        _remember(_user_agents, value, pk)
+    return pk
+
+
+def intern_ip_address(value):
+    """Return the ClientAddress id for an IP address (None for empty values)"""
+    if not value:
+        return None
+    pk = _addresses.get(value)
+    if pk is None:
+        pk = ClientAddress.objects.get_or_create(address=value)[0].pk
+        _remember(_addresses, value, pk)
+    return pk
+
+
+def client_dimensions(ip_address=None, user_agent=''):
+    """Foreign key values for a request's IP address and User-Agent"""
+    return {
+        'client_address_id': intern_ip_address(ip_address),
+        'agent_id': intern_user_agent(user_agent),
+    }
+
+
+def clear_cache():
+    _user_agents.clear()
+    _addresses.clear()
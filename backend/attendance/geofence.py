@@ -0,0 +1,96 @@
+# attendance/geofence.py - Venue geofence checks for QR check-in
+"""
+An activity with venue coordinates and a ``geofence_radius_m`` only accepts
+scans recorded within that radius (plus GEOFENCE_TOLERANCE_M for GPS error).
+
+The fence is precomputed once per activity, including a latitude/longitude
+bounding box around the circle, and kept in the check-in cache entry. A scan
+is first compared against the box - four float comparisons that reject most
+far-away scans outright - and only scans inside the box get the exact
+haversine distance.
+
+Scan logs also store coarse ``lat_bucket`` / ``lon_bucket`` grid cells
+(GEOFENCE_BUCKET_DEGREES wide) so out-of-fence scans can be grouped by where
+they came from using an index instead of a table scan.
+"""
+import math
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE_LAT = math.pi * EARTH_RADIUS_M / 180
+
+
+def build_fence(latitude, longitude, radius_m):
+    """Fence dict for an activity, or None when it has no geofence"""
+    if latitude is None or longitude is None or not radius_m:
+        return None
+    latitude = float(latitude)
+    longitude = float(longitude)
+    reach = radius_m + settings.GEOFENCE_TOLERANCE_M
+
+    lat_delta = reach / METERS_PER_DEGREE_LAT
+    # Longitude degrees shrink towards the poles; clamp so the box stays finite
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    lon_delta = min(reach / (METERS_PER_DEGREE_LAT * cos_lat), 180.0)
+    return {
+        'latitude': latitude,
+        'longitude': longitude,
+        'reach_m': reach,
+        'bbox': (latitude - lat_delta, latitude + lat_delta, longitude - lon_delta, longitude + lon_delta),
+    }
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def is_inside_fence(fence, latitude, longitude):
+    """Bounding-box prefilter, then the exact haversine check"""
+    min_lat, max_lat, min_lon, max_lon = fence['bbox']
+    if not (min_lat <= latitude <= max_lat):
+        return False
+    # Boxes that wrap past the antimeridian (or a pole) skip the longitude test
+    if min_lon >= -180 and max_lon <= 180 and not (min_lon <= longitude <= max_lon):
+        return False
+    return haversine_m(fence['latitude'], fence['longitude'], latitude, longitude) <= fence['reach_m']
+
+
+def check_geofence(fence, latitude, longitude):
+    """Return an error message if a scan location is not acceptable for the fence"""
+    if fence is None:
+        return None
+    if latitude is None or longitude is None:
+        if settings.GEOFENCE_REQUIRE_LOCATION:
+            return 'Location is required to check in to this activity'
+        return None
+    if not is_inside_fence(fence, float(latitude), float(longitude)):
+        return 'You are too far from the activity venue to check in'
+    return None
+
+
+def parse_coordinate(value, limit, name):
+    """Decimal coordinate from request data (None if missing); raises ValueError"""
+    if value in (None, ''):
+        return None
+    try:
+        coordinate = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'{name} must be a number')
+    if not coordinate.is_finite() or abs(coordinate) > limit:
+        raise ValueError(f'{name} is out of range')
+    return round(coordinate, 8)
+
+
+def geo_bucket(value):
+    """Grid cell index for a latitude or longitude"""
+    if value is None:
+        return None
+    return math.floor(float(value) / settings.GEOFENCE_BUCKET_DEGREES)
@@ -0,0 +1,131 @@
+# attendance/live.py - Live check-in counter streamed to coordinator screens
+"""
+Check-ins are published to the in-process broker (beyond_eams/pubsub.py)
+on topic ``attendance:<activity_id>`` once their transaction commits:
+
+* ``checkin`` messages carry the new arrivals (single scans and manual marks
+  via the Attendance post_save signal, offline batches from sync.py).
+* ``resync`` messages tell watchers to reload, for changes that aren't simple
+  arrivals (bulk roster marks, status edits, deletions).
+
+A watcher loads one snapshot from the database when it connects (the set of
+present student ids plus the latest arrivals) and then applies messages to
+it in memory. Arrivals are de-duplicated by student id, which is unique per
+activity, so a check-in racing the snapshot is never counted twice. However
+many screens are open, the database sees one snapshot per connection and
+nothing per check-in.
+"""
+import asyncio
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from activities.models import Attendance
+from beyond_eams.pubsub import broker
+from beyond_eams.sse import format_event, keepalive
+
+TOPIC = 'attendance:{}'
+
+
+def _topic(activity_id):
+    return TOPIC.format(activity_id)
+
+
+def checkin_arrival(attendance, user=None):
+    """Wire format of one arrival; pass ``user`` to include a display name"""
+    if user is None and Attendance.user.is_cached(attendance):
+        user = attendance.user
+    return {
+        'student_id': attendance.user_id,
+        'name': (user.get_full_name() or user.username) if user is not None else None,
+        'checked_in_at': attendance.timestamp,
+        'verification_method': attendance.verification_method,
+    }
+
+
+def publish_checkins(activity_id, arrivals):
+    """Publish arrivals after the current transaction commits"""
+    if arrivals:
+        transaction.on_commit(lambda: broker.publish(_topic(activity_id), {'type': 'checkin', 'arrivals': arrivals}))
+
+
+def publish_resync(activity_id):
+    transaction.on_commit(lambda: broker.publish(_topic(activity_id), {'type': 'resync'}))
+
+
+class LiveRoster:
+    """One watcher's in-memory picture of an activity's check-ins"""
+
+    def __init__(self, student_ids, recent):
+        self.student_ids = set(student_ids)
+        self.recent = deque(recent, maxlen=settings.LIVE_ATTENDANCE_RECENT_ARRIVALS)
+
+    @classmethod
+    def load(cls, activity_id):
+        present = Attendance.objects.filter(activity_id=activity_id, status='present')
+        latest = present.select_related('user').order_by('-timestamp', '-id')[:settings.LIVE_ATTENDANCE_RECENT_ARRIVALS]
+        return cls(
+            present.values_list('user_id', flat=True),
+            [checkin_arrival(attendance) for attendance in latest],
+        )
+
+    def apply(self, arrivals):
+        """Add arrivals not seen yet; returns the new ones"""
+        new = []
+        for arrival in arrivals:
+            if arrival['student_id'] not in self.student_ids:
+                self.student_ids.add(arrival['student_id'])
+                self.recent.appendleft(arrival)
+                new.append(arrival)
+        return new
+
+    def snapshot(self, activity_id):
+        return {
+            'activity_id': activity_id,
+            'count': len(self.student_ids),
+            'recent_arrivals': list(self.recent),
+        }
+
+
+async def live_attendance_events(activity_id, stream=True):
+    """SSE frames for one watcher; with ``stream=False`` only the snapshot is sent"""
+    load = sync_to_async(LiveRoster.load)
+    if not stream:
+        roster = await load(activity_id)
+        yield format_event(roster.snapshot(activity_id), event='snapshot')
+        return
+
+    # Subscribe before loading so nothing published in between is missed
+    subscription = broker.subscribe(_topic(activity_id))
+    try:
+        roster = await load(activity_id)
+        yield format_event(roster.snapshot(activity_id), event='snapshot', retry_ms=settings.SSE_RETRY_MS)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_MAX_STREAM_SECONDS
+        while loop.time() < deadline:
+            messages = await subscription.get(timeout=settings.SSE_KEEPALIVE_SECONDS)
+            if not messages:
+                yield keepalive()
+                continue
+
+            if subscription.lagged or any(message['type'] == 'resync' for message in messages):
+                subscription.lagged = False
+                roster = await load(activity_id)
+                yield format_event(roster.snapshot(activity_id), event='snapshot')
+                continue
+
+            # Everything that queued up while we were busy goes out as one event
+            new = roster.apply(
+                arrival for message in messages for arrival in message['arrivals']
+            )
+            if new:
+                yield format_event({
+                    'activity_id': activity_id,
+                    'count': len(roster.student_ids),
+                    'arrivals': new,
+                }, event='checkin')
+    finally:
+        subscription.close()
@@ -0,0 +1,45 @@
+# attendance/management/commands/archive_scan_logs.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from attendance.retention import archive_month, month_scan_logs, months_to_archive, retention_cutoff
+
+
+class Command(BaseCommand):
+    help = ('Move QR scan logs older than the retention period into monthly NDJSON.gz archives '
+            'plus per-activity summaries (safe to re-run; resumes where it stopped)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SCAN_LOG_RETENTION_DAYS,
+                            help='Keep scan logs newer than this many days (rounded down to a whole month)')
+        parser.add_argument('--archive-dir', default=str(settings.SCAN_LOG_ARCHIVE_DIR),
+                            help='Directory for the monthly archive files')
+        parser.add_argument('--batch-size', type=int, default=settings.SCAN_LOG_ARCHIVE_BATCH_SIZE,
+                            help='Rows archived and deleted per transaction')
+        parser.add_argument('--pause-ms', type=int, default=settings.SCAN_LOG_ARCHIVE_PAUSE_MS,
+                            help='Pause between chunks to let check-ins through')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be archived')
+
+    def handle(self, *args, **options):
+        cutoff = retention_cutoff(options['days'])
+        months = months_to_archive(cutoff)
+        self.stdout.write(f'Archiving scan logs before {cutoff:%Y-%m-%d}: {len(months)} month(s)')
+
+        total = 0
+        for month in months:
+            if options['dry_run']:
+                count = month_scan_logs(month).count()
+                self.stdout.write(f'  {month:%Y-%m}: {count} scan logs')
+                total += count
+                continue
+            archived = archive_month(
+                month,
+                archive_dir=options['archive_dir'],
+                batch_size=options['batch_size'],
+                pause_ms=options['pause_ms'],
+            )
+            self.stdout.write(f'  {month:%Y-%m}: archived {archived} scan logs')
+            total += archived
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} scan logs'))
@@ -0,0 +1,115 @@
+# attendance/management/commands/benchmark_checkin.py
+import statistics
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from activities.models import Activity, Enrollment
+from attendance.checkin import invalidate_checkin_entry, warm_checkin_entry
+from attendance.models import ClientAddress, QRScanLog, UserAgent
+from attendance.views import mark_attendance
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    """Raised to discard all benchmark data at the end of the run"""
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the QR check-in endpoint against a burst of scans (data is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scans', type=int, default=2000, help='Number of students scanning')
+        parser.add_argument('--target-per-minute', type=int, default=2000,
+                            help='Throughput the run must sustain to pass')
+        parser.add_argument('--cold', action='store_true',
+                            help='Drop the check-in cache entry before every scan (worst case)')
+
+    def handle(self, *args, **options):
+        scans = options['scans']
+        try:
+            # Scan logs are written inline so they land in (and roll back with)
+            # this transaction; in production the background writer batches them
+            with override_settings(SCAN_LOG_ASYNC=False), transaction.atomic():
+                self._run(scans, options['target_per_minute'], options['cold'])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, scans, target_per_minute, cold):
+        now = timezone.now()
+        activity = Activity.objects.create(
+            title='Check-in benchmark',
+            description='Temporary activity created by benchmark_checkin',
+            location='Benchmark Hall',
+            start_time=now,
+            end_time=now + timedelta(hours=2),
+            status='ongoing',
+        )
+        User.objects.bulk_create([
+            User(username=f'checkin_bench_{i}', role='student', password='!')
+            for i in range(scans)
+        ], batch_size=500)
+        students = list(User.objects.filter(username__startswith='checkin_bench_'))
+        Enrollment.objects.bulk_create(
+            [Enrollment(user=student, activity=activity) for student in students],
+            batch_size=500,
+        )
+        warm_checkin_entry(activity)
+
+        factory = APIRequestFactory()
+        latencies = []
+        failures = 0
+
+        counts = Counter()
+        # Interning lookups for the log's IP / User-Agent happen in the writer
+        # thread too (and are LRU-cached once committed, which never happens here)
+        scan_log_tables = [model._meta.db_table for model in (QRScanLog, UserAgent, ClientAddress)]
+
+        def count_statements(execute, sql, params, many, context):
+            if not sql.upper().startswith(('SAVEPOINT', 'RELEASE SAVEPOINT')):
+                is_scan_log = any(table in sql for table in scan_log_tables)
+                counts['scan_log' if is_scan_log else 'checkin'] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_statements):
+            started = time.perf_counter()
+            for student in students:
+                if cold:
+                    invalidate_checkin_entry(activity.id)
+                request = factory.post(
+                    '/api/attendance/mark/',
+                    {'activity_id': activity.id, 'qr_code': activity.qr_code},
+                    format='json',
+                )
+                force_authenticate(request, user=student)
+                scan_started = time.perf_counter()
+                response = mark_attendance(request)
+                latencies.append((time.perf_counter() - scan_started) * 1000)
+                if response.status_code != 201:
+                    failures += 1
+            elapsed = time.perf_counter() - started
+
+        per_minute = len(students) / elapsed * 60 if elapsed else float('inf')
+        latencies.sort()
+
+        self.stdout.write(f'Scans:               {len(students)} ({failures} failed)')
+        self.stdout.write(f'Elapsed:             {elapsed:.2f}s')
+        self.stdout.write(f'Throughput:          {per_minute:,.0f} scans/minute (single worker)')
+        self.stdout.write(f'Latency p50 / p95:   {statistics.median(latencies):.2f}ms / '
+                          f'{latencies[int(len(latencies) * 0.95) - 1]:.2f}ms')
+        self.stdout.write(f'Queries per scan:    {counts["checkin"] / len(students):.2f} '
+                          f'(+{counts["scan_log"] / len(students):.2f} scan log, batched off-request in production)')
+
+        if failures == 0 and per_minute >= target_per_minute:
+            self.stdout.write(self.style.SUCCESS(f'PASS: sustained {target_per_minute} scans/minute'))
+        else:
+            self.stdout.write(self.style.ERROR(f'FAIL: target was {target_per_minute} scans/minute'))
@@ -0,0 +1,30 @@
+# attendance/management/commands/prune_qr_image_cache.py
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = ('Delete rendered QR images not used recently. Rotating tokens add a new image every '
+            'window; anything pruned is simply re-rendered on the next request.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Keep images accessed within this many hours')
+
+    def handle(self, *args, **options):
+        cutoff = time.time() - options['hours'] * 3600
+        removed = 0
+        freed = 0
+        for directory, _, filenames in os.walk(settings.QR_IMAGE_CACHE_DIR):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                # atime may be disabled (noatime); mtime is the render time
+                if max(stat.st_atime, stat.st_mtime) < cutoff:
+                    os.remove(path)
+                    removed += 1
+                    freed += stat.st_size
+
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} cached QR images ({freed / 1024:.1f} KiB)'))
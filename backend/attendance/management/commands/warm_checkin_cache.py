@@ -0,0 +1,29 @@
+# attendance/management/commands/warm_checkin_cache.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from activities.models import Activity
+from attendance.checkin import warm_checkin_entry
+
+
+class Command(BaseCommand):
+    help = 'Warm the QR check-in cache for ongoing activities and those whose check-in window is open'
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        # Same window as is_qr_checkin_allowed: 30 minutes before to 2 hours after start
+        activities = Activity.objects.filter(
+            Q(status='ongoing') |
+            Q(start_time__gte=now - timedelta(hours=2), start_time__lte=now + timedelta(minutes=30))
+        ).exclude(status__in=['draft', 'cancelled'])
+
+        warmed = 0
+        for activity in activities:
+            entry = warm_checkin_entry(activity)
+            warmed += 1
+            self.stdout.write(f'  {activity.title}: {len(entry["roster"])} enrolled')
+
+        self.stdout.write(self.style.SUCCESS(f'Warmed check-in cache for {warmed} activities'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_qrscanlog_alter_activityqrcode_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='client_scan_id',
+            field=models.UUIDField(blank=True, help_text='Device-generated scan id; makes batch re-uploads idempotent', null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='device_id',
+            field=models.CharField(blank=True, help_text='Scanner device that recorded the scan', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='qrscanlog',
+            name='qr_code',
+            field=models.ForeignKey(blank=True, help_text="Null for scans of the activity's static QR code", null=True, on_delete=django.db.models.deletion.CASCADE, related_name='scan_logs', to='attendance.activityqrcode'),
+        ),
+        migrations.AlterField(
+            model_name='qrscanlog',
+            name='scanned_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,116 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:10
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+LOGGED_MODELS = ('Attendance', 'QRScanLog')
+
+
+def compact_client_dimensions(apps, schema_editor):
+    """Move repeated user_agent / ip_address text into the interned tables"""
+    UserAgent = apps.get_model('attendance', 'UserAgent')
+    ClientAddress = apps.get_model('attendance', 'ClientAddress')
+
+    for model_name in LOGGED_MODELS:
+        Model = apps.get_model('attendance', model_name)
+
+        # One UPDATE per distinct value; there are only a few hundred of them.
+        # order_by() drops Meta.ordering, whose column would otherwise join the DISTINCT.
+        agents = Model.objects.exclude(user_agent='').order_by().values_list('user_agent', flat=True).distinct()
+        for value in agents:
+            interned = value[:1000]
+            agent, _ = UserAgent.objects.get_or_create(
+                value_hash=hashlib.sha256(interned.encode('utf-8')).hexdigest(),
+                defaults={'value': interned},
+            )
+            Model.objects.filter(user_agent=value).update(agent=agent)
+
+        addresses = (
+            Model.objects.filter(ip_address__isnull=False).order_by().values_list('ip_address', flat=True).distinct()
+        )
+        for value in addresses:
+            address, _ = ClientAddress.objects.get_or_create(address=value)
+            Model.objects.filter(ip_address=value).update(client_address=address)
+
+
+def expand_client_dimensions(apps, schema_editor):
+    """Reverse: copy the interned values back into the restored text columns"""
+    UserAgent = apps.get_model('attendance', 'UserAgent')
+    ClientAddress = apps.get_model('attendance', 'ClientAddress')
+
+    for model_name in LOGGED_MODELS:
+        Model = apps.get_model('attendance', model_name)
+        Model.objects.filter(agent__isnull=False).update(
+            user_agent=Subquery(UserAgent.objects.filter(pk=OuterRef('agent_id')).values('value')[:1])
+        )
+        Model.objects.filter(client_address__isnull=False).update(
+            ip_address=Subquery(ClientAddress.objects.filter(pk=OuterRef('client_address_id')).values('address')[:1])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_qrscanlog_offline_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientAddress',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('address', models.GenericIPAddressField(unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'client addresses',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserAgent',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('value', models.TextField()),
+                ('value_hash', models.CharField(help_text='SHA-256 of value', max_length=64, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='client_address',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.clientaddress'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.useragent'),
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='client_address',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.clientaddress'),
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='agent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.useragent'),
+        ),
+        migrations.RunPython(compact_client_dimensions, expand_client_dimensions),
+        migrations.RemoveField(
+            model_name='attendance',
+            name='ip_address',
+        ),
+        migrations.RemoveField(
+            model_name='attendance',
+            name='user_agent',
+        ),
+        migrations.RemoveField(
+            model_name='qrscanlog',
+            name='ip_address',
+        ),
+        migrations.RemoveField(
+            model_name='qrscanlog',
+            name='user_agent',
+        ),
+    ]
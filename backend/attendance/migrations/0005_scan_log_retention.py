@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0007_activity_qr_rotation_enabled'),
+        ('attendance', '0004_client_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanLogArchiveCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month', unique=True)),
+                ('archive_path', models.CharField(max_length=500)),
+                ('summarized_pk', models.BigIntegerField(default=0, help_text='Summaries include scan logs up to this id; rows up to it are being archived')),
+                ('archive_bytes', models.BigIntegerField(default=0, help_text='Committed size of the archive file')),
+                ('rows_archived', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QRScanMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total_scans', models.PositiveIntegerField(default=0)),
+                ('successful_scans', models.PositiveIntegerField(default=0)),
+                ('failed_scans', models.PositiveIntegerField(default=0)),
+                ('unique_students', models.PositiveIntegerField(default=0, help_text='Distinct students per archive pass, summed if a month is archived more than once')),
+                ('first_scan_at', models.DateTimeField(blank=True, null=True)),
+                ('last_scan_at', models.DateTimeField(blank=True, null=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scan_summaries', to='activities.activity')),
+            ],
+            options={
+                'ordering': ['-month', 'activity'],
+                'unique_together': {('activity', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Floor
+
+BUCKET_DEGREES = 0.01  # GEOFENCE_BUCKET_DEGREES when this migration was written
+
+
+def backfill_geo_buckets(apps, schema_editor):
+    QRScanLog = apps.get_model('attendance', 'QRScanLog')
+    QRScanLog.objects.filter(latitude__isnull=False, longitude__isnull=False).update(
+        lat_bucket=Floor(models.F('latitude') / BUCKET_DEGREES),
+        lon_bucket=Floor(models.F('longitude') / BUCKET_DEGREES),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0008_activity_venue_geofence'),
+        ('attendance', '0005_scan_log_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='lat_bucket',
+            field=models.IntegerField(blank=True, help_text='Coarse grid cell of latitude, see geofence.py', null=True),
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='lon_bucket',
+            field=models.IntegerField(blank=True, help_text='Coarse grid cell of longitude, see geofence.py', null=True),
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='outside_geofence',
+            field=models.BooleanField(default=False, help_text="Scanned outside the activity's venue geofence"),
+        ),
+        migrations.AddIndex(
+            model_name='qrscanlog',
+            index=models.Index(condition=models.Q(('outside_geofence', True)), fields=['lat_bucket', 'lon_bucket'], name='qrscanlog_outside_fence_geo'),
+        ),
+        migrations.RunPython(backfill_geo_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,169 @@
+# Generated by Django 5.2.1 on 2026-10-19 07:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 500
+QR_FIELDS = ('verification_method', 'qr_code_id', 'qr_scanned_at', 'latitude', 'longitude',
+             'client_address_id', 'agent_id')
+
+
+def _batches(queryset):
+    """Lists of up to BATCH_SIZE rows in primary-key order, streamed rather than loaded at once"""
+    batch = []
+    for row in queryset.order_by('pk').iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge_attendance(apps, schema_editor):
+    """Copy attendance_attendance rows into activities_attendance
+
+    A (student, activity) pair that already has a row there gets the QR
+    fields filled in; the rest are inserted as 'present'.
+    """
+    OldAttendance = apps.get_model('attendance', 'Attendance')
+    Attendance = apps.get_model('activities', 'Attendance')
+
+    for chunk in _batches(OldAttendance.objects.all()):
+        existing = {
+            (row.user_id, row.activity_id): row
+            for row in Attendance.objects.filter(
+                user_id__in={old.student_id for old in chunk},
+                activity_id__in={old.activity_id for old in chunk},
+            )
+        }
+
+        updates = []
+        inserts = []
+        for old in chunk:
+            row = existing.get((old.student_id, old.activity_id))
+            if row is None:
+                row = Attendance(
+                    user_id=old.student_id,
+                    activity_id=old.activity_id,
+                    status='present',
+                    timestamp=old.checked_in_at,
+                    marked_by_id=old.verified_by_id,
+                )
+                inserts.append(row)
+            else:
+                row.marked_by_id = row.marked_by_id or old.verified_by_id
+                updates.append(row)
+            for field in QR_FIELDS:
+                setattr(row, field, getattr(old, field))
+
+        Attendance.objects.bulk_create(inserts)
+        Attendance.objects.bulk_update(updates, QR_FIELDS + ('marked_by_id',))
+
+
+def split_attendance(apps, schema_editor):
+    """Reverse of merge_attendance: copy the QR check-ins back into attendance_attendance
+
+    The rows stay in activities_attendance as well; its QR columns go when
+    activities 0009 is reversed. Successful scans are linked to the copies.
+    """
+    OldAttendance = apps.get_model('attendance', 'Attendance')
+    Attendance = apps.get_model('activities', 'Attendance')
+    QRScanLog = apps.get_model('attendance', 'QRScanLog')
+
+    for chunk in _batches(Attendance.objects.filter(verification_method='qr_code')):
+        copies = []
+        for row in chunk:
+            copy = OldAttendance(student_id=row.user_id, activity_id=row.activity_id, verified_by_id=row.marked_by_id)
+            for field in QR_FIELDS:
+                setattr(copy, field, getattr(row, field))
+            copies.append(copy)
+        OldAttendance.objects.bulk_create(copies)
+        # checked_in_at is auto_now_add on the old model, so the scan times are written afterwards
+        for copy, row in zip(copies, chunk):
+            copy.checked_in_at = row.qr_scanned_at or row.timestamp
+        OldAttendance.objects.bulk_update(copies, ['checked_in_at'])
+
+    QRScanLog.objects.filter(success=True, student__isnull=False).update(
+        attendance_id=Subquery(
+            OldAttendance.objects.filter(
+                student_id=OuterRef('student_id'),
+                activity_id=OuterRef('activity_id'),
+            ).values('pk')[:1]
+        )
+    )
+
+
+def link_scan_logs(apps, schema_editor):
+    """Point successful scans at the attendance row they produced"""
+    QRScanLog = apps.get_model('attendance', 'QRScanLog')
+    Attendance = apps.get_model('activities', 'Attendance')
+    QRScanLog.objects.filter(success=True, student__isnull=False).update(
+        attendance_id=Subquery(
+            Attendance.objects.filter(
+                user_id=OuterRef('student_id'),
+                activity_id=OuterRef('activity_id'),
+            ).values('pk')[:1]
+        )
+    )
+
+
+def unlink_scan_logs(apps, schema_editor):
+    """Reverse of link_scan_logs; split_attendance links them to the old table again"""
+    QRScanLog = apps.get_model('attendance', 'QRScanLog')
+    QRScanLog.objects.filter(attendance__isnull=False).update(attendance=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0009_attendance_qr_fields'),
+        ('attendance', '0006_qrscanlog_geofence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_attendance, split_attendance),
+        migrations.RemoveField(
+            model_name='qrscanlog',
+            name='attendance',
+        ),
+        migrations.DeleteModel(
+            name='Attendance',
+        ),
+        migrations.CreateModel(
+            name='Attendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(default='present', max_length=20)),
+                ('checked_in_at', models.DateTimeField(db_column='timestamp', default=django.utils.timezone.now)),
+                ('verification_method', models.CharField(choices=[('qr_code', 'QR Code'), ('manual', 'Manual Entry')], default='qr_code', max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('qr_code_used', models.CharField(blank=True, max_length=100, null=True)),
+                ('qr_scanned_at', models.DateTimeField(blank=True, help_text='When QR was scanned', null=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendances', to='activities.activity')),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.useragent')),
+                ('client_address', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='attendance.clientaddress')),
+                ('qr_code', models.ForeignKey(blank=True, help_text='QR code used for check-in (if applicable)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendances', to='attendance.activityqrcode')),
+                ('student', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, related_name='attendances', to=settings.AUTH_USER_MODEL)),
+                ('verified_by', models.ForeignKey(blank=True, db_column='marked_by_id', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verified_attendances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'activities_attendance',
+                'ordering': ['-checked_in_at'],
+                'managed': False,
+                'unique_together': {('activity', 'student')},
+            },
+        ),
+        migrations.AddField(
+            model_name='qrscanlog',
+            name='attendance',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scan_logs', to='activities.attendance'),
+        ),
+        migrations.RunPython(link_scan_logs, unlink_scan_logs),
+    ]
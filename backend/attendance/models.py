@@ -8,9 +8,44 @@ from datetime import timedelta
 import uuid
 import json
 
+from .geofence import geo_bucket
+
 User = get_user_model()
 
+
+class UserAgent(models.Model):
+    """Interned User-Agent string, referenced by scan and attendance logs"""
+    
+    id = models.AutoField(primary_key=True)
+    value = models.TextField()
+    value_hash = models.CharField(max_length=64, unique=True, help_text="SHA-256 of value")
+    
+    def __str__(self):
+        return self.value[:80]
+
+
+class ClientAddress(models.Model):
+    """Interned client IP address, referenced by scan and attendance logs"""
+    
+    id = models.AutoField(primary_key=True)
+    address = models.GenericIPAddressField(unique=True)
+    
+    class Meta:
+        verbose_name_plural = 'client addresses'
+    
+    def __str__(self):
+        return self.address
+
+
 class Attendance(models.Model):
+    """QR check-in view of the unified attendance table (activities_attendance)
+    
+    Unmanaged: the rows belong to activities.models.Attendance and this model
+    maps the same columns to the names the QR/attendance API has always used
+    (student = user, verified_by = marked_by, checked_in_at = timestamp).
+    Create and update attendance through activities.models.Attendance, which
+    also completes the enrollment; this model is meant for reads.
+    """
     activity = models.ForeignKey(
         Activity,
         on_delete=models.CASCADE,
@@ -19,15 +54,18 @@ class Attendance(models.Model):
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='attendances'
+        related_name='attendances',
+        db_column='user_id'
     )
-    checked_in_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=20, default='present')
+    checked_in_at = models.DateTimeField(default=timezone.now, db_column='timestamp')
     verified_by = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
-        related_name='verified_attendances'
+        related_name='verified_attendances',
+        db_column='marked_by_id'
     )
     verification_method = models.CharField(
         max_length=20,
@@ -37,8 +75,10 @@ class Attendance(models.Model):
         ],
         default='qr_code'
     )
+    notes = models.TextField(blank=True)
     
     # Enhanced fields for QR tracking
+    qr_code_used = models.CharField(max_length=100, blank=True, null=True)
     qr_code = models.ForeignKey(
         'ActivityQRCode',
         on_delete=models.SET_NULL,
@@ -67,18 +107,15 @@ class Attendance(models.Model):
         blank=True
     )
     
-    # Additional tracking
-    ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    # Additional tracking (interned, see dimensions.py)
+    client_address = models.ForeignKey(ClientAddress, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     
     class Meta:
+        managed = False
+        db_table = 'activities_attendance'
         unique_together = ('activity', 'student')
         ordering = ['-checked_in_at']
-        indexes = [
-            models.Index(fields=['activity', 'verification_method']),
-            models.Index(fields=['student', 'checked_in_at']),
-            models.Index(fields=['qr_code']),
-        ]
     
     def __str__(self):
         return f"{self.student.username} - {self.activity.title}"
@@ -91,7 +128,20 @@ class Attendance(models.Model):
     @property
     def is_qr_checkin(self):
         """Check if this was a QR code check-in"""
-        return self.verification_method == 'qr_code' and self.qr_code is not None
+        return self.verification_method == 'qr_code' and (self.qr_code_id is not None or bool(self.qr_code_used))
+    
+    @property
+    def scan_logs(self):
+        """Scans linked to this attendance row (the FK targets activities.Attendance)"""
+        return QRScanLog.objects.filter(attendance_id=self.pk)
+    
+    @property
+    def ip_address(self):
+        return self.client_address.address if self.client_address_id else None
+    
+    @property
+    def user_agent(self):
+        return self.agent.value if self.agent_id else ''
 
 
 class ActivityQRCode(models.Model):
@@ -146,15 +196,50 @@ class ActivityQRCode(models.Model):
     
     @property
     def is_valid(self):
-        """Check if QR code is valid for use"""
+        """Check if QR code is valid for use
+
+        Advisory only - it reads in-memory values that concurrent scans may
+        have made stale. Use consume() to actually take a scan.
+        """
         if not self.is_active:
             return False
         if self.is_expired:
             return False
-        if self.max_uses and self.current_uses >= self.max_uses:
+        if self.max_uses is not None and self.current_uses >= self.max_uses:
             return False
         return True
     
+    @classmethod
+    def usable(cls, now=None):
+        """Codes that can still be scanned: active, not expired, under max_uses"""
+        now = now or timezone.now()
+        return cls.objects.filter(is_active=True).filter(
+            models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=now)
+        ).filter(
+            models.Q(max_uses__isnull=True) | models.Q(current_uses__lt=models.F('max_uses'))
+        )
+    
+    def consume(self):
+        """Atomically take one scan from this code
+
+        A single conditional UPDATE increments current_uses only while the code
+        is active, unexpired and under max_uses, so concurrent scans can never
+        overshoot. Returns True if the scan was granted.
+        
+        The student check-in paths (mark_attendance, offline sync) don't call
+        this: they validate against Activity.qr_code or a rotating token from
+        the cached check-in entry and never resolve an ActivityQRCode row.
+        Counting every scan here would put a write on one hot row per activity
+        back on that path. Use it wherever a session code with max_uses is
+        actually redeemed.
+        """
+        consumed = ActivityQRCode.usable().filter(pk=self.pk).update(
+            current_uses=models.F('current_uses') + 1
+        )
+        if consumed:
+            self.current_uses += 1
+        return consumed == 1
+    
     def generate_qr_data(self):
         """Generate QR code data as JSON string"""
         qr_data = {
@@ -170,9 +255,9 @@ class ActivityQRCode(models.Model):
         return self.qr_data
     
     def increment_usage(self):
-        """Increment usage count"""
+        """Increment usage count unconditionally (see consume() for enforced limits)"""
+        ActivityQRCode.objects.filter(pk=self.pk).update(current_uses=models.F('current_uses') + 1)
         self.current_uses += 1
-        self.save(update_fields=['current_uses'])
     
     def deactivate(self):
         """Deactivate QR code"""
@@ -214,7 +299,10 @@ class QRScanLog(models.Model):
     qr_code = models.ForeignKey(
         ActivityQRCode, 
         on_delete=models.CASCADE, 
-        related_name='scan_logs'
+        null=True,
+        blank=True,
+        related_name='scan_logs',
+        help_text="Null for scans of the activity's static QR code"
     )
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -226,21 +314,33 @@ class QRScanLog(models.Model):
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE)
     
     # Scan details
-    scanned_at = models.DateTimeField(auto_now_add=True)
+    scanned_at = models.DateTimeField(default=timezone.now)
     success = models.BooleanField(default=False, help_text="Whether scan resulted in successful check-in")
     error_message = models.TextField(blank=True, help_text="Error message if scan failed")
     
-    # Technical details
-    ip_address = models.GenericIPAddressField(null=True, blank=True)
-    user_agent = models.TextField(blank=True)
+    # Offline sync (scanner devices upload batches of scans later)
+    client_scan_id = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Device-generated scan id; makes batch re-uploads idempotent"
+    )
+    device_id = models.CharField(max_length=100, blank=True, help_text="Scanner device that recorded the scan")
+    
+    # Technical details (interned, see dimensions.py)
+    client_address = models.ForeignKey(ClientAddress, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+    agent = models.ForeignKey(UserAgent, on_delete=models.PROTECT, null=True, blank=True, related_name='+')
     
     # Location verification (optional)
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    outside_geofence = models.BooleanField(default=False, help_text="Scanned outside the activity's venue geofence")
+    lat_bucket = models.IntegerField(null=True, blank=True, help_text="Coarse grid cell of latitude, see geofence.py")
+    lon_bucket = models.IntegerField(null=True, blank=True, help_text="Coarse grid cell of longitude, see geofence.py")
     
     # Associated attendance record (if successful)
     attendance = models.ForeignKey(
-        Attendance,
+        'activities.Attendance',
         on_delete=models.SET_NULL,
         null=True,
         blank=True,
@@ -254,14 +354,76 @@ class QRScanLog(models.Model):
             models.Index(fields=['activity', 'success']),
             models.Index(fields=['student', 'scanned_at']),
             models.Index(fields=['success', 'scanned_at']),
+            models.Index(
+                fields=['lat_bucket', 'lon_bucket'],
+                condition=models.Q(outside_geofence=True),
+                name='qrscanlog_outside_fence_geo',
+            ),
         ]
     
     def __str__(self):
         status = "Success" if self.success else "Failed"
         student_info = f" by {self.student.username}" if self.student else " (Anonymous)"
         return f"QR Scan {status}{student_info} - {self.scanned_at.strftime('%Y-%m-%d %H:%M')}"
+    
+    @property
+    def ip_address(self):
+        return self.client_address.address if self.client_address_id else None
+    
+    @property
+    def user_agent(self):
+        return self.agent.value if self.agent_id else ''
+    
+    def assign_geo_buckets(self):
+        """Fill lat_bucket / lon_bucket from the coordinates (bulk_create skips save())"""
+        self.lat_bucket = geo_bucket(self.latitude)
+        self.lon_bucket = geo_bucket(self.longitude)
 
 
+class QRScanMonthlySummary(models.Model):
+    """Per-activity, per-month totals for scan logs that have been archived"""
+    
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='scan_summaries')
+    month = models.DateField(help_text="First day of the month")
+    total_scans = models.PositiveIntegerField(default=0)
+    successful_scans = models.PositiveIntegerField(default=0)
+    failed_scans = models.PositiveIntegerField(default=0)
+    unique_students = models.PositiveIntegerField(
+        default=0,
+        help_text="Distinct students per archive pass, summed if a month is archived more than once"
+    )
+    first_scan_at = models.DateTimeField(null=True, blank=True)
+    last_scan_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('activity', 'month')
+        ordering = ['-month', 'activity']
+    
+    def __str__(self):
+        return f"{self.activity.title} - {self.month.strftime('%Y-%m')}: {self.total_scans} scans"
+
+
+class ScanLogArchiveCheckpoint(models.Model):
+    """Progress of the scan log archiver for one month, so it can resume after a crash"""
+    
+    month = models.DateField(unique=True, help_text="First day of the month")
+    archive_path = models.CharField(max_length=500)
+    summarized_pk = models.BigIntegerField(
+        default=0,
+        help_text="Summaries include scan logs up to this id; rows up to it are being archived"
+    )
+    archive_bytes = models.BigIntegerField(default=0, help_text="Committed size of the archive file")
+    rows_archived = models.PositiveIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['month']
+    
+    def __str__(self):
+        state = 'complete' if self.completed_at else 'in progress'
+        return f"Scan log archive {self.month.strftime('%Y-%m')} ({state}, {self.rows_archived} rows)"
+
 # Add these methods to your existing Activity model
 # If you can't modify the Activity model directly, create a separate file or use these in your views
 def get_active_qr_code(activity):
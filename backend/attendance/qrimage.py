@@ -0,0 +1,131 @@
+# attendance/qrimage.py - Server-side QR image rendering with an on-disk cache
+"""
+Renders QR payloads to PNG or SVG at a fixed set of sizes (QR_IMAGE_SIZES).
+
+Every rendered image is stored under QR_IMAGE_CACHE_DIR at a path derived
+from a SHA-256 of ``(payload, size, format)``. The same digest is the image's
+strong ETag, so a repeat request is answered with a 304 or a plain file read
+without rendering again. A given payload always renders to the same bytes,
+which is what makes ``Cache-Control: immutable`` safe.
+
+Rendering needs the optional ``qrcode`` package (and Pillow for PNG); without
+it ``QRRenderingUnavailable`` is raised and the view answers 503.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+from django.conf import settings
+
+try:
+    import qrcode
+except ImportError:
+    qrcode = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Bump when the rendering changes so old cache entries stop matching
+RENDER_VERSION = 1
+QUIET_ZONE = 4  # modules of white border the QR spec asks for
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+class QRRenderingUnavailable(Exception):
+    """Raised when the optional rendering dependencies are not installed"""
+
+
+def image_digest(data, size, image_format):
+    """Cache key and strong ETag for one rendering"""
+    key = f'{RENDER_VERSION}:{image_format}:{size}:{data}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _module_matrix(data):
+    if qrcode is None:
+        raise QRRenderingUnavailable('QR rendering requires the "qrcode" package')
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        border=QUIET_ZONE,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def render_png(data, size):
+    if Image is None:
+        raise QRRenderingUnavailable('PNG rendering requires Pillow')
+    matrix = _module_matrix(data)
+    modules = len(matrix)
+    image = Image.new('1', (modules, modules), 1)
+    image.putdata([0 if dark else 1 for row in matrix for dark in row])
+    # Whole pixels per module keep every module the same width; centre the
+    # result on a white canvas of the requested size
+    scale = max(1, size // modules)
+    image = image.resize((modules * scale, modules * scale), Image.NEAREST)
+    if image.size[0] < size:
+        canvas = Image.new('1', (size, size), 1)
+        offset = (size - image.size[0]) // 2
+        canvas.paste(image, (offset, offset))
+        image = canvas
+    elif image.size[0] > size:
+        image = image.resize((size, size), Image.NEAREST)
+
+    output = io.BytesIO()
+    image.save(output, format='PNG', optimize=True)
+    return output.getvalue()
+
+
+def render_svg(data, size):
+    matrix = _module_matrix(data)
+    modules = len(matrix)
+    # One path of 1x1 squares in module units; the viewBox scales it to ``size``
+    path = ''.join(
+        f'M{x},{y}h1v1h-1z'
+        for y, row in enumerate(matrix)
+        for x, dark in enumerate(row)
+        if dark
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="{modules}" height="{modules}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    ).encode('utf-8')
+
+
+RENDERERS = {
+    'png': render_png,
+    'svg': render_svg,
+}
+
+
+def cached_image_path(data, size, image_format):
+    """Return ``(path, etag)`` for a rendering, rendering it on a cache miss"""
+    digest = image_digest(data, size, image_format)
+    directory = os.path.join(str(settings.QR_IMAGE_CACHE_DIR), digest[:2])
+    path = os.path.join(directory, f'{digest}.{image_format}')
+    if os.path.exists(path):
+        return path, digest
+
+    content = RENDERERS[image_format](data, size)
+    os.makedirs(directory, exist_ok=True)
+    # Write then rename so concurrent readers never see a partial file
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(content)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path, digest
@@ -0,0 +1,155 @@
+# attendance/retention.py - Archive and prune old QRScanLog rows
+"""
+Scan logs older than SCAN_LOG_RETENTION_DAYS are moved out of the database a
+whole calendar month at a time:
+
+1. Summarize: per-activity totals for the month are added to
+   QRScanMonthlySummary, and the checkpoint records the highest scan log id
+   they cover (``summarized_pk``).
+2. Archive: rows up to that id are read in chunks of
+   SCAN_LOG_ARCHIVE_BATCH_SIZE, appended to ``qrscanlog-YYYY-MM.ndjson.gz``
+   and deleted. Each chunk's DELETE and checkpoint update commit together in
+   one short transaction, with an optional pause between chunks so check-ins
+   are never blocked for long.
+
+An interrupted run resumes from its ScanLogArchiveCheckpoint. The archive is
+truncated back to the last committed size, so the chunk that was in flight is
+written again exactly once. Rows that show up in an already archived month
+(late offline uploads) are handled by another summarize/archive pass on the
+next run.
+"""
+import logging
+import os
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Q
+from django.utils import timezone
+
+from beyond_eams.archiving import append_ndjson_gz, next_month, prepare_archive
+from .models import QRScanLog, QRScanMonthlySummary, ScanLogArchiveCheckpoint
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = (
+    'id', 'activity_id', 'qr_code_id', 'student_id', 'attendance_id', 'scanned_at',
+    'success', 'error_message', 'client_scan_id', 'device_id', 'latitude', 'longitude',
+)
+
+
+def retention_cutoff(days=None, now=None):
+    """Start of the month containing ``now - days``; everything before it is archived"""
+    days = settings.SCAN_LOG_RETENTION_DAYS if days is None else days
+    boundary = timezone.localtime((now or timezone.now()) - timedelta(days=days))
+    return boundary.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _month_bounds(month):
+    start = timezone.make_aware(datetime.combine(month, dt_time.min))
+    end = timezone.make_aware(datetime.combine(next_month(month), dt_time.min))
+    return start, end
+
+
+def months_to_archive(cutoff):
+    """Months with scan logs before the cutoff, plus any unfinished checkpoints"""
+    months = {
+        timezone.localtime(value).date()
+        for value in QRScanLog.objects.filter(scanned_at__lt=cutoff).datetimes('scanned_at', 'month')
+    }
+    months.update(
+        ScanLogArchiveCheckpoint.objects.filter(completed_at__isnull=True).values_list('month', flat=True)
+    )
+    return sorted(months)
+
+
+def month_scan_logs(month):
+    start, end = _month_bounds(month)
+    return QRScanLog.objects.filter(scanned_at__gte=start, scanned_at__lt=end)
+
+
+def _summarize(checkpoint, scan_logs, max_pk):
+    """Add the month's not-yet-summarized scans to the per-activity summaries"""
+    totals = scan_logs.filter(
+        pk__gt=checkpoint.summarized_pk, pk__lte=max_pk
+    ).order_by().values('activity_id').annotate(
+        total=Count('id'),
+        successful=Count('id', filter=Q(success=True)),
+        students=Count('student_id', distinct=True),
+        first=Min('scanned_at'),
+        last=Max('scanned_at'),
+    )
+
+    with transaction.atomic():
+        for row in totals:
+            summary, created = QRScanMonthlySummary.objects.select_for_update().get_or_create(
+                activity_id=row['activity_id'],
+                month=checkpoint.month,
+            )
+            summary.total_scans += row['total']
+            summary.successful_scans += row['successful']
+            summary.failed_scans += row['total'] - row['successful']
+            summary.unique_students += row['students']
+            summary.first_scan_at = min(filter(None, [summary.first_scan_at, row['first']]))
+            summary.last_scan_at = max(filter(None, [summary.last_scan_at, row['last']]))
+            summary.save()
+
+        checkpoint.summarized_pk = max_pk
+        checkpoint.completed_at = None
+        checkpoint.save(update_fields=['summarized_pk', 'completed_at', 'updated_at'])
+
+
+def _archive_summarized(checkpoint, scan_logs, batch_size, pause):
+    """Append summarized rows to the archive and delete them, one chunk per transaction"""
+    prepare_archive(checkpoint.archive_path, checkpoint.archive_bytes)
+    pending = scan_logs.filter(pk__lte=checkpoint.summarized_pk).order_by('pk').values(
+        *ARCHIVE_FIELDS,
+        ip_address=F('client_address__address'),
+        user_agent=F('agent__value'),
+    )
+
+    archived = 0
+    while True:
+        chunk = list(pending[:batch_size])
+        if not chunk:
+            return archived
+
+        archive_bytes = append_ndjson_gz(checkpoint.archive_path, chunk)
+        with transaction.atomic():
+            QRScanLog.objects.filter(pk__in=[row['id'] for row in chunk]).delete()
+            checkpoint.archive_bytes = archive_bytes
+            checkpoint.rows_archived += len(chunk)
+            checkpoint.save(update_fields=['archive_bytes', 'rows_archived', 'updated_at'])
+
+        archived += len(chunk)
+        if pause:
+            time.sleep(pause)
+
+
+def archive_month(month, archive_dir=None, batch_size=None, pause_ms=None):
+    """Summarize, archive and delete one month of scan logs; returns rows archived"""
+    archive_dir = archive_dir or settings.SCAN_LOG_ARCHIVE_DIR
+    batch_size = batch_size or settings.SCAN_LOG_ARCHIVE_BATCH_SIZE
+    pause_ms = settings.SCAN_LOG_ARCHIVE_PAUSE_MS if pause_ms is None else pause_ms
+
+    checkpoint, _ = ScanLogArchiveCheckpoint.objects.get_or_create(
+        month=month,
+        defaults={'archive_path': os.path.join(str(archive_dir), f"qrscanlog-{month.strftime('%Y-%m')}.ndjson.gz")},
+    )
+    scan_logs = month_scan_logs(month)
+
+    archived = 0
+    while True:
+        # Finish the current pass before summarizing anything newer
+        if not scan_logs.filter(pk__lte=checkpoint.summarized_pk).exists():
+            max_pk = scan_logs.filter(pk__gt=checkpoint.summarized_pk).aggregate(max_pk=Max('pk'))['max_pk']
+            if max_pk is None:
+                break
+            _summarize(checkpoint, scan_logs, max_pk)
+        archived += _archive_summarized(checkpoint, scan_logs, batch_size, pause_ms / 1000)
+
+    checkpoint.completed_at = timezone.now()
+    checkpoint.save(update_fields=['completed_at', 'updated_at'])
+    logger.info(f"Archived {archived} scan logs for {month.strftime('%Y-%m')} to {checkpoint.archive_path}")
+    return archived
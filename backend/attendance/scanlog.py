@@ -0,0 +1,219 @@
+# attendance/scanlog.py - Buffered, asynchronous QRScanLog writer
+"""
+Check-in requests hand their QRScanLog rows to ``scan_log_writer.log(...)``
+instead of inserting them. A background thread batches the queued rows and
+writes them with ``bulk_create`` every SCAN_LOG_BATCH_SIZE rows or
+SCAN_LOG_FLUSH_INTERVAL_MS milliseconds, whichever comes first.
+
+The queue is bounded (SCAN_LOG_MAX_QUEUE). When it is full, ``log()`` blocks
+for up to SCAN_LOG_ENQUEUE_TIMEOUT_MS (back-pressure) and then drops the row
+rather than stall the check-in; drops are counted in ``metrics()``. Queued
+rows are drained when the process exits; ``flush()`` waits for everything
+queued so far to be written without stopping the thread.
+
+The client's IP address and User-Agent are interned (see dimensions.py) at
+flush time, so a cold dimension lookup never lands on the request path.
+
+With SCAN_LOG_ASYNC = False rows are written inline, which is what tests,
+benchmarks and management commands running inside a transaction want.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .dimensions import client_dimensions
+from .models import QRScanLog
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class ScanLogWriter:
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+
+    # ---- producer side -------------------------------------------------
+
+    def log(self, ip_address=None, user_agent='', **fields):
+        """Queue one QRScanLog row; returns False if it had to be dropped"""
+        row = QRScanLog(**fields)
+        row._client = (ip_address, user_agent)
+        if not settings.SCAN_LOG_ASYNC:
+            self._write([row])
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=settings.SCAN_LOG_ENQUEUE_TIMEOUT_MS / 1000)
+        except queue.Full:
+            self._bump('dropped')
+            logger.warning('QR scan log queue is full, dropping scan log row')
+            return False
+        self._bump('enqueued')
+        return True
+
+    def metrics(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total_flush_ms = stats.pop('total_flush_ms')
+        stats['avg_flush_ms'] = round(total_flush_ms / stats['flushes'], 2) if stats['flushes'] else 0.0
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['queue_capacity'] = settings.SCAN_LOG_MAX_QUEUE
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def flush(self, timeout=10):
+        """Block until every row queued so far is written; returns False on timeout"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        flushed = threading.Event()
+        try:
+            self._queue.put(flushed, timeout=timeout)
+        except queue.Full:
+            return False
+        return flushed.wait(timeout)
+
+    def shutdown(self, timeout=10):
+        """Stop the background thread after draining everything queued"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    # ---- consumer side -------------------------------------------------
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue(maxsize=settings.SCAN_LOG_MAX_QUEUE)
+                atexit.register(self.shutdown)
+            self._thread = threading.Thread(target=self._run, name='qr-scan-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch_size = settings.SCAN_LOG_BATCH_SIZE
+        interval = settings.SCAN_LOG_FLUSH_INTERVAL_MS / 1000
+        try:
+            while True:
+                # Sleep until there is work, then collect until the batch is
+                # full or the flush interval has passed
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                if isinstance(item, threading.Event):
+                    item.set()
+                    continue
+                batch = [item]
+                deadline = time.monotonic() + interval
+                stopping = False
+                flushed = None
+                while len(batch) < batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    if isinstance(item, threading.Event):
+                        flushed = item
+                        break
+                    batch.append(item)
+                close_old_connections()
+                self._write(batch)
+                if flushed is not None:
+                    flushed.set()
+                if stopping:
+                    break
+            self._drain()
+        finally:
+            connection.close()
+
+    def _drain(self):
+        """Write anything still queued at shutdown"""
+        batch = []
+        waiting = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                waiting.append(item)
+            elif item is not _STOP:
+                batch.append(item)
+        if batch:
+            self._write(batch)
+        for flushed in waiting:
+            flushed.set()
+
+    def _write(self, rows):
+        started = time.perf_counter()
+        try:
+            for row in rows:
+                client = getattr(row, '_client', None)
+                if client is not None:
+                    for field, value in client_dimensions(*client).items():
+                        setattr(row, field, value)
+                row.assign_geo_buckets()
+            with transaction.atomic():
+                QRScanLog.objects.bulk_create(rows, batch_size=settings.SCAN_LOG_BATCH_SIZE)
+            written = len(rows)
+        except Exception as e:
+            # One bad row (e.g. an activity deleted meanwhile) must not sink the batch
+            logger.error(f"QR scan log batch insert failed, retrying row by row: {str(e)}")
+            written = 0
+            for row in rows:
+                try:
+                    row.pk = None
+                    with transaction.atomic():
+                        row.save()
+                    written += 1
+                except Exception as row_error:
+                    logger.error(f"Dropping QR scan log row: {str(row_error)}")
+            self._bump('failed', len(rows) - written)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['written'] += written
+            self._stats['flushes'] += 1
+            self._stats['last_flush_ms'] = round(elapsed_ms, 2)
+            self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 2)
+            self._stats['total_flush_ms'] += elapsed_ms
+
+    def _bump(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+
+scan_log_writer = ScanLogWriter()
@@ -0,0 +1,42 @@
+# attendance/signals.py - Keep the check-in cache and live watchers in step with activities and enrollments
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from activities.models import Activity, Attendance, Enrollment
+from .checkin import invalidate_checkin_entry, warm_checkin_entry
+from .live import checkin_arrival, publish_checkins, publish_resync
+
+
+@receiver(post_save, sender=Activity)
+def refresh_checkin_entry_on_activity_save(sender, instance, **kwargs):
+    """Warm the entry once an activity goes live; otherwise just drop it"""
+    if instance.status == 'ongoing':
+        warm_checkin_entry(instance)
+    else:
+        invalidate_checkin_entry(instance.id)
+
+
+@receiver(post_delete, sender=Activity)
+def drop_checkin_entry_on_activity_delete(sender, instance, **kwargs):
+    invalidate_checkin_entry(instance.id)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def drop_checkin_entry_on_enrollment_change(sender, instance, **kwargs):
+    """Roster changed - the entry is rebuilt lazily on the next scan"""
+    invalidate_checkin_entry(instance.activity_id)
+
+
+@receiver(post_save, sender=Attendance)
+def publish_attendance_save(sender, instance, created, **kwargs):
+    """New check-ins go to live watchers as arrivals; any other change makes them reload"""
+    if created and instance.status == 'present':
+        publish_checkins(instance.activity_id, [checkin_arrival(instance)])
+    elif not created:
+        publish_resync(instance.activity_id)
+
+
+@receiver(post_delete, sender=Attendance)
+def publish_attendance_delete(sender, instance, **kwargs):
+    publish_resync(instance.activity_id)
@@ -0,0 +1,236 @@
+# attendance/sync.py - Batch ingest of scans collected offline by scanner devices
+"""
+Coordinators' phones record scans while offline and upload them later as one
+batch. Every record carries a device-generated ``scan_id`` (UUID) which is
+stored on its QRScanLog row, so uploading the same batch again returns the
+original outcomes without writing anything.
+
+A scan's ``scanned_at`` comes from the device clock. Times further ahead of
+the server than CHECKIN_SYNC_CLOCK_SKEW_SECONDS make the record invalid, and
+scans outside the activity (from CHECKIN_SYNC_EARLY_MINUTES before it starts
+until it ends) are rejected.
+
+Validation is done in bulk: a fixed handful of queries per batch (known scan
+ids, activities, users, enrollments, existing attendance) regardless of how
+many records are uploaded, with each activity's venue geofence built once.
+It is followed by bulk_create for Attendance and QRScanLog rows and one
+set-based enrollment completion per activity.
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from activities.models import Activity, Attendance, Enrollment
+from activities.analytics import invalidate_arrival_offsets
+from activities.services import complete_enrollments
+from .checkin import check_scan_code
+from .dimensions import client_dimensions
+from .geofence import build_fence, check_geofence, parse_coordinate
+from .live import checkin_arrival, publish_checkins
+from .tokens import is_rotating_token
+from .models import QRScanLog
+
+User = get_user_model()
+
+# Per-record outcomes
+CHECKED_IN = 'checked_in'
+DUPLICATE = 'duplicate'
+REJECTED = 'rejected'
+INVALID = 'invalid'
+
+
+def _parse_record(record):
+    """Normalise one uploaded record, raising ValueError when malformed"""
+    if not isinstance(record, dict):
+        raise ValueError('Record must be an object')
+    try:
+        scan_id = uuid.UUID(str(record.get('scan_id')))
+    except ValueError:
+        raise ValueError('scan_id must be a UUID')
+    qr_code = str(record.get('qr_code') or '')
+    activity_id = record.get('activity_id')
+    if not activity_id and is_rotating_token(qr_code):
+        activity_id = qr_code.split('.')[1]
+    try:
+        activity_id = int(activity_id)
+        student_id = int(record.get('student_id'))
+    except (TypeError, ValueError):
+        raise ValueError('activity_id and student_id must be integers')
+
+    scanned_at = timezone.now()
+    if record.get('scanned_at'):
+        scanned_at = parse_datetime(str(record['scanned_at']))
+        if scanned_at is None:
+            raise ValueError('scanned_at must be an ISO 8601 datetime')
+        if timezone.is_naive(scanned_at):
+            scanned_at = timezone.make_aware(scanned_at)
+        if scanned_at > timezone.now() + timedelta(seconds=settings.CHECKIN_SYNC_CLOCK_SKEW_SECONDS):
+            raise ValueError('scanned_at is in the future')
+
+    return {
+        'scan_id': scan_id,
+        'activity_id': activity_id,
+        'student_id': student_id,
+        'qr_code': qr_code,
+        'scanned_at': scanned_at,
+        'latitude': parse_coordinate(record.get('latitude'), 90, 'latitude'),
+        'longitude': parse_coordinate(record.get('longitude'), 180, 'longitude'),
+    }
+
+
+def check_scan_time(activity, scanned_at):
+    """Return an error message if the scan falls outside the activity's check-in window"""
+    opens = activity['start_time'] - timedelta(minutes=settings.CHECKIN_SYNC_EARLY_MINUTES)
+    if not opens <= scanned_at <= activity['end_time']:
+        return 'Scan time is outside the activity check-in window'
+    return None
+
+
+def ingest_scan_batch(records, device_id='', ip_address=None, user_agent=''):
+    """Validate and record a batch of offline scans.
+
+    Returns ``(results, summary)`` where ``results`` has one entry per input
+    record, in order: ``{'scan_id', 'status', 'error'?}``.
+    """
+    results = [None] * len(records)
+    parsed = {}
+    for index, record in enumerate(records):
+        try:
+            parsed[index] = _parse_record(record)
+        except ValueError as e:
+            scan_id = record.get('scan_id') if isinstance(record, dict) else None
+            results[index] = {'scan_id': scan_id, 'status': INVALID, 'error': str(e)}
+
+    scan_ids = [record['scan_id'] for record in parsed.values()]
+    activity_ids = {record['activity_id'] for record in parsed.values()}
+    student_ids = {record['student_id'] for record in parsed.values()}
+
+    # Re-uploads: report what happened the first time
+    known_scans = {
+        scan_id: (success, error_message)
+        for scan_id, success, error_message in QRScanLog.objects.filter(
+            client_scan_id__in=scan_ids
+        ).values_list('client_scan_id', 'success', 'error_message')
+    }
+    activities = {
+        activity['activity_id']: activity
+        for activity in Activity.objects.filter(id__in=activity_ids).values(
+            'qr_code', 'qr_rotation_enabled', 'points_reward', 'start_time', 'end_time',
+            'venue_latitude', 'venue_longitude', 'geofence_radius_m', activity_id=F('id')
+        )
+    }
+    fences = {
+        activity_id: build_fence(activity['venue_latitude'], activity['venue_longitude'], activity['geofence_radius_m'])
+        for activity_id, activity in activities.items()
+    }
+    # Names ride along with live check-in events (live.py)
+    existing_users = User.objects.filter(id__in=student_ids).only('id', 'username', 'first_name', 'last_name').in_bulk()
+    enrolled = set(Enrollment.objects.filter(
+        activity_id__in=activity_ids, user_id__in=student_ids, status='enrolled'
+    ).values_list('activity_id', 'user_id'))
+    attended = set(Attendance.objects.filter(
+        activity_id__in=activity_ids, user_id__in=student_ids
+    ).values_list('activity_id', 'user_id'))
+
+    client = client_dimensions(ip_address, user_agent)
+    seen_scan_ids = set()
+    attendances = []
+    scan_logs = []
+    completed_by_activity = defaultdict(list)
+    arrivals_by_activity = defaultdict(list)
+
+    for index, record in parsed.items():
+        scan_id = record['scan_id']
+        result = {'scan_id': str(scan_id)}
+        results[index] = result
+
+        if scan_id in known_scans or scan_id in seen_scan_ids:
+            success, error_message = known_scans.get(scan_id, (None, ''))
+            result['status'] = DUPLICATE
+            if success is not None:
+                result['success'] = success
+                if error_message:
+                    result['error'] = error_message
+            continue
+        seen_scan_ids.add(scan_id)
+
+        activity = activities.get(record['activity_id'])
+        pair = (record['activity_id'], record['student_id'])
+        if activity is None:
+            error = 'Activity not found'
+        else:
+            # Tokens are checked against the window they were scanned in
+            error = (
+                check_scan_time(activity, record['scanned_at'])
+                or check_scan_code(activity, record['qr_code'], at=record['scanned_at'])
+                or ''
+            )
+        if not error and pair in attended:
+            error = 'Attendance already marked for this activity'
+        elif not error and pair not in enrolled:
+            error = 'Student is not enrolled in this activity'
+        outside_geofence = False
+        if not error:
+            error = check_geofence(fences[pair[0]], record['latitude'], record['longitude']) or ''
+            outside_geofence = bool(error)
+
+        if error:
+            result['status'] = REJECTED
+            result['error'] = error
+        else:
+            result['status'] = CHECKED_IN
+            attended.add(pair)
+            attendance = Attendance(
+                user_id=pair[1],
+                activity_id=pair[0],
+                status='present',
+                timestamp=record['scanned_at'],
+                verification_method='qr_code',
+                qr_code_used=record['qr_code'],
+                qr_scanned_at=record['scanned_at'],
+                latitude=record['latitude'],
+                longitude=record['longitude'],
+                **client,
+            )
+            attendances.append(attendance)
+            completed_by_activity[pair[0]].append(pair[1])
+            arrivals_by_activity[pair[0]].append(checkin_arrival(attendance, existing_users[pair[1]]))
+
+        # A log row needs a real activity; unknown activities are simply re-validated on re-upload
+        if activity is not None:
+            scan_log = QRScanLog(
+                activity_id=pair[0],
+                student_id=pair[1] if pair[1] in existing_users else None,
+                scanned_at=record['scanned_at'],
+                success=not error,
+                error_message=error,
+                client_scan_id=scan_id,
+                device_id=device_id,
+                **client,
+                latitude=record['latitude'],
+                longitude=record['longitude'],
+                outside_geofence=outside_geofence,
+            )
+            scan_log.assign_geo_buckets()
+            scan_logs.append(scan_log)
+
+    with transaction.atomic():
+        Attendance.objects.bulk_create(attendances, ignore_conflicts=True, batch_size=500)
+        for activity_id, user_ids in completed_by_activity.items():
+            complete_enrollments(activity_id, user_ids, activities[activity_id]['points_reward'])
+            publish_checkins(activity_id, arrivals_by_activity[activity_id])
+        QRScanLog.objects.bulk_create(scan_logs, ignore_conflicts=True, batch_size=500)
+    # Late uploads may land on completed activities whose analytics are cached
+    invalidate_arrival_offsets(*completed_by_activity)
+
+    summary = defaultdict(int)
+    for result in results:
+        summary[result['status']] += 1
+    return results, dict(summary)
@@ -1,3 +1,492 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from activities.models import Attendance, Enrollment
+from beyond_eams import archiving
+from beyond_eams.pubsub import broker
+from beyond_eams.testing import attend, enroll, make_activity, make_user
+from . import retention
+from .checkin import CACHE_KEY, get_checkin_entry, is_enrolled, warm_checkin_entry
+from .dimensions import clear_cache as clear_dimension_cache
+from .live import TOPIC as LIVE_TOPIC, live_attendance_events
+from .models import (
+    ActivityQRCode, Attendance as CheckIn, ClientAddress, QRScanLog, QRScanMonthlySummary,
+    ScanLogArchiveCheckpoint, UserAgent,
+)
+from .qrimage import image_digest
+from .scanlog import ScanLogWriter
+from .sync import CHECKED_IN, DUPLICATE, INVALID, REJECTED, ingest_scan_batch
+from .tokens import InvalidToken, current_window, make_rotating_token, verify_rotating_token
+
+
+class ActivityQRCodeConsumeTests(TransactionTestCase):
+    """consume() must never grant more scans than max_uses, however many race for it"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.activity = make_activity(title='QR concurrency', status='ongoing')
+
+    def _race(self, qr_code, attempts_per_thread=1):
+        """Every thread waits at a barrier, then calls consume() on its own connection"""
+        start = threading.Barrier(self.THREADS)
+
+        def scanner():
+            start.wait()
+            try:
+                return sum(
+                    ActivityQRCode(pk=qr_code.pk).consume() for _ in range(attempts_per_thread)
+                )
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            futures = [pool.submit(scanner) for _ in range(self.THREADS)]
+            return sum(future.result() for future in futures)
+
+    def _qr_code(self, **fields):
+        return ActivityQRCode.objects.create(
+            activity=self.activity,
+            expires_at=timezone.now() + timedelta(hours=1),
+            **fields,
+        )
+
+    def test_single_use_code_grants_exactly_one_scan(self):
+        qr_code = self._qr_code(max_uses=1)
+
+        self.assertEqual(self._race(qr_code), 1)
+        qr_code.refresh_from_db()
+        self.assertEqual(qr_code.current_uses, 1)
+
+    def test_granted_scans_match_max_uses(self):
+        qr_code = self._qr_code(max_uses=10)
+
+        self.assertEqual(self._race(qr_code, attempts_per_thread=5), 10)
+        qr_code.refresh_from_db()
+        self.assertEqual(qr_code.current_uses, 10)
+
+    def test_expired_or_inactive_codes_grant_nothing(self):
+        expired = ActivityQRCode.objects.create(
+            activity=self.activity, expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        inactive = self._qr_code(is_active=False)
+
+        self.assertFalse(expired.consume())
+        self.assertFalse(inactive.consume())
+
+
+class ActivityQRCodeUsableTests(TestCase):
+    def test_max_uses_zero_is_exhausted_not_unlimited(self):
+        qr_code = ActivityQRCode.objects.create(activity=make_activity(), max_uses=0)
+
+        self.assertFalse(qr_code.is_valid)
+        self.assertFalse(qr_code.consume())
+        self.assertFalse(ActivityQRCode.usable().filter(pk=qr_code.pk).exists())
+
+
+class ActivityRosterTests(TestCase):
+    def setUp(self):
+        self.activity = make_activity(title='Roster')
+        self.coordinator = make_user('coordinator', role='coordinator')
+
+    def _attend(self, username, **fields):
+        attend(self.activity, make_user(username), **fields)
+
+    def test_verification_method_decides_qr_or_manual(self):
+        # Rotating-token scans have no qr_code_used but are still QR check-ins
+        self._attend('rotating', verification_method='qr_code')
+        self._attend('static', verification_method='qr_code', qr_code_used='ABC123')
+        self._attend('marked', verification_method='manual', marked_by=self.coordinator)
+        client = APIClient()
+        client.force_authenticate(self.coordinator)
+
+        response = client.get(reverse('activity-attendance', args=[self.activity.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['statistics']['qr_checkins'], 2)
+        self.assertEqual(response.data['statistics']['manual_checkins'], 1)
+        methods = {entry['student']['name']: entry['verification_method'] for entry in response.data['attendances']}
+        self.assertEqual(methods, {'rotating': 'QR Code', 'static': 'QR Code', 'marked': 'Manual'})
+
+
+class CheckInAdminTests(TestCase):
+    def test_compat_model_is_read_only_in_admin(self):
+        request = RequestFactory().get('/')
+        request.user = make_user('root', role='admin', is_staff=True, is_superuser=True)
+        model_admin = admin.site._registry[CheckIn]
+
+        self.assertFalse(model_admin.has_add_permission(request))
+        self.assertFalse(model_admin.has_change_permission(request))
+        self.assertFalse(model_admin.has_delete_permission(request))
+        self.assertTrue(model_admin.has_view_permission(request))
+
+
+@override_settings(SCAN_LOG_ASYNC=False)
+class CheckInHotPathTests(TestCase):
+    """A warm QR scan costs one INSERT and one enrollment UPDATE, nothing else"""
+
+    def setUp(self):
+        self.activity = make_activity(title='Hot path', status='ongoing', points_reward=5)
+        self.student = make_user('scanner')
+        enroll(self.activity, self.student)
+        warm_checkin_entry(self.activity)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def _scan(self):
+        """POST one scan; returns the response and the check-in statements it ran"""
+        # Scan logs are batched off the request path in production, so they aren't counted
+        scan_log_tables = [model._meta.db_table for model in (QRScanLog, UserAgent, ClientAddress)]
+        statements = []
+
+        def record(execute, sql, params, many, context):
+            if not sql.upper().startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')) \
+                    and not any(table in sql for table in scan_log_tables):
+                statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.post(
+                reverse('mark-attendance'),
+                {'activity_id': self.activity.id, 'qr_code': self.activity.qr_code},
+                format='json',
+            )
+        return response, statements
+
+    def test_warm_scan_runs_two_statements(self):
+        response, statements = self._scan()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(statements), 2, statements)
+        enrollment = Enrollment.objects.get(user=self.student, activity=self.activity)
+        self.assertEqual((enrollment.status, enrollment.points_awarded), ('completed', 5))
+
+    def test_repeat_scan_is_rejected_by_the_unique_constraint(self):
+        self._scan()
+
+        response, statements = self._scan()
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(statements), 1, statements)
+        self.assertEqual(Attendance.objects.filter(user=self.student).count(), 1)
+
+
+class CheckInEntryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_only_activities_open_for_check_in_are_cached(self):
+        for status, cached in (('ongoing', True), ('upcoming', True), ('draft', False), ('cancelled', False)):
+            with self.subTest(status=status):
+                activity = make_activity(status=status)
+                student = make_user(f'student-{status}')
+                enroll(activity, student)
+
+                entry = get_checkin_entry(activity.id)
+
+                self.assertEqual(entry['activity_id'], activity.id)
+                self.assertTrue(is_enrolled(entry, student.id))
+                self.assertEqual(cache.get(CACHE_KEY.format(activity.id)) is not None, cached)
+
+    def test_unknown_activity_has_no_entry(self):
+        self.assertIsNone(get_checkin_entry(999999))
+
+
+class ScanLogArchiveTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        scanned_at = timezone.localtime(timezone.now() - timedelta(days=300))
+        self.month = scanned_at.date().replace(day=1)
+        self.activity = make_activity(scanned_at, status='completed')
+        student = make_user('student')
+        self.old_ids = [
+            QRScanLog.objects.create(
+                activity=self.activity, student=student, scanned_at=scanned_at, success=index % 2 == 0,
+            ).pk
+            for index in range(5)
+        ]
+        self.recent = QRScanLog.objects.create(activity=self.activity, student=student, success=True)
+
+    def _archived_ids(self):
+        checkpoint = ScanLogArchiveCheckpoint.objects.get(month=self.month)
+        with gzip.open(checkpoint.archive_path, 'rt', encoding='utf-8') as archive:
+            return [json.loads(line)['id'] for line in archive]
+
+    def test_archives_exactly_the_deleted_rows(self):
+        archived = retention.archive_month(self.month, archive_dir=self.archive_dir, batch_size=2, pause_ms=0)
+
+        self.assertEqual(archived, 5)
+        self.assertEqual(self._archived_ids(), self.old_ids)
+        self.assertEqual(list(QRScanLog.objects.values_list('pk', flat=True)), [self.recent.pk])
+        summary = QRScanMonthlySummary.objects.get(activity=self.activity, month=self.month)
+        self.assertEqual((summary.total_scans, summary.successful_scans, summary.failed_scans), (5, 3, 2))
+
+    def test_resumes_after_a_batch_is_interrupted(self):
+        calls = []
+
+        def crash_after_second_write(path, records):
+            size = archiving.append_ndjson_gz(path, records)
+            calls.append(size)
+            if len(calls) == 2:
+                raise RuntimeError('killed before the delete committed')
+            return size
+
+        with mock.patch.object(retention, 'append_ndjson_gz', crash_after_second_write):
+            with self.assertRaises(RuntimeError):
+                retention.archive_month(self.month, archive_dir=self.archive_dir, batch_size=2, pause_ms=0)
+        self.assertEqual(QRScanLog.objects.filter(pk__in=self.old_ids).count(), 3)
+
+        retention.archive_month(self.month, archive_dir=self.archive_dir, batch_size=2, pause_ms=0)
+
+        # The chunk in flight is written again exactly once
+        self.assertEqual(self._archived_ids(), self.old_ids)
+        self.assertFalse(QRScanLog.objects.filter(pk__in=self.old_ids).exists())
+        checkpoint = ScanLogArchiveCheckpoint.objects.get(month=self.month)
+        self.assertEqual(checkpoint.rows_archived, 5)
+        self.assertIsNotNone(checkpoint.completed_at)
+        summary = QRScanMonthlySummary.objects.get(activity=self.activity, month=self.month)
+        self.assertEqual(summary.total_scans, 5)
+
+    def test_dry_run_deletes_nothing(self):
+        call_command('archive_scan_logs', dry_run=True, archive_dir=self.archive_dir, stdout=io.StringIO())
+
+        self.assertEqual(QRScanLog.objects.count(), 6)
+        self.assertFalse(ScanLogArchiveCheckpoint.objects.exists())
+        self.assertFalse(QRScanMonthlySummary.objects.exists())
+
+
+class OfflineSyncTests(TestCase):
+    def setUp(self):
+        self.start = timezone.now() - timedelta(hours=2)
+        self.activity = make_activity(self.start, hours=1, status='completed')
+        self.students = [make_user(f'student{i}') for i in range(3)]
+        enroll(self.activity, *self.students)
+
+    def _scan(self, student, scanned_at):
+        return {
+            'scan_id': str(uuid.uuid4()),
+            'activity_id': self.activity.pk,
+            'student_id': student.pk,
+            'qr_code': self.activity.qr_code,
+            'scanned_at': scanned_at.isoformat(),
+        }
+
+    def _ingest(self, records):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ingest_scan_batch(records, device_id='scanner-1')
+
+    def test_reupload_reports_the_first_outcome_without_writing(self):
+        records = [self._scan(student, self.start + timedelta(minutes=5)) for student in self.students]
+        _, first = self._ingest(records)
+
+        results, again = self._ingest(records)
+
+        self.assertEqual(first, {CHECKED_IN: 3})
+        self.assertEqual(again, {DUPLICATE: 3})
+        self.assertTrue(all(result['success'] for result in results))
+        self.assertEqual(Attendance.objects.filter(activity=self.activity).count(), 3)
+        self.assertEqual(QRScanLog.objects.filter(activity=self.activity).count(), 3)
+
+    def test_scans_outside_the_activity_or_from_the_future_are_refused(self):
+        early, late, future = self.students
+        records = [
+            self._scan(early, self.start - timedelta(hours=1)),
+            self._scan(late, self.start + timedelta(minutes=90)),
+            self._scan(future, timezone.now() + timedelta(hours=1)),
+        ]
+
+        results, summary = self._ingest(records)
+
+        self.assertEqual(summary, {REJECTED: 2, INVALID: 1})
+        self.assertEqual(results[0]['error'], 'Scan time is outside the activity check-in window')
+        self.assertEqual(results[2]['error'], 'scanned_at is in the future')
+        self.assertFalse(Attendance.objects.filter(activity=self.activity).exists())
+
+    def test_small_clock_skew_is_tolerated(self):
+        self.activity.end_time = timezone.now() + timedelta(hours=1)
+        self.activity.save()
+
+        _, summary = self._ingest([self._scan(self.students[0], timezone.now() + timedelta(seconds=30))])
+
+        self.assertEqual(summary, {CHECKED_IN: 1})
+
+
+@override_settings(SCAN_LOG_ASYNC=True, SCAN_LOG_FLUSH_INTERVAL_MS=20)
+class ScanLogWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.activity = make_activity(status='ongoing')
+        self.writer = ScanLogWriter()
+        self.addCleanup(self.writer.shutdown)
+        # Interned ids don't survive the table flush between transaction tests
+        clear_dimension_cache()
+
+    def _log(self, **fields):
+        return self.writer.log(activity_id=self.activity.pk, success=True, ip_address='10.0.0.1', **fields)
+
+    def _hold_writes(self):
+        """Make the writer thread wait inside its next write until the returned event is set"""
+        writing, release = threading.Event(), threading.Event()
+        write = self.writer._write
+
+        def held_write(rows):
+            writing.set()
+            release.wait(5)
+            write(rows)
+
+        self.writer._write = held_write
+        return writing, release
+
+    def test_flush_writes_everything_queued(self):
+        for _ in range(5):
+            self.assertTrue(self._log(user_agent='Scanner/1.0'))
+
+        self.assertTrue(self.writer.flush())
+
+        self.assertEqual(QRScanLog.objects.filter(activity=self.activity).count(), 5)
+        self.assertEqual(QRScanLog.objects.filter(client_address__address='10.0.0.1').count(), 5)
+        metrics = self.writer.metrics()
+        self.assertEqual((metrics['enqueued'], metrics['written'], metrics['dropped']), (5, 5, 0))
+        self.assertTrue(metrics['running'])
+
+    @override_settings(SCAN_LOG_MAX_QUEUE=1, SCAN_LOG_BATCH_SIZE=1, SCAN_LOG_ENQUEUE_TIMEOUT_MS=20)
+    def test_full_queue_drops_after_the_back_pressure_wait(self):
+        writing, release = self._hold_writes()
+        self._log()
+        self.assertTrue(writing.wait(5))
+        self.assertTrue(self._log())  # fills the queue
+
+        self.assertFalse(self._log())
+
+        release.set()
+        self.assertTrue(self.writer.flush())
+        metrics = self.writer.metrics()
+        self.assertEqual((metrics['enqueued'], metrics['written'], metrics['dropped']), (2, 2, 1))
+        self.assertEqual(QRScanLog.objects.count(), 2)
+
+    @override_settings(SCAN_LOG_MAX_QUEUE=1, SCAN_LOG_BATCH_SIZE=1, SCAN_LOG_ENQUEUE_TIMEOUT_MS=5000)
+    def test_full_queue_blocks_until_the_writer_catches_up(self):
+        writing, release = self._hold_writes()
+        self._log()
+        self.assertTrue(writing.wait(5))
+        self.assertTrue(self._log())
+
+        threading.Timer(0.05, release.set).start()
+        self.assertTrue(self._log())
+
+        self.assertTrue(self.writer.flush())
+        metrics = self.writer.metrics()
+        self.assertEqual((metrics['enqueued'], metrics['written'], metrics['dropped']), (3, 3, 0))
+
+
+class LiveAttendanceStreamTests(TestCase):
+    def setUp(self):
+        self.activity = make_activity(status='ongoing')
+        self.students = [make_user(f'student{i}', first_name=f'Student{i}') for i in range(2)]
+        attend(self.activity, self.students[0])
+        self.topic = LIVE_TOPIC.format(self.activity.pk)
+
+    def _check_in(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            attend(self.activity, self.students[1], verification_method='qr_code')
+
+    def test_stream_pushes_checkins_and_unsubscribes_on_disconnect(self):
+        async def scenario():
+            events = live_attendance_events(self.activity.pk)
+            snapshot = await asyncio.wait_for(events.__anext__(), 5)
+            await sync_to_async(self._check_in)()
+            pushed = await asyncio.wait_for(events.__anext__(), 5)
+            subscribed = broker.subscriber_count(self.topic)
+            # The ASGI handler closes the generator when the client goes away
+            await events.aclose()
+            return snapshot, pushed, subscribed
+
+        snapshot, pushed, subscribed = async_to_sync(scenario)()
+
+        self.assertIn('event: snapshot', snapshot)
+        self.assertIn('"count":1', snapshot)
+        self.assertIn('event: checkin', pushed)
+        self.assertIn('"count":2', pushed)
+        self.assertIn(f'"student_id":{self.students[1].pk}', pushed)
+        self.assertEqual(subscribed, 1)
+        self.assertEqual(broker.subscriber_count(self.topic), 0)
+
+
+@override_settings(QR_TOKEN_ROTATION_SECONDS=30, QR_TOKEN_GRACE_WINDOWS=1)
+class RotatingTokenTests(SimpleTestCase):
+    def setUp(self):
+        self.shown_at = timezone.now()
+        self.token = make_rotating_token(42, current_window(self.shown_at))
+
+    def test_token_verifies_for_its_window_and_the_grace_window(self):
+        self.assertEqual(verify_rotating_token(self.token, at=self.shown_at), 42)
+        self.assertEqual(verify_rotating_token(self.token, at=self.shown_at + timedelta(seconds=30)), 42)
+
+    def test_expired_or_future_tokens_are_refused(self):
+        for at in (self.shown_at + timedelta(seconds=60), self.shown_at - timedelta(seconds=30)):
+            with self.assertRaisesMessage(InvalidToken, 'QR code has expired'):
+                verify_rotating_token(self.token, at=at)
+
+    def test_forged_or_malformed_tokens_are_refused(self):
+        prefix, activity_id, window, signature = self.token.split('.')
+        forged = '.'.join([prefix, '43', window, signature])
+
+        with self.assertRaisesMessage(InvalidToken, 'Invalid QR token'):
+            verify_rotating_token(forged, at=self.shown_at)
+        with self.assertRaisesMessage(InvalidToken, 'Malformed QR token'):
+            verify_rotating_token('RQ1.42.not-a-window', at=self.shown_at)
+
+
+class QRImageTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_setting = override_settings(QR_IMAGE_CACHE_DIR=cache_dir)
+        cache_setting.enable()
+        self.addCleanup(cache_setting.disable)
+        self.activity = make_activity(status='ongoing')
+        self.url = reverse('qr-image', args=[self.activity.pk, 'svg'])
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('instructor', role='instructor'))
+
+    def test_revalidation_with_the_etag_is_a_304(self):
+        first = self.client.get(self.url, {'size': 256})
+        etag = first['ETag']
+
+        with mock.patch('attendance.views.cached_image_path') as render:
+            again = self.client.get(self.url, {'size': 256}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'image/svg+xml')
+        self.assertEqual(first['Cache-Control'], 'private, no-cache')
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], etag)
+        render.assert_not_called()
+
+    def test_pinned_url_is_immutable(self):
+        version = image_digest(self.activity.generate_qr_code_data(), 256, 'svg')
+
+        response = self.client.get(self.url, {'size': 256, 'v': version})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{version}"')
+        self.assertIn('immutable', response['Cache-Control'])
@@ -0,0 +1,73 @@
+# attendance/tokens.py - Stateless rotating QR tokens
+"""
+A rotating token encodes the activity id and the current time window and is
+signed with an HMAC over both:
+
+    RQ1.<activity_id>.<window>.<signature>
+
+where ``window = unix_time // QR_TOKEN_ROTATION_SECONDS``. The projector
+display asks for a fresh token every window; a screenshot stops verifying
+once its window (plus QR_TOKEN_GRACE_WINDOWS for slow scanners) has passed.
+Verification is pure CPU work - no ActivityQRCode lookup.
+"""
+import time
+
+from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+TOKEN_PREFIX = 'RQ1'
+_KEY_SALT = 'attendance.tokens.rotating_qr'
+_SIGNATURE_LENGTH = 32  # hex chars (128 bits) keeps the QR small
+
+
+class InvalidToken(Exception):
+    """Raised when a rotating token is malformed, forged or expired"""
+
+
+def is_rotating_token(value):
+    return isinstance(value, str) and value.startswith(TOKEN_PREFIX + '.')
+
+
+def current_window(at=None):
+    """Time window number for a datetime (defaults to now)"""
+    timestamp = at.timestamp() if at is not None else time.time()
+    return int(timestamp // settings.QR_TOKEN_ROTATION_SECONDS)
+
+
+def _sign(activity_id, window):
+    return salted_hmac(_KEY_SALT, f'{activity_id}:{window}', algorithm='sha256').hexdigest()[:_SIGNATURE_LENGTH]
+
+
+def make_rotating_token(activity_id, window=None):
+    """Token to display for an activity during the given (default: current) window"""
+    if window is None:
+        window = current_window()
+    return f'{TOKEN_PREFIX}.{activity_id}.{window}.{_sign(activity_id, window)}'
+
+
+def seconds_until_rotation():
+    rotation = settings.QR_TOKEN_ROTATION_SECONDS
+    return rotation - int(time.time()) % rotation
+
+
+def verify_rotating_token(token, at=None):
+    """Return the activity id a token was issued for, or raise InvalidToken
+
+    ``at`` is the moment of the scan; offline scanners pass the recorded scan
+    time so that tokens are checked against the window they were shown in.
+    """
+    try:
+        prefix, activity_id, window, signature = token.split('.')
+        activity_id = int(activity_id)
+        window = int(window)
+    except (AttributeError, ValueError):
+        raise InvalidToken('Malformed QR token')
+
+    if prefix != TOKEN_PREFIX or not constant_time_compare(signature, _sign(activity_id, window)):
+        raise InvalidToken('Invalid QR token')
+
+    now_window = current_window(at)
+    if window > now_window or now_window - window > settings.QR_TOKEN_GRACE_WINDOWS:
+        raise InvalidToken('QR code has expired, please scan the current code')
+
+    return activity_id
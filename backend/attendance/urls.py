@@ -6,11 +6,15 @@ urlpatterns = [
     # QR Code attendance marking (for students)
     path('mark/', views.mark_attendance, name='mark-attendance'),
     
+    # Batch upload of scans recorded offline by scanner devices
+    path('sync/', views.sync_offline_scans, name='sync-offline-scans'),
+    
     # Manual attendance marking (for instructors/coordinators)
     path('activity/<int:activity_id>/mark-manual/', views.mark_attendance_manual, name='mark-attendance-manual'),
     
     # Get attendance for an activity (for instructors/coordinators)
     path('activity/<int:activity_id>/', views.get_activity_attendance, name='activity-attendance'),
+    path('activity/<int:activity_id>/live/', views.attendance_live_stream, name='activity-attendance-live'),
     
     # Get student's own attendance records
     path('my-attendance/', views.get_student_attendance, name='my-attendance'),
@@ -18,4 +22,12 @@ urlpatterns = [
     # QR Code management
     path('activity/<int:activity_id>/generate-qr/', views.generate_qr_code, name='generate-qr-code'),
     path('activity/<int:activity_id>/qr-code/', views.get_qr_code, name='get-qr-code'),
+    path('activity/<int:activity_id>/rotating-qr/', views.get_rotating_qr_token, name='rotating-qr-token'),
+    path('activity/<int:activity_id>/qr-image.<str:image_format>', views.get_qr_image, name='qr-image'),
+    
+    # Scans from outside activity geofences
+    path('geofence/out-of-fence/', views.get_out_of_fence_analytics, name='out-of-fence-analytics'),
+    
+    # Scan log writer health
+    path('scan-log/metrics/', views.get_scan_log_metrics, name='scan-log-metrics'),
 ]
\ No newline at end of file
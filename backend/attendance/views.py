@@ -1,18 +1,62 @@
 # backend/attendance/views.py - Simplified for existing models
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.urls import reverse
+from django.utils.http import urlencode
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from datetime import timedelta
+import csv
+import json
 import logging
 
 from activities.models import Activity, Enrollment, Attendance
+from activities.services import complete_enrollments
 from accounts.models import User
+from beyond_eams.sse import authenticate_stream_request, event_stream_response, is_asgi_request
+from .models import QRScanLog
+from .checkin import check_scan_code, get_checkin_entry, is_enrolled
+from .geofence import check_geofence, parse_coordinate
+from .live import live_attendance_events
+from .qrimage import CONTENT_TYPES, QRRenderingUnavailable, cached_image_path, image_digest
+from .scanlog import scan_log_writer
+from .sync import ingest_scan_batch
+from .tokens import current_window, is_rotating_token, make_rotating_token, seconds_until_rotation
 
 logger = logging.getLogger(__name__)
 
+def _log_scan(request, activity_id, success, error_message='', **location):
+    """Hand the scan to the buffered QRScanLog writer (never blocks the check-in)
+    
+    ``location`` holds latitude / longitude / outside_geofence (and the
+    attendance_id of a successful check-in) when known.
+    """
+    scan_log_writer.log(
+        activity_id=activity_id,
+        student=request.user,
+        success=success,
+        error_message=error_message,
+        ip_address=request.META.get('REMOTE_ADDR'),
+        user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        **location,
+    )
+
+def _reject_scan(request, activity_id, error, http_status=status.HTTP_400_BAD_REQUEST, **location):
+    _log_scan(request, activity_id, success=False, error_message=error, **location)
+    return Response({
+        'success': False,
+        'error': error
+    }, status=http_status)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_attendance(request):
@@ -28,6 +72,10 @@ def mark_attendance(request):
     activity_id = request.data.get('activity_id')
     qr_code = request.data.get('qr_code')
     
+    # Rotating tokens carry their own activity id
+    if not activity_id and is_rotating_token(qr_code):
+        activity_id = qr_code.split('.')[1]
+    
     if not activity_id or not qr_code:
         return Response({
             'success': False,
@@ -42,82 +90,123 @@ def mark_attendance(request):
             'error': 'Invalid activity ID'
         }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Get the activity
     try:
-        activity = Activity.objects.get(id=activity_id)
-    except Activity.DoesNotExist:
+        location = {
+            'latitude': parse_coordinate(request.data.get('latitude'), 90, 'latitude'),
+            'longitude': parse_coordinate(request.data.get('longitude'), 180, 'longitude'),
+        }
+    except ValueError as e:
         return Response({
             'success': False,
-            'error': 'Activity not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Verify QR code matches activity
-    if not activity.qr_code or activity.qr_code != qr_code:
+    # Validate against the cached check-in entry (no database reads when warm)
+    entry = get_checkin_entry(activity_id)
+    if entry is None:
         return Response({
             'success': False,
-            'error': 'Invalid QR code for this activity'
-        }, status=status.HTTP_400_BAD_REQUEST)
+            'error': 'Activity not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Verify QR code (static or rotating token) matches activity
+    code_error = check_scan_code(entry, qr_code)
+    if code_error:
+        return _reject_scan(request, activity_id, code_error, **location)
     
     # Check if user is enrolled in this activity
-    enrollment = Enrollment.objects.filter(
-        user=request.user,
-        activity=activity,
-        status='enrolled'
-    ).first()
+    if not is_enrolled(entry, request.user.id):
+        return _reject_scan(request, activity_id, 'You are not enrolled in this activity', **location)
     
-    if not enrollment:
-        return Response({
-            'success': False,
-            'error': 'You are not enrolled in this activity'
-        }, status=status.HTTP_400_BAD_REQUEST)
+    # Reject scans from outside the venue geofence (bounding box, then haversine)
+    fence_error = check_geofence(entry.get('geofence'), location['latitude'], location['longitude'])
+    if fence_error:
+        return _reject_scan(request, activity_id, fence_error, http_status=status.HTTP_403_FORBIDDEN,
+                            outside_geofence=True, **location)
     
     try:
         with transaction.atomic():
-            # Check if already marked attendance
-            existing_attendance = Attendance.objects.filter(
+            # Create attendance record; the unique (user, activity) constraint
+            # rejects repeat scans without a separate existence check
+            attendance = Attendance(
                 user=request.user,
-                activity=activity
-            ).first()
-            
-            if existing_attendance:
-                return Response({
-                    'success': False,
-                    'error': 'Attendance already marked for this activity'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Create attendance record
-            attendance = Attendance.objects.create(
-                user=request.user,
-                activity=activity,
+                activity_id=activity_id,
                 status='present',
-                timestamp=timezone.now(),
-                qr_code_used=qr_code
+                verification_method='qr_code',
+                qr_code_used=qr_code,
+                qr_scanned_at=timezone.now(),
+                latitude=location['latitude'],
+                longitude=location['longitude'],
             )
+            attendance.save(sync_enrollment=False)
             
-            # Update enrollment status to completed
-            enrollment.status = 'completed'
-            enrollment.save()
-            enrollment.award_points()
-            
-            return Response({
-                'success': True,
-                'message': f'Attendance marked successfully for {activity.title}',
-                'attendance_id': attendance.id,
-                'checked_in_at': attendance.timestamp,
-                'activity': {
-                    'id': activity.id,
-                    'title': activity.title,
-                    'location': activity.location,
-                    'start_time': activity.start_time
-                }
-            }, status=status.HTTP_201_CREATED)
-            
+            # Complete the enrollment and award points in a single UPDATE
+            complete_enrollments(activity_id, [request.user.id], entry['points_reward'])
+    except IntegrityError:
+        return _reject_scan(request, activity_id, 'Attendance already marked for this activity', **location)
     except Exception as e:
         logger.error(f"Attendance marking error: {str(e)}")
+        return _reject_scan(
+            request, activity_id, 'Failed to mark attendance. Please try again.',
+            http_status=status.HTTP_500_INTERNAL_SERVER_ERROR, **location
+        )
+    
+    _log_scan(request, activity_id, success=True, attendance_id=attendance.id, **location)
+    return Response({
+        'success': True,
+        'message': f'Attendance marked successfully for {entry["title"]}',
+        'attendance_id': attendance.id,
+        'checked_in_at': attendance.timestamp,
+        'activity': {
+            'id': entry['activity_id'],
+            'title': entry['title'],
+            'location': entry['location'],
+            'start_time': entry['start_time']
+        }
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sync_offline_scans(request):
+    """Ingest a batch of scans recorded offline by a coordinator's scanner device"""
+    if request.user.role not in ['instructor', 'coordinator', 'admin']:
         return Response({
             'success': False,
-            'error': 'Failed to mark attendance. Please try again.'
+            'error': 'Only instructors, coordinators, and admins can sync scans'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    scans = request.data.get('scans')
+    if not isinstance(scans, list):
+        return Response({
+            'success': False,
+            'error': 'scans must be a list of scan records'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if len(scans) > settings.CHECKIN_SYNC_MAX_BATCH:
+        return Response({
+            'success': False,
+            'error': f'At most {settings.CHECKIN_SYNC_MAX_BATCH} scans can be synced per request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        results, summary = ingest_scan_batch(
+            scans,
+            device_id=str(request.data.get('device_id', ''))[:100],
+            ip_address=request.META.get('REMOTE_ADDR'),
+            user_agent=request.META.get('HTTP_USER_AGENT', ''),
+        )
+    except Exception as e:
+        logger.error(f"Offline scan sync error: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to sync scans. The batch can be safely re-uploaded.'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'success': True,
+        'summary': summary,
+        'results': results,
+    })
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -159,7 +248,8 @@ def mark_attendance_manual(request, activity_id):
     
     try:
         with transaction.atomic():
-            # Check if already attended
+            # Check if already attended; a new record completes the
+            # enrollment and awards points in Attendance.save
             attendance, created = Attendance.objects.get_or_create(
                 activity=activity,
                 user=student,
@@ -176,11 +266,6 @@ def mark_attendance_manual(request, activity_id):
                     'error': 'Student attendance already marked'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Update enrollment
-            enrollment.status = 'completed'
-            enrollment.save()
-            enrollment.award_points()
-            
             return Response({
                 'success': True,
                 'message': f'Successfully marked attendance for {student.get_full_name() or student.username}',
@@ -198,39 +283,103 @@ def mark_attendance_manual(request, activity_id):
             'error': 'Failed to mark attendance'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class RosterCSVRenderer(BaseRenderer):
+    """Lets ``?format=csv`` / ``Accept: text/csv`` through content negotiation
+    
+    The CSV itself is streamed by the view; only error payloads reach render().
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode('utf-8')
+
+class _EchoBuffer:
+    """File-like object for csv.writer that hands each row back instead of storing it"""
+    def write(self, value):
+        return value
+
+ROSTER_CSV_HEADER = [
+    'attendance_id', 'student_id', 'name', 'email', 'department',
+    'status', 'timestamp', 'marked_by', 'verification_method', 'notes',
+]
+
+def _roster_entry(attendance):
+    """The display values of one roster row, shared by the JSON and CSV output"""
+    user = attendance.user
+    return {
+        'id': attendance.id,
+        'student': {
+            'id': user.id,
+            'name': user.get_full_name() or user.username,
+            'email': user.email,
+            'department': getattr(user, 'department', 'N/A')
+        },
+        'status': attendance.status,
+        'timestamp': attendance.timestamp,
+        'marked_by': attendance.marked_by.get_full_name() if attendance.marked_by else 'QR Code',
+        'verification_method': 'QR Code' if attendance.verification_method == 'qr_code' else 'Manual',
+        'notes': attendance.notes or ''
+    }
+
+def _stream_roster_csv(attendances):
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(ROSTER_CSV_HEADER)
+    # iterator() keeps memory flat for large events instead of caching every row
+    for attendance in attendances.iterator(chunk_size=settings.ATTENDANCE_ROSTER_CSV_CHUNK_SIZE):
+        entry = _roster_entry(attendance)
+        student = entry['student']
+        yield writer.writerow([
+            entry['id'], student['id'], student['name'], student['email'], student['department'],
+            entry['status'], entry['timestamp'].isoformat(), entry['marked_by'],
+            entry['verification_method'], entry['notes'],
+        ])
+
+def _count_subquery(queryset, **filters):
+    """Correlated COUNT(*) of ``queryset`` rows for the outer activity"""
+    return Subquery(
+        queryset.filter(activity=OuterRef('pk'), **filters)
+        .order_by().values('activity').annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()
+    )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, BrowsableAPIRenderer, RosterCSVRenderer])
 def get_activity_attendance(request, activity_id):
-    """Get all attendance records for an activity"""
+    """Get all attendance records for an activity
+    
+    Two queries: the activity with every statistic computed as a correlated
+    count, then the roster. ``?format=csv`` streams the roster as CSV.
+    """
     # Check permissions
     if request.user.role not in ['instructor', 'coordinator', 'admin']:
         return Response({
             'error': 'Only instructors, coordinators, and admins can view attendance'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    activity = get_object_or_404(Activity, id=activity_id)
-    attendances = Attendance.objects.filter(activity=activity).select_related('user', 'marked_by')
+    activity = get_object_or_404(
+        Activity.objects.only('id', 'title', 'start_time', 'location').annotate(
+            total_enrolled=Coalesce(_count_subquery(Enrollment.objects, status__in=['enrolled', 'completed']), 0),
+            total_attended=Coalesce(_count_subquery(Attendance.objects), 0),
+            qr_checkins=Coalesce(_count_subquery(Attendance.objects, verification_method='qr_code'), 0),
+            manual_checkins=Coalesce(_count_subquery(Attendance.objects, verification_method='manual'), 0),
+        ),
+        id=activity_id
+    )
+    attendances = Attendance.objects.filter(activity=activity).select_related('user', 'marked_by').order_by('timestamp', 'id')
     
-    attendance_data = []
-    for attendance in attendances:
-        attendance_data.append({
-            'id': attendance.id,
-            'student': {
-                'id': attendance.user.id,
-                'name': attendance.user.get_full_name() or attendance.user.username,
-                'email': attendance.user.email,
-                'department': getattr(attendance.user, 'department', 'N/A')
-            },
-            'status': attendance.status,
-            'timestamp': attendance.timestamp,
-            'marked_by': attendance.marked_by.get_full_name() if attendance.marked_by else 'QR Code',
-            'verification_method': 'QR Code' if attendance.qr_code_used else 'Manual',
-            'notes': attendance.notes or ''
-        })
+    if request.accepted_renderer.format == 'csv':
+        response = StreamingHttpResponse(_stream_roster_csv(attendances), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="activity-{activity.id}-attendance.csv"'
+        return response
+    
+    attendance_data = [_roster_entry(attendance) for attendance in attendances]
     
     # Calculate statistics
-    total_enrolled = Enrollment.objects.filter(activity=activity, status__in=['enrolled', 'completed']).count()
-    total_attended = attendances.count()
+    total_enrolled = activity.total_enrolled
+    total_attended = activity.total_attended
     attendance_rate = (total_attended / total_enrolled * 100) if total_enrolled > 0 else 0
     
     return Response({
@@ -244,12 +393,35 @@ def get_activity_attendance(request, activity_id):
             'total_enrolled': total_enrolled,
             'total_attended': total_attended,
             'attendance_rate': round(attendance_rate, 2),
-            'qr_checkins': attendances.filter(qr_code_used__isnull=False).count(),
-            'manual_checkins': attendances.filter(marked_by__isnull=False).count()
+            'qr_checkins': activity.qr_checkins,
+            'manual_checkins': activity.manual_checkins
         },
         'attendances': attendance_data
     })
 
+async def attendance_live_stream(request, activity_id):
+    """Server-Sent Events: live check-in count and latest arrivals for an activity
+    
+    Plain async view (not DRF) so an open stream doesn't hold a worker thread.
+    Authenticates with the JWT access token from the Authorization header or
+    ``?token=`` (EventSource can't set headers). Served by the ASGI app; under
+    WSGI it sends one snapshot and closes, which clients treat as a poll.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    user = await authenticate_stream_request(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    if user.role not in ['instructor', 'coordinator', 'admin']:
+        return JsonResponse({
+            'error': 'Only instructors, coordinators, and admins can view attendance'
+        }, status=status.HTTP_403_FORBIDDEN)
+    if not await Activity.objects.filter(id=activity_id).aexists():
+        return JsonResponse({'error': 'Activity not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    return event_stream_response(live_attendance_events(activity_id, stream=is_asgi_request(request)))
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_student_attendance(request):
@@ -274,7 +446,7 @@ def get_student_attendance(request):
             },
             'status': attendance.status,
             'timestamp': attendance.timestamp,
-            'verification_method': 'QR Code' if attendance.qr_code_used else 'Manual'
+            'verification_method': 'QR Code' if attendance.verification_method == 'qr_code' else 'Manual'
         })
     
     return Response({
@@ -301,6 +473,12 @@ def generate_qr_code(request, activity_id):
         }, status=status.HTTP_403_FORBIDDEN)
     
     try:
+        # Optionally switch the activity to rotating tokens (or back to the static code)
+        rotating = request.data.get('rotating')
+        if rotating is not None:
+            activity.qr_rotation_enabled = str(rotating).lower() in ['true', '1']
+            activity.save()
+        
         # Generate new QR code if not exists
         if not activity.qr_code:
             activity.save()  # This will auto-generate QR code
@@ -312,7 +490,8 @@ def generate_qr_code(request, activity_id):
             'activity': {
                 'id': activity.id,
                 'title': activity.title,
-                'qr_code': activity.qr_code
+                'qr_code': activity.qr_code,
+                'qr_rotation_enabled': activity.qr_rotation_enabled
             }
         })
         
@@ -339,9 +518,205 @@ def get_qr_code(request, activity_id):
             'error': 'No QR code found for this activity'
         }, status=status.HTTP_404_NOT_FOUND)
     
+    qr_data = activity.generate_qr_code_data()
     return Response({
         'activity_id': activity.id,
         'activity_title': activity.title,
         'qr_code': activity.qr_code,
-        'qr_data': activity.generate_qr_code_data()
-    })
\ No newline at end of file
+        'qr_data': qr_data,
+        'qr_image_urls': _qr_image_urls(request, activity, qr_data)
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_rotating_qr_token(request, activity_id):
+    """Current rotating QR token for the projector display (poll every rotation)"""
+    if request.user.role not in ['instructor', 'coordinator', 'admin']:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    activity = get_object_or_404(Activity, id=activity_id)
+    window = current_window()
+    token = make_rotating_token(activity.id, window)
+    
+    return Response({
+        'activity_id': activity.id,
+        'activity_title': activity.title,
+        'qr_data': token,
+        'qr_image_urls': _qr_image_urls(request, activity, token, window),
+        'window': window,
+        'rotation_seconds': settings.QR_TOKEN_ROTATION_SECONDS,
+        'expires_in': seconds_until_rotation(),
+        'qr_rotation_enabled': activity.qr_rotation_enabled
+    })
+
+def _qr_image_urls(request, activity, qr_data, window=None, size=None):
+    """Image URLs pinned to their content (``v``), so clients may cache them forever"""
+    size = size or settings.QR_IMAGE_DEFAULT_SIZE
+    urls = {}
+    for image_format in CONTENT_TYPES:
+        params = {'size': size}
+        if window is not None:
+            params['window'] = window
+        params['v'] = image_digest(qr_data, size, image_format)
+        path = reverse('qr-image', kwargs={'activity_id': activity.id, 'image_format': image_format})
+        urls[image_format] = request.build_absolute_uri(f'{path}?{urlencode(params)}')
+    return urls
+
+class QRImageRenderer(JSONRenderer):
+    """Accepts ``Accept: image/*`` so image clients aren't refused with a 406
+
+    Images are returned as FileResponses and never pass through a renderer;
+    only error payloads do, and those are still JSON.
+    """
+    media_type = 'image/*'
+    format = 'image'
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, QRImageRenderer])
+def get_qr_image(request, activity_id, image_format):
+    """Rendered QR image (PNG or SVG) for projector displays, served from the on-disk cache
+    
+    Query params: ``size`` (one of QR_IMAGE_SIZES), ``window`` (rotating token
+    window, defaults to the current one) and ``v`` (the image's ETag, as
+    returned in ``qr_image_urls``; pinned URLs are cached as immutable).
+    """
+    if request.user.role not in ['instructor', 'coordinator', 'admin']:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    if image_format not in CONTENT_TYPES:
+        return Response({
+            'error': f'Unsupported image format, use one of: {", ".join(CONTENT_TYPES)}'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        size = int(request.query_params.get('size', settings.QR_IMAGE_DEFAULT_SIZE))
+    except ValueError:
+        size = None
+    if size not in settings.QR_IMAGE_SIZES:
+        return Response({
+            'error': f'size must be one of: {", ".join(str(s) for s in settings.QR_IMAGE_SIZES)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    activity = get_object_or_404(Activity, id=activity_id)
+    
+    if activity.qr_rotation_enabled or request.query_params.get('window'):
+        now_window = current_window()
+        try:
+            window = int(request.query_params.get('window', now_window))
+        except ValueError:
+            window = None
+        if window is None or not now_window - settings.QR_TOKEN_GRACE_WINDOWS <= window <= now_window:
+            return Response({
+                'error': 'QR token window has expired or is invalid'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        qr_data = make_rotating_token(activity.id, window)
+    elif activity.qr_code:
+        qr_data = activity.generate_qr_code_data()
+    else:
+        return Response({
+            'error': 'No QR code found for this activity'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    etag = image_digest(qr_data, size, image_format)
+    if request.query_params.get('v') == etag:
+        cache_control = f'private, max-age={settings.QR_IMAGE_MAX_AGE}, immutable'
+    else:
+        # Unpinned URLs can change content (new window, rotation toggled): revalidate
+        cache_control = 'private, no-cache'
+    
+    if f'"{etag}"' in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            path, etag = cached_image_path(qr_data, size, image_format)
+        except QRRenderingUnavailable as e:
+            logger.error(f"QR image rendering unavailable: {str(e)}")
+            return Response({
+                'error': 'QR image rendering is not available on this server'
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = FileResponse(open(path, 'rb'), content_type=CONTENT_TYPES[image_format])
+    
+    response['ETag'] = f'"{etag}"'
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_out_of_fence_analytics(request):
+    """Venues with many out-of-geofence scans, and the grid cells those scans came from
+    
+    Query params: days (default 30), min_scans (default 5), limit (default 50).
+    """
+    if request.user.role not in ['coordinator', 'admin'] and not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        days = int(request.GET.get('days', 30))
+        min_scans = int(request.GET.get('min_scans', 5))
+        limit = min(int(request.GET.get('limit', 50)), 500)
+    except ValueError:
+        return Response({
+            'error': 'days, min_scans and limit must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    since = timezone.now() - timedelta(days=days)
+    scans = QRScanLog.objects.filter(scanned_at__gte=since)
+    
+    # Grouped on the partial (lat_bucket, lon_bucket) index over outside_geofence rows
+    hotspots = scans.filter(
+        outside_geofence=True, lat_bucket__isnull=False, lon_bucket__isnull=False
+    ).values('lat_bucket', 'lon_bucket').annotate(
+        scans=Count('id'),
+        students=Count('student', distinct=True),
+        activities=Count('activity', distinct=True),
+    ).filter(scans__gte=min_scans).order_by('-scans')[:limit]
+    
+    venues = scans.filter(activity__geofence_radius_m__isnull=False).values(
+        'activity__location', 'activity__venue_latitude', 'activity__venue_longitude'
+    ).annotate(
+        total_scans=Count('id'),
+        outside_scans=Count('id', filter=Q(outside_geofence=True)),
+        activities=Count('activity', distinct=True),
+    ).filter(outside_scans__gte=min_scans).order_by('-outside_scans')[:limit]
+    
+    bucket = settings.GEOFENCE_BUCKET_DEGREES
+    return Response({
+        'since': since,
+        'venues': [{
+            'location': venue['activity__location'],
+            'latitude': venue['activity__venue_latitude'],
+            'longitude': venue['activity__venue_longitude'],
+            'activities': venue['activities'],
+            'total_scans': venue['total_scans'],
+            'outside_scans': venue['outside_scans'],
+            'outside_share': round(venue['outside_scans'] / venue['total_scans'], 4),
+        } for venue in venues],
+        'hotspots': [{
+            # Centre of the grid cell
+            'latitude': round((spot['lat_bucket'] + 0.5) * bucket, 6),
+            'longitude': round((spot['lon_bucket'] + 0.5) * bucket, 6),
+            'cell_degrees': bucket,
+            'scans': spot['scans'],
+            'students': spot['students'],
+            'activities': spot['activities'],
+        } for spot in hotspots],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_scan_log_metrics(request):
+    """Queue depth and flush latency of this worker's QRScanLog writer"""
+    if request.user.role not in ['coordinator', 'admin'] and not request.user.is_staff:
+        return Response({
+            'error': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response(scan_log_writer.metrics())
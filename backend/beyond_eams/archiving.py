@@ -0,0 +1,46 @@
+# beyond_eams/archiving.py - Shared helpers for retention jobs that archive rows to disk
+"""
+Archives are NDJSON (one JSON object per line) compressed with gzip. Each
+chunk of rows is appended as its own gzip member; concatenated members are a
+valid gzip file, so ``gzip.open`` (or ``zcat``) reads the whole archive back.
+
+Because every chunk ends on a member boundary, a job that records the archive
+size after each committed chunk can resume after a crash by truncating the
+file back to that size and re-writing the chunk that was in flight.
+"""
+import gzip
+import json
+import os
+from datetime import date
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def next_month(month):
+    return date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+
+
+def prepare_archive(path, offset):
+    """Make sure ``path`` exists and is exactly ``offset`` bytes long
+
+    Anything past ``offset`` is a chunk that was written but never committed,
+    so it is cut off before appending again.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'ab') as archive:
+        size = archive.tell()
+        if size < offset:
+            raise RuntimeError(f'Archive {path} is {size} bytes but {offset} were committed; refusing to continue')
+        if size > offset:
+            archive.truncate(offset)
+
+
+def append_ndjson_gz(path, records):
+    """Append records as one gzip member and fsync; returns the new file size"""
+    payload = ''.join(json.dumps(record, cls=DjangoJSONEncoder) + '\n' for record in records)
+    with open(path, 'ab') as archive:
+        archive.write(gzip.compress(payload.encode('utf-8')))
+        archive.flush()
+        os.fsync(archive.fileno())
+        return archive.tell()
+
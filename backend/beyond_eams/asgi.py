@@ -3,6 +3,13 @@ ASGI config for beyond_eams project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Server-Sent Events endpoints (/api/attendance/activity/<id>/live/,
+/api/notifications/stream/) are async views and need this entry point to
+stream; run it with an ASGI server, e.g.
+``uvicorn beyond_eams.asgi:application``. Their pub/sub broker is per
+process (beyond_eams/pubsub.py), so serve them from the same process as the
+writes they watch.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,121 @@
+# beyond_eams/pubsub.py - In-process publish/subscribe for live streaming endpoints
+"""
+A topic-keyed broker living in each server process. Request handlers (sync
+views running in worker threads, signal handlers, background jobs) call
+``broker.publish(topic, message)``; async streaming views hold a
+``Subscription`` and ``await subscription.get()``. One subscription may
+cover several topics (e.g. a user's own topic plus a shared one).
+
+Each subscription is bound to the event loop it was created on, and
+messages are handed over with ``call_soon_threadsafe``, so publishing from a
+thread never touches asyncio state directly. Publishing to a topic nobody
+watches costs one dict lookup.
+
+Queues are bounded (PUBSUB_SUBSCRIBER_QUEUE_SIZE). A subscriber that falls
+behind loses its oldest messages and is flagged ``lagged`` so it can reload
+its state from the database instead of showing a wrong picture.
+
+The broker is per process: it only sees events published in the same
+process. Run the streaming endpoints in the same ASGI process as the writes
+they watch, or put a shared transport (e.g. Redis pub/sub) behind
+``publish`` when scaling out.
+"""
+import asyncio
+import logging
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """One consumer's view of one or more topics; create it inside the consuming event loop"""
+
+    def __init__(self, broker, topics):
+        self.broker = broker
+        self.topics = topics
+        self.lagged = False
+        self._loop = asyncio.get_running_loop()
+        self._messages = deque()
+        self._ready = asyncio.Event()
+
+    def _deliver(self, message):
+        # Runs on the subscriber's loop
+        if len(self._messages) >= settings.PUBSUB_SUBSCRIBER_QUEUE_SIZE:
+            self._messages.popleft()
+            self.lagged = True
+        self._messages.append(message)
+        self._ready.set()
+
+    def deliver(self, message):
+        try:
+            self._loop.call_soon_threadsafe(self._deliver, message)
+        except RuntimeError:
+            # The loop has shut down; the subscription is dead
+            self.broker.unsubscribe(self)
+
+    async def get(self, timeout=None):
+        """Every pending message (oldest first), waiting up to ``timeout`` seconds for one
+
+        Returns an empty list on timeout, which streams use to send keep-alives.
+        """
+        if not self._messages:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        messages = list(self._messages)
+        self._messages.clear()
+        return messages
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Broker:
+    def __init__(self):
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, *topics):
+        """One subscription receiving messages published to any of ``topics``"""
+        subscription = Subscription(self, topics)
+        with self._lock:
+            for topic in topics:
+                self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    def publish(self, topic, message):
+        """Hand ``message`` to every current subscriber of ``topic``; returns how many"""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+        return len(subscribers)
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(subscribers) for subscribers in self._topics.values())
+
+
+broker = Broker()
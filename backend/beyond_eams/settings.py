@@ -274,6 +274,98 @@ CACHES = {
     }
 }
 
+# QR check-in fast path (attendance/checkin.py). Entries must live in a cache
+# shared by all workers in production (Redis/Memcached); LocMem is per-process.
+CHECKIN_CACHE_TIMEOUT = 6 * 60 * 60  # 6 hours - long enough to cover an event
+CHECKIN_SYNC_MAX_BATCH = 5000  # Max scans per offline sync upload
+CHECKIN_SYNC_CLOCK_SKEW_SECONDS = 300  # Uploaded scans may be timestamped this far ahead of the server clock
+CHECKIN_SYNC_EARLY_MINUTES = 30  # Uploaded scans count from this long before an activity starts until it ends
+QR_TOKEN_ROTATION_SECONDS = 30  # Rotating QR tokens (attendance/tokens.py) change this often
+QR_TOKEN_GRACE_WINDOWS = 1  # Also accept the previous window's token for slow scanners
+
+# Buffered QRScanLog writer (attendance/scanlog.py)
+SCAN_LOG_ASYNC = True  # False writes scan logs inline (tests, benchmarks)
+SCAN_LOG_BATCH_SIZE = 200  # Flush after this many rows...
+SCAN_LOG_FLUSH_INTERVAL_MS = 500  # ...or this long after the first queued row
+SCAN_LOG_MAX_QUEUE = 10000  # Bounded queue per worker process
+SCAN_LOG_ENQUEUE_TIMEOUT_MS = 50  # Back-pressure wait before a row is dropped
+SCAN_DIMENSION_CACHE_SIZE = 4096  # Interned User-Agent / IP ids kept per process (attendance/dimensions.py)
+ATTENDANCE_ROSTER_CSV_CHUNK_SIZE = 500  # Rows fetched per round trip when streaming a roster as CSV
+
+# Scan log retention (attendance/retention.py, `manage.py archive_scan_logs`)
+SCAN_LOG_RETENTION_DAYS = 180  # Older scans move to monthly archives (whole months only)
+SCAN_LOG_ARCHIVE_DIR = BASE_DIR / 'archives' / 'scan_logs'
+SCAN_LOG_ARCHIVE_BATCH_SIZE = 1000  # Rows archived and deleted per transaction
+SCAN_LOG_ARCHIVE_PAUSE_MS = 100  # Pause between chunks so check-ins get the write lock
+
+# Rendered QR images (attendance/qrimage.py), cached on disk by (payload, size, format)
+QR_IMAGE_CACHE_DIR = BASE_DIR / 'cache' / 'qr_images'
+QR_IMAGE_SIZES = (128, 256, 512, 1024)  # Pixel sizes the renderer accepts
+QR_IMAGE_DEFAULT_SIZE = 512
+QR_IMAGE_MAX_AGE = 365 * 24 * 60 * 60  # Content-pinned image URLs never change
+
+# Check-in arrival analytics (activities/analytics.py)
+ARRIVAL_ANALYTICS_CACHE_TIMEOUT = 30 * 24 * 60 * 60  # Completed activities' offsets don't change
+ARRIVAL_EARLY_MINUTES = 5  # Arriving more than this before start_time is "early"
+ARRIVAL_LATE_MINUTES = 10  # ...and more than this after start_time is "late"
+ARRIVAL_HISTOGRAM_BIN_MINUTES = 5
+ARRIVAL_HISTOGRAM_RANGE = (-60, 120)  # Minutes around start_time covered by the histogram
+
+# Venue geofence for QR check-in (attendance/geofence.py)
+GEOFENCE_TOLERANCE_M = 25  # Added to an activity's radius to absorb GPS error
+GEOFENCE_REQUIRE_LOCATION = False  # True rejects geofenced scans that send no coordinates
+GEOFENCE_BUCKET_DEGREES = 0.01  # Grid cell size (~1.1 km of latitude) for out-of-fence analytics
+
+# Live streams over Server-Sent Events (beyond_eams/pubsub.py, beyond_eams/sse.py)
+PUBSUB_SUBSCRIBER_QUEUE_SIZE = 256  # Messages a slow watcher may fall behind before it reloads
+SSE_KEEPALIVE_SECONDS = 15  # Comment frame on idle streams so proxies keep them open
+SSE_MAX_STREAM_SECONDS = 10 * 60  # Streams close after this and the client reconnects (re-checks its token)
+SSE_RETRY_MS = 3000  # Reconnect delay suggested to EventSource clients
+LIVE_ATTENDANCE_RECENT_ARRIVALS = 20  # Latest arrivals included in live attendance events
+
+# Notification fan-out (notifications/fanout.py, notifications/jobs.py)
+NOTIFICATION_JOBS_ASYNC = True  # False runs fan-out jobs inline (tests, management commands)
+NOTIFICATION_FANOUT_CHUNK_SIZE = 500  # Recipients per bulk_create and per SMTP connection
+NOTIFICATION_JOB_TTL = 24 * 60 * 60  # How long job progress stays queryable
+NOTIFICATION_INBOX_PAGE_SIZE = 20  # Default page size of the cursor-paginated inbox
+NOTIFICATION_INBOX_MAX_PAGE_SIZE = 100
+
+# Unread counters (notifications/counters.py, `manage.py reconcile_unread_counters`).
+# Like the check-in cache they need a cache shared by all workers in production.
+NOTIFICATION_UNREAD_COUNTER_TTL = 24 * 60 * 60  # Cached counts expire and reload after this
+NOTIFICATION_UNREAD_COUNTER_DURABLE = True  # Back the cache with UnreadNotificationCounter rows
+NOTIFICATION_UNREAD_RECONCILE_BATCH_SIZE = 1000  # Users checked per reconciliation query
+
+# Email digests (notifications/digests.py, `manage.py send_notification_digests`)
+NOTIFICATION_DIGEST_WINDOW = os.environ.get('NOTIFICATION_DIGEST_WINDOW') or None  # Opt in with 'hourly' or 'daily'; None emails every notification right away
+NOTIFICATION_DIGEST_PRIORITIES = ('low', 'normal')  # Higher priorities are always emailed immediately
+NOTIFICATION_DIGEST_BATCH_SIZE = 500  # Users whose pending items are read per query
+NOTIFICATION_DIGEST_MAX_ITEMS = 50  # Items listed in one digest; the rest are summarised as a count
+
+# Notification retention (notifications/retention.py, `manage.py purge_notifications`).
+# Policies run in order; email logs go first since deleting a notification deletes its logs.
+NOTIFICATION_RETENTION_POLICIES = [
+    {'name': 'email-logs', 'model': 'notifications.EmailLog', 'date_field': 'sent_at', 'days': 30, 'archive': True},
+    {'name': 'delivered-emails', 'model': 'notifications.EmailOutbox', 'filter': {'status__in': ['sent', 'failed']}, 'days': 30},
+    {'name': 'read-notifications', 'model': 'notifications.Notification', 'filter': {'is_read': True}, 'days': 90},
+    {'name': 'read-activity-notifications', 'model': 'activities.Notification', 'filter': {'is_read': True}, 'days': 90},
+    {'name': 'old-notifications', 'model': 'notifications.Notification', 'days': 365, 'archive': True},
+    {'name': 'old-activity-notifications', 'model': 'activities.Notification', 'days': 365, 'archive': True},
+]
+NOTIFICATION_RETENTION_ARCHIVE_DIR = BASE_DIR / 'archives' / 'notifications'
+NOTIFICATION_RETENTION_BATCH_SIZE = 500  # Rows deleted per transaction
+NOTIFICATION_RETENTION_PAUSE_MS = 200  # Pause between batches so requests get the write lock
+
+# Email outbox (notifications/outbox.py, `manage.py send_outbox_emails`)
+EMAIL_OUTBOX_BATCH_SIZE = 100  # Messages claimed per batch and sent over one connection
+EMAIL_OUTBOX_RATE_PER_SECOND = 10  # Token bucket rate per worker (stay under the SMTP provider's limit)
+EMAIL_OUTBOX_BURST = 20  # Token bucket size
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5  # Then the message is marked failed
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60  # Backoff doubles per attempt from here...
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 60 * 60  # ...up to this
+EMAIL_OUTBOX_CLAIM_TIMEOUT = 10 * 60  # Messages claimed longer ago (crashed worker) are claimed again
+EMAIL_OUTBOX_IDLE_SLEEP_SECONDS = 5  # Worker poll interval when nothing is due
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.gmail.com'
@@ -0,0 +1,77 @@
+# beyond_eams/sse.py - Helpers for Server-Sent Events endpoints served by the ASGI app
+"""
+Streaming views are plain Django ``async def`` views (DRF views are
+synchronous and would pin a worker thread per open stream). They return
+``event_stream_response(generator)`` where the generator yields strings built
+with ``format_event``.
+
+``EventSource`` cannot send an Authorization header, so
+``authenticate_stream_request`` accepts the JWT access token either as
+``Authorization: Bearer <token>`` or as ``?token=<token>``.
+
+Under WSGI (``runserver`` without an ASGI server) an endless stream would be
+buffered in full, so ``is_asgi_request`` lets views fall back to sending a
+single snapshot and closing.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+_jwt = JWTAuthentication()
+
+
+def format_event(data, event=None, event_id=None, retry_ms=None):
+    """One SSE frame; ``data`` is JSON-encoded"""
+    lines = []
+    if event:
+        lines.append(f'event: {event}')
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if retry_ms is not None:
+        lines.append(f'retry: {retry_ms}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def keepalive():
+    """Comment frame that keeps proxies from closing an idle stream"""
+    return ': keep-alive\n\n'
+
+
+def event_stream_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx response buffering
+    return response
+
+
+def is_asgi_request(request):
+    return isinstance(request, ASGIRequest)
+
+
+def _raw_token(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return request.GET.get('token')
+
+
+def _authenticate(request):
+    raw_token = _raw_token(request)
+    if not raw_token:
+        return None
+    try:
+        validated_token = _jwt.get_validated_token(raw_token)
+        return _jwt.get_user(validated_token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def authenticate_stream_request(request):
+    """The user for a streaming request's JWT, or None"""
+    return await sync_to_async(_authenticate)(request)
@@ -0,0 +1,38 @@
+# beyond_eams/testing.py - Fixtures shared by the app test suites
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from activities.models import Activity, Attendance, Enrollment
+
+User = get_user_model()
+
+
+def make_activity(start=None, hours=1, **fields):
+    """An activity starting at ``start`` (default: now) and lasting ``hours``"""
+    start = start or timezone.now()
+    defaults = {
+        'title': 'Activity',
+        'description': '',
+        'location': 'Hall A',
+        'start_time': start,
+        'end_time': start + timedelta(hours=hours),
+    }
+    return Activity.objects.create(**{**defaults, **fields})
+
+
+def make_user(username, role='student', **fields):
+    """A user without a usable password (hashing one makes tests slow)"""
+    return User.objects.create(username=username, role=role, **fields)
+
+
+def enroll(activity, *users, **fields):
+    return [Enrollment.objects.create(user=user, activity=activity, **fields) for user in users]
+
+
+def attend(activity, user, status='present', **fields):
+    """An attendance row saved without completing the enrollment"""
+    attendance = Attendance(user=user, activity=activity, status=status, **fields)
+    attendance.save(sync_enrollment=False)
+    return attendance
@@ -0,0 +1,78 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .pubsub import Broker
+from .sse import authenticate_stream_request, format_event
+from .testing import make_user
+
+
+class BrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.broker = Broker()
+
+    def test_subscriber_receives_messages_published_from_another_thread(self):
+        async def scenario():
+            with self.broker.subscribe('room:1', 'everyone') as subscription:
+                # Views and jobs publish from worker threads
+                await asyncio.to_thread(self.broker.publish, 'room:1', 'first')
+                await asyncio.to_thread(self.broker.publish, 'everyone', 'second')
+                await asyncio.to_thread(self.broker.publish, 'room:2', 'elsewhere')
+                return await subscription.get(timeout=5)
+
+        self.assertEqual(async_to_sync(scenario)(), ['first', 'second'])
+
+    def test_closing_a_subscription_unsubscribes_it(self):
+        async def scenario():
+            with self.broker.subscribe('room:1', 'everyone'):
+                self.assertEqual(self.broker.subscriber_count(), 2)
+            return self.broker.publish('room:1', 'nobody listening')
+
+        self.assertEqual(async_to_sync(scenario)(), 0)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_get_times_out_empty_so_streams_can_send_keepalives(self):
+        async def scenario():
+            with self.broker.subscribe('room:1') as subscription:
+                return await subscription.get(timeout=0.01)
+
+        self.assertEqual(async_to_sync(scenario)(), [])
+
+    @override_settings(PUBSUB_SUBSCRIBER_QUEUE_SIZE=2)
+    def test_slow_subscriber_keeps_the_newest_messages_and_is_flagged(self):
+        async def scenario():
+            with self.broker.subscribe('room:1') as subscription:
+                for message in range(4):
+                    await asyncio.to_thread(self.broker.publish, 'room:1', message)
+                return await subscription.get(timeout=5), subscription.lagged
+
+        self.assertEqual(async_to_sync(scenario)(), ([2, 3], True))
+
+
+class StreamAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = make_user('watcher', role='coordinator')
+        self.token = str(AccessToken.for_user(self.user))
+        self.factory = RequestFactory()
+
+    def _authenticate(self, request):
+        return async_to_sync(authenticate_stream_request)(request)
+
+    def test_token_in_query_string_or_header(self):
+        by_query = self.factory.get('/stream/', {'token': self.token})
+        by_header = self.factory.get('/stream/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+        self.assertEqual(self._authenticate(by_query), self.user)
+        self.assertEqual(self._authenticate(by_header), self.user)
+
+    def test_missing_or_bad_token_is_anonymous(self):
+        self.assertIsNone(self._authenticate(self.factory.get('/stream/')))
+        self.assertIsNone(self._authenticate(self.factory.get('/stream/', {'token': 'not-a-jwt'})))
+
+    def test_event_frame(self):
+        self.assertEqual(
+            format_event({'count': 1}, event='checkin', retry_ms=3000),
+            'event: checkin\nretry: 3000\ndata: {"count":1}\n\n',
+        )
@@ -54,6 +54,7 @@ urlpatterns = [
     # API routes - FIXED ORDER
     path('api/auth/', include('accounts.urls')),
     path('api/notifications/', include('notifications.urls')),
+    path('api/attendance/', include('attendance.urls')),
     path('api/', include('activities.urls')),  # This includes coordinator/activities/
     path('api/instructor/', include('activities.urls')),
     path('api/admin/', include('activities.urls')),
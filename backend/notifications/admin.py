@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification, NotificationTemplate, EmailLog
+from .models import Broadcast, Notification, NotificationTemplate, EmailLog, EmailOutbox
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -26,3 +26,19 @@ class EmailLogAdmin(admin.ModelAdmin):
     search_fields = ['recipient_email', 'subject']
     readonly_fields = ['sent_at']
     ordering = ['-sent_at']
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['recipient_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient_email', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_by', 'claimed_at']
+    ordering = ['next_attempt_at', 'id']
+
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ['title', 'audience', 'audience_value', 'notification_type', 'priority', 'created_by', 'created_at']
+    list_filter = ['audience', 'notification_type', 'priority', 'created_at']
+    search_fields = ['title', 'message', 'audience_value']
+    readonly_fields = ['created_at']
+    ordering = ['-created_at']
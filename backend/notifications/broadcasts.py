@@ -0,0 +1,110 @@
+# notifications/broadcasts.py - Fan-out-on-read broadcast notifications
+"""
+A broadcast is one Broadcast row addressed to an audience: everyone, one
+role, or one department. Nobody gets a per-user copy. Sending is a single
+INSERT however many people are in the audience.
+
+A user sees the broadcasts whose audience matches them and which were sent
+after they joined. Read state is kept compactly:
+
+* BroadcastReadState.read_through_id is a watermark. Every broadcast up to
+  that id is read. "Mark all as read" only moves it.
+* BroadcastRead rows mark single broadcasts read above the watermark. Moving
+  the watermark deletes the markers it now covers.
+
+Listing and unread counts are one query each, with the read state
+resolved in SQL.
+"""
+from heapq import merge
+
+from django.db import transaction
+from django.db.models import Case, Exists, Max, OuterRef, Q, Subquery, Value, When, BooleanField
+from django.db.models.functions import Coalesce
+
+from .models import Broadcast, BroadcastRead, BroadcastReadState
+
+
+def audience_q(user):
+    """Broadcasts addressed to ``user``"""
+    q = Q(audience='all') | Q(audience='role', audience_value=getattr(user, 'role', '') or '')
+    department = getattr(user, 'department', None)
+    if department:
+        q |= Q(audience='department', audience_value=department)
+    return q
+
+
+def audience_user_q(broadcast):
+    """Users in a broadcast's audience, as a filter on the user model"""
+    if broadcast.audience == 'role':
+        return Q(role=broadcast.audience_value)
+    if broadcast.audience == 'department':
+        return Q(department=broadcast.audience_value)
+    return Q()
+
+
+def audience_users(broadcast, users):
+    """Narrow a user queryset to a broadcast's audience"""
+    return users.filter(audience_user_q(broadcast))
+
+
+def addresses(broadcast, user):
+    """Whether ``user`` sees ``broadcast``: in its audience and joined before it was sent"""
+    if user.date_joined > broadcast.created_at:
+        return False
+    if broadcast.audience == 'role':
+        return broadcast.audience_value == (getattr(user, 'role', '') or '')
+    if broadcast.audience == 'department':
+        return bool(getattr(user, 'department', None)) and broadcast.audience_value == user.department
+    return True
+
+
+def _watermark(user):
+    return Coalesce(
+        Subquery(BroadcastReadState.objects.filter(user=user).values('read_through_id')[:1]),
+        Value(0),
+    )
+
+
+def _read_marker(user):
+    return Exists(BroadcastRead.objects.filter(user=user, broadcast=OuterRef('pk')))
+
+
+def visible_broadcasts(user):
+    """Broadcasts for ``user``, annotated with ``is_read``"""
+    return Broadcast.objects.filter(
+        audience_q(user), created_at__gte=user.date_joined
+    ).annotate(
+        is_read=Case(
+            When(id__lte=_watermark(user), then=Value(True)),
+            default=_read_marker(user),
+            output_field=BooleanField(),
+        )
+    )
+
+
+def unread_broadcast_count(user):
+    return Broadcast.objects.filter(
+        audience_q(user), created_at__gte=user.date_joined, id__gt=_watermark(user)
+    ).exclude(_read_marker(user)).count()
+
+
+def mark_broadcast_read(user, broadcast):
+    BroadcastRead.objects.get_or_create(user=user, broadcast=broadcast)
+
+
+def mark_all_broadcasts_read(user):
+    """Move the watermark past every visible broadcast and drop the markers it covers"""
+    latest = Broadcast.objects.filter(audience_q(user)).aggregate(latest=Max('id'))['latest']
+    if latest is None:
+        return
+    with transaction.atomic():
+        state, _ = BroadcastReadState.objects.select_for_update().get_or_create(user=user)
+        if latest > state.read_through_id:
+            state.read_through_id = latest
+            state.save(update_fields=['read_through_id'])
+        BroadcastRead.objects.filter(user=user, broadcast_id__lte=state.read_through_id).delete()
+
+
+def merge_newest_first(*sequences, key):
+    """Merge sequences that are each sorted newest first"""
+    return list(merge(*sequences, key=key, reverse=True))
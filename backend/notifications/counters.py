@@ -0,0 +1,197 @@
+# notifications/counters.py - Write-maintained unread notification counters
+"""
+The client polls the unread count on a timer, so the count is kept up to
+date by the writes rather than recomputed by every poll.
+
+* Direct notifications: ``notifications:unread:<user_id>`` holds the user's
+  unread count. Creating notifications (one at a time via the post_save
+  signal, or a fan-out chunk via ``create_notifications``) increments it;
+  ``mark_as_read``, ``mark_notifications_read`` and deleting an unread
+  notification decrement it. Changes are applied after the transaction
+  commits. With NOTIFICATION_UNREAD_COUNTER_DURABLE the same deltas go to
+  UnreadNotificationCounter rows, and a cache miss reloads from there.
+  Only a user with neither a cached value nor a row is counted from the
+  notifications table, once, and gets a row.
+* Broadcasts: the user's unread broadcast count is cached together with the
+  broadcast version, a token replaced whenever a broadcast is created or
+  deleted. A new broadcast therefore costs nothing per user; each user
+  recounts once, on their next poll. Marking broadcasts read drops the
+  user's entry.
+
+Counters only drift if rows change behind these hooks (raw SQL, a bulk
+``update`` elsewhere). Cached values expire after
+NOTIFICATION_UNREAD_COUNTER_TTL, and ``manage.py reconcile_unread_counters``
+recounts everything and repairs what differs.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+
+from .broadcasts import unread_broadcast_count
+from .models import Notification, UnreadNotificationCounter
+
+UNREAD_KEY = 'notifications:unread:{}'
+BROADCAST_UNREAD_KEY = 'notifications:unread_broadcasts:{}'
+BROADCAST_VERSION_KEY = 'notifications:broadcast_version'
+
+
+def _unread_key(user_id):
+    return UNREAD_KEY.format(user_id)
+
+
+def _broadcast_key(user_id):
+    return BROADCAST_UNREAD_KEY.format(user_id)
+
+
+def _apply_deltas(deltas):
+    from .live import publish_unread_changed
+
+    for user_id, delta in deltas.items():
+        key = _unread_key(user_id)
+        try:
+            value = cache.incr(key, delta)
+        except ValueError:
+            continue  # Not cached; loaded from the durable row or a count on the next read
+        if value < 0:
+            cache.delete(key)
+
+    if settings.NOTIFICATION_UNREAD_COUNTER_DURABLE:
+        _apply_durable_deltas(deltas)
+
+    # New notifications reach live streams with their content (live.py); only drops are announced here
+    publish_unread_changed([user_id for user_id, delta in deltas.items() if delta < 0])
+
+
+def _apply_durable_deltas(deltas):
+    by_delta = {}
+    for user_id, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(user_id)
+    # Users without a row get one from a count on their next read
+    for delta, user_ids in by_delta.items():
+        UnreadNotificationCounter.objects.filter(user_id__in=user_ids).update(
+            unread=Greatest(F('unread') + delta, Value(0))
+        )
+
+
+def adjust_unread(deltas):
+    """Add ``{user_id: delta}`` to the unread counters once the current transaction commits"""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply_deltas(deltas))
+
+
+def mark_notifications_read(user):
+    """Mark all of ``user``'s direct notifications read; returns how many were unread"""
+    updated = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+    adjust_unread({user.id: -updated})
+    return updated
+
+
+def _load_unread(user_id):
+    """The durable count, or a count of the table for a user without one"""
+    if settings.NOTIFICATION_UNREAD_COUNTER_DURABLE:
+        unread = UnreadNotificationCounter.objects.filter(user_id=user_id).values_list('unread', flat=True).first()
+        if unread is not None:
+            return unread
+
+    unread = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    if settings.NOTIFICATION_UNREAD_COUNTER_DURABLE:
+        UnreadNotificationCounter.objects.get_or_create(user_id=user_id, defaults={'unread': unread})
+    return unread
+
+
+def broadcast_version():
+    version = cache.get(BROADCAST_VERSION_KEY)
+    if version is None:
+        cache.add(BROADCAST_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(BROADCAST_VERSION_KEY)
+    return version
+
+
+def broadcasts_changed():
+    """A broadcast was created or removed; every user's cached broadcast count is now stale"""
+    cache.set(BROADCAST_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def broadcast_read_changed(user_id):
+    cache.delete(_broadcast_key(user_id))
+
+
+def unread_notification_count(user):
+    """Unread direct notifications plus unread broadcasts, from the cache when warm"""
+    unread_key, broadcast_key = _unread_key(user.id), _broadcast_key(user.id)
+    cached = cache.get_many([unread_key, broadcast_key, BROADCAST_VERSION_KEY])
+    version = cached.get(BROADCAST_VERSION_KEY) or broadcast_version()
+    timeout = settings.NOTIFICATION_UNREAD_COUNTER_TTL
+
+    direct = cached.get(unread_key)
+    if direct is None:
+        direct = _load_unread(user.id)
+        # add, not set: an increment that landed meanwhile must not be overwritten
+        if not cache.add(unread_key, direct, timeout):
+            direct = cache.get(unread_key, direct)
+
+    entry = cached.get(broadcast_key)
+    if entry is not None and entry[0] == version:
+        broadcasts = entry[1]
+    else:
+        broadcasts = unread_broadcast_count(user)
+        cache.set(broadcast_key, (version, broadcasts), timeout)
+
+    return direct + broadcasts
+
+
+def reconcile_unread_counters(users, batch_size=None):
+    """Recount unread notifications for ``users`` and repair counters that differ
+
+    One grouped count per batch of users. Returns ``(checked, repaired)``.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_UNREAD_RECONCILE_BATCH_SIZE
+    durable = settings.NOTIFICATION_UNREAD_COUNTER_DURABLE
+    timeout = settings.NOTIFICATION_UNREAD_COUNTER_TTL
+    checked = repaired = 0
+
+    user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        actual = dict.fromkeys(batch, 0)
+        actual.update(
+            Notification.objects.filter(recipient_id__in=batch, is_read=False)
+            .values('recipient_id').annotate(unread=Count('id'))
+            .values_list('recipient_id', 'unread')
+        )
+
+        wrong = set()
+        cached = cache.get_many([_unread_key(user_id) for user_id in batch])
+        fixes = {}
+        for user_id in batch:
+            value = cached.get(_unread_key(user_id))
+            if value is not None and value != actual[user_id]:
+                fixes[_unread_key(user_id)] = actual[user_id]
+                wrong.add(user_id)
+        if fixes:
+            cache.set_many(fixes, timeout)
+
+        if durable:
+            stored = dict(
+                UnreadNotificationCounter.objects.filter(user_id__in=batch).values_list('user_id', 'unread')
+            )
+            stale = [user_id for user_id in batch if stored.get(user_id) != actual[user_id]]
+            wrong.update(user_id for user_id in stale if user_id in stored)
+            UnreadNotificationCounter.objects.bulk_create(
+                [UnreadNotificationCounter(user_id=user_id, unread=actual[user_id]) for user_id in stale],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['unread', 'updated_at'],
+            )
+
+        checked += len(batch)
+        repaired += len(wrong)
+
+    # Broadcast counts are cheap to recount; let every user do it on the next poll
+    broadcasts_changed()
+    return checked, repaired
@@ -0,0 +1,199 @@
+# notifications/digests.py - Collect low-priority notification emails into one digest per user
+"""
+Digests are off unless NOTIFICATION_DIGEST_WINDOW is set (from the
+environment variable of the same name); until then every email goes out
+right away. With a window, notifications whose priority is in
+NOTIFICATION_DIGEST_PRIORITIES are not emailed one by one. ``Notification.send_email`` and the fan-out jobs set
+``digest_pending`` instead, and ``send_digests`` later queues a single
+digest email per user in the outbox (outbox.py), listing everything that
+accumulated. High and urgent notifications are still emailed right away.
+
+Broadcasts (broadcasts.py) follow the same rule. A low-priority broadcast
+sent with email is stored with ``digest_pending`` set, and the next run
+lists it in the digest of every active user in its audience who had
+joined when it was sent, alongside their own notifications. The broadcast
+is cleared once every batch of the run is queued; a run that dies halfway
+lists it again for the users it had already reached.
+
+Windows are clock-aligned (NOTIFICATION_DIGEST_WINDOW: ``hourly`` or
+``daily``, in TIME_ZONE). A run digests the items created before the
+current window started, so running it more often than the window does no
+harm and a late run simply catches up.
+
+Pending items live in a partial index (``notification_digest_pending``)
+that holds only rows with ``digest_pending`` set. A run walks the
+recipients in that index in batches of NOTIFICATION_DIGEST_BATCH_SIZE and
+reads each batch's items with one query. While broadcasts are pending it
+walks the user table instead, since their audiences need not have any
+pending notification.
+
+Run a single digest process (``manage.py send_notification_digests``); two
+at once could both pick up the same items.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .broadcasts import addresses, audience_user_q
+from .models import Broadcast, Notification
+from .outbox import enqueue_emails
+
+User = get_user_model()
+
+WINDOWS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+}
+
+
+def uses_digest(priority):
+    """Whether a notification of this priority waits for the digest"""
+    return bool(settings.NOTIFICATION_DIGEST_WINDOW) and priority in settings.NOTIFICATION_DIGEST_PRIORITIES
+
+
+def window_start(now=None, window=None):
+    """Start of the digest window containing ``now``"""
+    window = window or settings.NOTIFICATION_DIGEST_WINDOW
+    local = timezone.localtime(now or timezone.now())
+    start = local.replace(minute=0, second=0, microsecond=0)
+    if window == 'daily':
+        start = start.replace(hour=0)
+    return start
+
+
+def next_window_start(now=None, window=None):
+    window = window or settings.NOTIFICATION_DIGEST_WINDOW
+    return window_start(now, window) + WINDOWS[window]
+
+
+def digest_email(user, notifications):
+    """Subject and plain-text body of one digest listing ``notifications`` (oldest first)"""
+    shown = notifications[:settings.NOTIFICATION_DIGEST_MAX_ITEMS]
+    count = len(notifications)
+    subject = f"[Beyond EAMS] {count} new notification{'s' if count != 1 else ''}"
+
+    lines = []
+    for notification in shown:
+        first_line = (notification.message.strip().splitlines() or [''])[0]
+        lines.append(f"- [{notification.get_notification_type_display()}] {notification.title}")
+        lines.append(f"  {first_line[:200]}")
+    if count > len(shown):
+        lines.append(f"...and {count - len(shown)} more.")
+    items = '\n'.join(lines)
+
+    body = f"""
+Dear {user.get_full_name() or user.username},
+
+Here is what happened on Beyond EAMS since your last update:
+
+{items}
+
+Sign in to Beyond EAMS to see all your notifications.
+
+---
+This is an automated message from Beyond EAMS.
+Please do not reply to this email.
+
+Best regards,
+Beyond EAMS Team
+            """
+    return subject, body
+
+
+def _pending(cutoff):
+    return Notification.objects.filter(digest_pending=True, created_at__lt=cutoff)
+
+
+def pending_broadcasts(cutoff):
+    return list(Broadcast.objects.filter(digest_pending=True, created_at__lt=cutoff).order_by('created_at', 'id'))
+
+
+def _recipients(cutoff, broadcasts):
+    """Users with pending notifications or in the audience of a pending broadcast"""
+    q = Q(pk__in=_pending(cutoff).values('recipient_id'))
+    for broadcast in broadcasts:
+        q |= Q(is_active=True, date_joined__lte=broadcast.created_at) & audience_user_q(broadcast)
+    return User.objects.filter(q)
+
+
+def pending_recipient_batches(cutoff, broadcasts=(), batch_size=None):
+    """Yield lists of recipient ids with items due, walking the pending index"""
+    batch_size = batch_size or settings.NOTIFICATION_DIGEST_BATCH_SIZE
+    last_id = 0
+    while True:
+        if broadcasts:
+            batch = list(
+                _recipients(cutoff, broadcasts).filter(pk__gt=last_id)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+        else:
+            batch = list(
+                _pending(cutoff).filter(recipient_id__gt=last_id)
+                .order_by('recipient_id').values_list('recipient_id', flat=True).distinct()[:batch_size]
+            )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+
+def _digest_batch(recipient_ids, cutoff, broadcasts=()):
+    """Queue one digest per recipient; returns ``(items, emails)``"""
+    items = list(
+        _pending(cutoff).filter(recipient_id__in=recipient_ids)
+        .select_related('recipient').order_by('recipient_id', 'created_at', 'id')
+    )
+    by_recipient = {}
+    for notification in items:
+        by_recipient.setdefault(notification.recipient_id, []).append(notification)
+    users = User.objects.in_bulk(recipient_ids) if broadcasts else {
+        notifications[0].recipient_id: notifications[0].recipient for notifications in by_recipient.values()
+    }
+
+    listed = len(items)
+    with transaction.atomic():
+        messages, groups = [], []
+        for user_id in recipient_ids:
+            user = users.get(user_id)
+            notifications = by_recipient.get(user_id, [])
+            if user is None or not user.email:
+                continue
+            entries = notifications
+            if user.is_active:
+                addressed = [broadcast for broadcast in broadcasts if addresses(broadcast, user)]
+                if addressed:
+                    entries = sorted(notifications + addressed, key=lambda item: item.created_at)
+                    listed += len(addressed)
+            if not entries:
+                continue
+            subject, body = digest_email(user, entries)
+            messages.append({'recipient_email': user.email, 'subject': subject, 'body': body})
+            groups.append(notifications)
+
+        # outbox.deliver_batch marks the items email_sent once their digest is delivered
+        for row, notifications in zip(enqueue_emails(messages), groups):
+            for notification in notifications:
+                notification.digest_email = row
+        for notification in items:
+            notification.digest_pending = False
+        Notification.objects.bulk_update(items, ['digest_pending', 'digest_email'], batch_size=1000)
+    return listed, len(messages)
+
+
+def send_digests(now=None, window=None, batch_size=None):
+    """Queue digests for every item created before the current window; returns ``(users, items, emails)``"""
+    cutoff = window_start(now, window)
+    broadcasts = pending_broadcasts(cutoff)
+    users = total_items = total_emails = 0
+    for recipient_ids in pending_recipient_batches(cutoff, broadcasts, batch_size):
+        items, emails = _digest_batch(recipient_ids, cutoff, broadcasts)
+        users += len(recipient_ids)
+        total_items += items
+        total_emails += emails
+    if broadcasts:
+        Broadcast.objects.filter(pk__in=[broadcast.pk for broadcast in broadcasts]).update(digest_pending=False)
+    return users, total_items, total_emails
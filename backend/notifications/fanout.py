@@ -0,0 +1,94 @@
+# notifications/fanout.py - Create and email notifications for many recipients at once
+"""
+Recipients are read in primary-key order in chunks of
+NOTIFICATION_FANOUT_CHUNK_SIZE. Each chunk becomes one ``bulk_create`` of
+Notification rows and, when email is requested, one ``bulk_create`` into the
+email outbox (outbox.py), whose worker sends them over pooled connections.
+Low-priority notifications and broadcasts are flagged for the digest
+(digests.py) instead.
+
+``fan_out_notifications`` is the job body run by notifications/jobs.py.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .counters import adjust_unread
+from .digests import uses_digest
+from .live import publish_notifications
+from .models import Notification
+from .outbox import enqueue_emails, enqueue_notification_emails
+from .rendering import render_many
+
+# Only what building the notification and its email needs
+RECIPIENT_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+
+
+def recipient_chunks(recipients, chunk_size=None):
+    """Yield lists of users from a queryset without loading it all at once"""
+    chunk_size = chunk_size or settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    chunk = []
+    for user in recipients.only(*RECIPIENT_FIELDS).order_by('pk').iterator(chunk_size=chunk_size):
+        chunk.append(user)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def create_notifications(users, **fields):
+    """One INSERT for a chunk of recipients; the rows come back with their ids
+
+    bulk_create sends no post_save, so the unread counters and live streams
+    are updated here.
+    """
+    notifications = Notification.objects.bulk_create(
+        [Notification(recipient=user, **fields) for user in users]
+    )
+    if not fields.get('is_read'):
+        adjust_unread({user.id: 1 for user in users})
+        publish_notifications(notifications)
+    return notifications
+
+
+def fan_out_notifications(progress, recipients, fields, send_email=True):
+    """Job body: notify every user in ``recipients`` chunk by chunk
+
+    Emails of digest-priority notifications wait for the users' next digest.
+    """
+    digest = send_email and uses_digest(fields.get('priority', 'normal'))
+    if digest:
+        fields = {**fields, 'digest_pending': True}
+    for users in recipient_chunks(recipients):
+        # Notifications and their queued emails commit together
+        with transaction.atomic():
+            notifications = create_notifications(users, **fields)
+            queued = enqueue_notification_emails(notifications) if send_email and not digest else []
+        progress.update(
+            recipients=len(users),
+            notifications_created=len(notifications),
+            emails_queued=len(queued),
+            emails_digested=len(notifications) if digest else 0,
+        )
+
+
+def queue_broadcast_emails(progress, broadcast, recipients):
+    """Job body: queue a broadcast's email for everyone in its audience
+
+    The broadcast itself is a single row; only the emails are per user.
+    Broadcasts whose priority uses the digest never get here: they are
+    stored with ``digest_pending`` and listed by digests.send_digests.
+    """
+    for users in recipient_chunks(recipients):
+        users = [user for user in users if user.email]
+        emails = render_many(broadcast.notification_type, [(user, broadcast) for user in users])
+        queued = enqueue_emails([
+            {
+                'recipient_email': user.email,
+                'subject': email.subject,
+                'body': email.body,
+                'html_body': email.html_body,
+            }
+            for user, email in zip(users, emails)
+        ])
+        progress.update(recipients=len(users), emails_queued=len(queued))
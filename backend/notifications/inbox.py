@@ -0,0 +1,104 @@
+# notifications/inbox.py - Keyset-paginated notification inbox
+"""
+The inbox lists direct notifications and broadcasts together, newest first,
+in pages of a fixed size. Pagination is by keyset rather than offset: the
+cursor is the sort key of the last item returned, ``(created_at, source,
+id)``, and the next page starts strictly after it. Each source reads at most
+``limit + 1`` rows through an index, so a user with years of history pays
+the same per page as a new user.
+
+Items with equal timestamps are ordered direct before broadcast, then by id,
+so the order is total and no item is skipped or repeated between pages.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from .broadcasts import merge_newest_first, visible_broadcasts
+from .models import Notification
+
+# Tie-break between sources at the same created_at (higher sorts first)
+SOURCE_RANK = {'direct': 1, 'broadcast': 0}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(item):
+    key = [item['created_at'].isoformat(), item['source'], item['id']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, source, item_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at = parse_datetime(created_at)
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or source not in SOURCE_RANK or not isinstance(item_id, int):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, source, item_id
+
+
+def _after_cursor(source, cursor):
+    """Rows of ``source`` that sort after the cursor item (newest first)"""
+    created_at, cursor_source, cursor_id = cursor
+    if SOURCE_RANK[source] < SOURCE_RANK[cursor_source]:
+        return Q(created_at__lte=created_at)
+    if SOURCE_RANK[source] > SOURCE_RANK[cursor_source]:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=cursor_id)
+
+
+def _filtered(queryset, filters):
+    if filters.get('type'):
+        queryset = queryset.filter(notification_type=filters['type'])
+    if filters.get('priority'):
+        queryset = queryset.filter(priority=filters['priority'])
+    if filters.get('unread'):
+        queryset = queryset.filter(is_read=False)
+    return queryset
+
+
+def inbox_item(obj, source):
+    """Wire format shared by the inbox and the live stream (live.py)"""
+    return {
+        'id': obj.id,
+        'source': source,
+        'title': obj.title,
+        'message': obj.message,
+        'type': obj.notification_type,
+        'priority': obj.priority,
+        'is_read': getattr(obj, 'is_read', False),  # Fresh broadcasts carry no annotation
+        'created_at': obj.created_at,
+        'related_activity_id': obj.related_activity_id,
+    }
+
+
+def inbox_page(user, limit, cursor=None, filters=None):
+    """One page of the merged inbox: ``(items, next_cursor)``"""
+    filters = filters or {}
+    sources = {
+        'direct': Notification.objects.filter(recipient=user),
+        'broadcast': visible_broadcasts(user),
+    }
+
+    pages = []
+    for source, queryset in sources.items():
+        queryset = _filtered(queryset, filters)
+        if cursor is not None:
+            queryset = queryset.filter(_after_cursor(source, cursor))
+        rows = queryset.order_by('-created_at', '-id')[:limit + 1]
+        pages.append([inbox_item(row, source) for row in rows])
+
+    merged = merge_newest_first(
+        *pages, key=lambda item: (item['created_at'], SOURCE_RANK[item['source']], item['id'])
+    )
+    items = merged[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(merged) > limit else None
+    return items, next_cursor
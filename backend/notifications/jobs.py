@@ -0,0 +1,157 @@
+# notifications/jobs.py - Background queue for notification fan-out jobs
+"""
+Broadcasting to thousands of users is too slow for a request, so views hand
+the work to ``notification_jobs.submit(...)`` and answer 202 with a job id
+right away. One daemon thread per process runs the queued jobs in order.
+
+A job's progress lives in the shared cache under ``notifications:job:<id>``
+(NOTIFICATION_JOB_TTL seconds), so any worker can answer a status poll.
+
+Jobs are not persisted; the queue lives in process memory. On a normal exit
+the worker finishes the queued jobs first, for up to ``shutdown``'s timeout,
+and jobs it could not get to are marked failed so their status polls end.
+A crash or SIGKILL loses everything queued plus the rest of the running job
+(its status stays ``queued``/``running`` until the cache entry expires).
+The work is not resumable: fan-out has no record of which chunks were done,
+so check the created notifications before sending again. Emails that made
+it into the outbox are durable (outbox.py).
+
+With NOTIFICATION_JOBS_ASYNC = False jobs run inline inside ``submit``,
+which is what tests and management commands want.
+"""
+import atexit
+import logging
+import queue
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'notifications:job:{}'
+
+_STOP = object()
+
+
+def _cache_key(job_id):
+    return CACHE_KEY.format(job_id)
+
+
+def get_job(job_id):
+    return cache.get(_cache_key(job_id))
+
+
+class JobProgress:
+    """Handle a running job uses to report counters back to the status entry"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def update(self, **counters):
+        for key, value in counters.items():
+            self.job[key] = self.job.get(key, 0) + value
+        self._save()
+
+    def set_status(self, status, **fields):
+        self.job['status'] = status
+        self.job.update(fields)
+        self._save()
+
+    def _save(self):
+        self.job['updated_at'] = timezone.now().isoformat()
+        cache.set(_cache_key(self.job['id']), self.job, settings.NOTIFICATION_JOB_TTL)
+
+
+class NotificationJobQueue:
+    def __init__(self):
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, created_by=None, **kwargs):
+        """Queue ``func(progress, **kwargs)``; returns the job's status dict"""
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': 'queued',
+            'created_by': created_by,
+            'created_at': timezone.now().isoformat(),
+            'error': '',
+        }
+        progress = JobProgress(job)
+        progress.set_status('queued')
+        if not settings.NOTIFICATION_JOBS_ASYNC:
+            self._execute(progress, func, kwargs)
+            return job
+
+        self._ensure_started()
+        self._queue.put((progress, func, kwargs))
+        return job
+
+    def shutdown(self, timeout=60):
+        """Stop the worker after finishing everything queued
+
+        Jobs still queued after ``timeout`` seconds are marked failed.
+        """
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+        if thread.is_alive():
+            self._abandon_queued()
+
+    def _abandon_queued(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is _STOP:
+                continue
+            progress = item[0]
+            logger.warning(f"Notification job {progress.job['id']} ({progress.job['kind']}) dropped at shutdown")
+            progress.set_status('failed', error='Stopped before the job ran', finished_at=timezone.now().isoformat())
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._queue is None:
+                self._queue = queue.Queue()
+                atexit.register(self.shutdown)
+            self._thread = threading.Thread(target=self._run, name='notification-jobs', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                close_old_connections()
+                self._execute(*item)
+        finally:
+            connection.close()
+
+    def _execute(self, progress, func, kwargs):
+        progress.set_status('running', started_at=timezone.now().isoformat())
+        try:
+            func(progress, **kwargs)
+        except Exception as e:
+            logger.error(f"Notification job {progress.job['id']} ({progress.job['kind']}) failed: {str(e)}")
+            progress.set_status('failed', error=str(e), finished_at=timezone.now().isoformat())
+        else:
+            progress.set_status('completed', finished_at=timezone.now().isoformat())
+
+
+notification_jobs = NotificationJobQueue()
@@ -0,0 +1,111 @@
+# notifications/live.py - Push new notifications to connected clients over SSE
+"""
+Instead of polling the count and list endpoints, a client keeps one
+``notifications/stream/`` connection open. The stream is pushed what
+changes, via the in-process broker (beyond_eams/pubsub.py), once the
+writing transaction commits:
+
+* ``notifications:user:<user_id>`` gets ``notification`` messages for new
+  direct notifications (post_save signal and fan-out chunks) and ``unread``
+  messages when the user's unread count drops (reads, deletions).
+* ``notifications:broadcasts`` gets every new broadcast once. Each stream
+  checks the audience against its own user in memory, so sending a
+  broadcast publishes one message, not one per user.
+
+A connection loads nothing when it opens but the unread count, which comes
+from the write-maintained counters (counters.py). An idle connection costs
+a keep-alive frame every SSE_KEEPALIVE_SECONDS and no queries.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from beyond_eams.pubsub import broker
+from beyond_eams.sse import format_event, keepalive
+from .counters import unread_notification_count
+from .inbox import inbox_item
+
+USER_TOPIC = 'notifications:user:{}'
+BROADCAST_TOPIC = 'notifications:broadcasts'
+
+
+def _user_topic(user_id):
+    return USER_TOPIC.format(user_id)
+
+
+def publish_notifications(notifications):
+    """Push new direct notifications to their recipients after the current transaction commits"""
+    messages = [
+        (_user_topic(notification.recipient_id), {'type': 'notification', 'item': inbox_item(notification, 'direct')})
+        for notification in notifications
+    ]
+    if messages:
+        transaction.on_commit(lambda: [broker.publish(topic, message) for topic, message in messages])
+
+
+def publish_broadcast(broadcast):
+    message = {
+        'type': 'broadcast',
+        'audience': broadcast.audience,
+        'audience_value': broadcast.audience_value,
+        'item': inbox_item(broadcast, 'broadcast'),
+    }
+    transaction.on_commit(lambda: broker.publish(BROADCAST_TOPIC, message))
+
+
+def publish_unread_changed(user_ids):
+    """Tell ``user_ids``' streams to send their new unread count (called once the change has committed)"""
+    for user_id in user_ids:
+        broker.publish(_user_topic(user_id), {'type': 'unread'})
+
+
+def in_audience(message, user):
+    """Whether a published broadcast is addressed to ``user`` (mirrors broadcasts.audience_q)"""
+    if message['audience'] == 'role':
+        return message['audience_value'] == (getattr(user, 'role', '') or '')
+    if message['audience'] == 'department':
+        return bool(getattr(user, 'department', None)) and message['audience_value'] == user.department
+    return True
+
+
+async def notification_events(user, stream=True):
+    """SSE frames for one user's connection; with ``stream=False`` only the count is sent"""
+    count = sync_to_async(unread_notification_count)
+    if not stream:
+        yield format_event({'unread_count': await count(user)}, event='unread')
+        return
+
+    # Subscribe before reading the count so nothing published in between is missed
+    subscription = broker.subscribe(_user_topic(user.id), BROADCAST_TOPIC)
+    try:
+        yield format_event({'unread_count': await count(user)}, event='unread', retry_ms=settings.SSE_RETRY_MS)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SSE_MAX_STREAM_SECONDS
+        while loop.time() < deadline:
+            messages = await subscription.get(timeout=settings.SSE_KEEPALIVE_SECONDS)
+            if not messages:
+                yield keepalive()
+                continue
+
+            if subscription.lagged:
+                # Dropped messages can't be recovered here; the client reloads its inbox
+                subscription.lagged = False
+                yield format_event({'unread_count': await count(user)}, event='resync')
+                continue
+
+            items = [
+                message['item'] for message in messages
+                if message['type'] == 'notification'
+                or (message['type'] == 'broadcast' and in_audience(message, user))
+            ]
+            if items:
+                # Everything that queued up while we were busy goes out as one event, newest first
+                items.sort(key=lambda item: item['created_at'], reverse=True)
+                yield format_event({'notifications': items, 'unread_count': await count(user)}, event='notification')
+            elif any(message['type'] == 'unread' for message in messages):
+                yield format_event({'unread_count': await count(user)}, event='unread')
+    finally:
+        subscription.close()
@@ -0,0 +1,51 @@
+# notifications/management/commands/purge_notifications.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.retention import RetentionPolicy, purge_policy
+
+
+class Command(BaseCommand):
+    help = ('Delete notifications, email logs and delivered outbox emails past their retention policy '
+            '(NOTIFICATION_RETENTION_POLICIES) in small batches, archiving where the policy says so')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', dest='policies',
+                            help='Only run this policy (repeatable)')
+        parser.add_argument('--archive-dir', default=str(settings.NOTIFICATION_RETENTION_ARCHIVE_DIR),
+                            help='Directory for NDJSON.gz archives')
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_RETENTION_BATCH_SIZE,
+                            help='Rows deleted per transaction')
+        parser.add_argument('--pause-ms', type=int, default=settings.NOTIFICATION_RETENTION_PAUSE_MS,
+                            help='Pause between batches to let requests through')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows each policy would remove')
+
+    def handle(self, *args, **options):
+        policies = RetentionPolicy.configured()
+        if options['policies']:
+            unknown = set(options['policies']) - {policy.name for policy in policies}
+            if unknown:
+                raise CommandError(f"Unknown policy: {', '.join(sorted(unknown))}")
+            policies = [policy for policy in policies if policy.name in options['policies']]
+
+        total = 0
+        for policy in policies:
+            if options['dry_run']:
+                count = policy.purgeable(policy.cutoff()).count()
+                self.stdout.write(f'  {policy}: {count} rows')
+                total += count
+                continue
+            result = purge_policy(
+                policy,
+                archive_dir=options['archive_dir'],
+                batch_size=options['batch_size'],
+                pause_ms=options['pause_ms'],
+            )
+            line = f'  {policy}: deleted {result.deleted} rows in {result.seconds:.1f}s ({result.rows_per_second:.0f} rows/s)'
+            if result.archived:
+                line += f', archived {result.archived} to {result.archive_path}'
+            self.stdout.write(line)
+            total += result.deleted
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} rows'))
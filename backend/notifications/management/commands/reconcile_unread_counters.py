@@ -0,0 +1,26 @@
+# notifications/management/commands/reconcile_unread_counters.py
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from notifications.counters import reconcile_unread_counters
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Recount unread notifications and repair cached and durable unread counters that have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids',
+                            help='Only this user id (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_UNREAD_RECONCILE_BATCH_SIZE,
+                            help='Users recounted per query')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user_ids']:
+            users = users.filter(pk__in=options['user_ids'])
+
+        checked, repaired = reconcile_unread_counters(users, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} users, repaired {repaired} counters'))
@@ -0,0 +1,41 @@
+# notifications/management/commands/send_notification_digests.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notifications.digests import WINDOWS, next_window_start, send_digests
+
+
+class Command(BaseCommand):
+    help = ('Queue one digest email per user for low-priority notifications, once per digest window '
+            '(runs until interrupted; run a single instance)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Digest everything due now and exit')
+        parser.add_argument('--window', choices=sorted(WINDOWS), default=settings.NOTIFICATION_DIGEST_WINDOW,
+                            help='Digest window (default: NOTIFICATION_DIGEST_WINDOW)')
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_DIGEST_BATCH_SIZE,
+                            help='Users whose pending items are read per query')
+
+    def handle(self, *args, **options):
+        window = options['window']
+        if not window:
+            raise CommandError('Digests are disabled (NOTIFICATION_DIGEST_WINDOW is None)')
+
+        try:
+            while True:
+                started = time.monotonic()
+                users, items, emails = send_digests(window=window, batch_size=options['batch_size'])
+                if users:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'  {emails} digests queued for {users} users ({items} items, {elapsed:.1f}s)')
+                if options['once']:
+                    break
+                # Sleep until the next window closes
+                time.sleep(max(1, (next_window_start(window=window) - timezone.now()).total_seconds()))
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS('Digest worker stopped' if not options['once'] else 'Digests queued'))
@@ -0,0 +1,45 @@
+# notifications/management/commands/send_outbox_emails.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import TokenBucket, process_outbox, worker_id
+
+
+class Command(BaseCommand):
+    help = ('Deliver queued EmailOutbox messages in batches with rate limiting and retries '
+            '(runs until interrupted; several workers may run at once)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Deliver everything due now and exit')
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Messages claimed and sent per connection')
+        parser.add_argument('--rate', type=float, default=settings.EMAIL_OUTBOX_RATE_PER_SECOND,
+                            help='Average messages per second (0 = unlimited)')
+        parser.add_argument('--idle-sleep', type=float, default=settings.EMAIL_OUTBOX_IDLE_SLEEP_SECONDS,
+                            help='Seconds to wait when nothing is due')
+
+    def handle(self, *args, **options):
+        claimed_by = worker_id()
+        bucket = TokenBucket(options['rate'], settings.EMAIL_OUTBOX_BURST)
+        self.stdout.write(f'Outbox worker {claimed_by} started')
+
+        total_sent = total_failed = 0
+        try:
+            while True:
+                started = time.monotonic()
+                sent, failed = process_outbox(batch_size=options['batch_size'], bucket=bucket, claimed_by=claimed_by)
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'  sent {sent}, failed {failed} ({(sent + failed) / elapsed:.1f} msg/s)')
+                if options['once']:
+                    break
+                if not (sent or failed):
+                    time.sleep(options['idle_sleep'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Sent {total_sent} emails, {total_failed} failed attempts'))
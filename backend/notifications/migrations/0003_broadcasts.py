@@ -0,0 +1,60 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_user_department'),
+        ('activities', '0009_attendance_qr_fields'),
+        ('notifications', '0002_email_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastReadState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='broadcast_read_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('read_through_id', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Broadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('general', 'General'), ('activity', 'Activity'), ('volunteer', 'Volunteer'), ('approval', 'Approval'), ('reminder', 'Reminder'), ('system', 'System')], default='general', max_length=20)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('normal', 'Normal'), ('high', 'High'), ('urgent', 'Urgent')], default='normal', max_length=10)),
+                ('audience', models.CharField(choices=[('all', 'All users'), ('role', 'Role'), ('department', 'Department')], default='all', max_length=20)),
+                ('audience_value', models.CharField(blank=True, help_text='Role or department name for targeted audiences', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='broadcasts_sent', to=settings.AUTH_USER_MODEL)),
+                ('related_activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='activities.activity')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastRead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_at', models.DateTimeField(auto_now_add=True)),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reads', to='notifications.broadcast')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_reads', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='broadcast',
+            index=models.Index(fields=['audience', 'audience_value', 'created_at'], name='broadcast_audience'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='broadcastread',
+            unique_together={('user', 'broadcast')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0009_attendance_qr_fields'),
+        ('notifications', '0005_unread_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='digest_email',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='digest_notifications', to='notifications.emailoutbox'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='digest_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('digest_pending', True)), fields=['recipient', 'created_at'], name='notification_digest_pending'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_digests'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast',
+            name='digest_pending',
+            field=models.BooleanField(default=False),
+        ),
+    ]
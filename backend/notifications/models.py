@@ -1,12 +1,28 @@
 from django.db import models
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
-from django.conf import settings
+from django.utils import timezone
 import logging
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+def notification_email(user, title, message):
+    """Subject and plain-text body of a notification email to ``user``"""
+    subject = f"[Beyond EAMS] {title}"
+    body = f"""
+Dear {user.get_full_name() or user.username},
+
+{message}
+
+---
+This is an automated message from Beyond EAMS.
+Please do not reply to this email.
+
+Best regards,
+Beyond EAMS Team
+            """
+    return subject, body
+
 class NotificationTemplate(models.Model):
     """Templates for different types of notifications"""
     name = models.CharField(max_length=100, unique=True)
@@ -16,6 +32,10 @@ class NotificationTemplate(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def clean(self):
+        from .rendering import validate_template
+        validate_template(self)
+    
     def __str__(self):
         return self.name
     
@@ -48,6 +68,15 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     email_sent = models.BooleanField(default=False)
     email_sent_at = models.DateTimeField(null=True, blank=True)
+    # Email held back for the user's next digest (digests.py)
+    digest_pending = models.BooleanField(default=False)
+    digest_email = models.ForeignKey(
+        'EmailOutbox',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='digest_notifications'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     # Optional related objects
@@ -59,62 +88,62 @@ class Notification(models.Model):
         related_name='notifications'
     )
     
+    def build_email(self):
+        """This notification's email (subject, body, html_body), from its NotificationTemplate if any"""
+        from .rendering import render_email
+        return render_email(self.recipient, self)
+    
     def send_email(self):
-        """Send notification via email if user has email notifications enabled"""
-        try:
-            if not self.recipient.email:
-                logger.warning(f"No email address for user {self.recipient.username}")
-                return False
-                
-            # Check user preferences (implement user email preferences model later)
-            # For now, send to all users
-            
-            subject = f"[Beyond EAMS] {self.title}"
-            message = f"""
-Dear {self.recipient.get_full_name() or self.recipient.username},
-
-{self.message}
-
----
-This is an automated message from Beyond EAMS.
-Please do not reply to this email.
-
-Best regards,
-Beyond EAMS Team
-            """
-            
-            success = send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[self.recipient.email],
-                fail_silently=False,
-            )
-            
-            if success:
-                self.email_sent = True
-                self.email_sent_at = models.timezone.now()
-                self.save(update_fields=['email_sent', 'email_sent_at'])
-                logger.info(f"Email sent successfully to {self.recipient.email}")
-                return True
-            else:
-                logger.error(f"Failed to send email to {self.recipient.email}")
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error sending email to {self.recipient.email}: {str(e)}")
+        """Queue this notification's email in the outbox (delivered by send_outbox_emails)
+        
+        Low and normal priority notifications wait for the user's next digest
+        instead. email_sent is set once the outbox has actually delivered it.
+        """
+        from .digests import uses_digest
+        from .outbox import enqueue_email
+        
+        if not self.recipient.email:
+            logger.warning(f"No email address for user {self.recipient.username}")
             return False
+        
+        # Check user preferences (implement user email preferences model later)
+        # For now, send to all users
+        
+        if uses_digest(self.priority):
+            Notification.objects.filter(pk=self.pk).update(digest_pending=True)
+            self.digest_pending = True
+            return True
+        
+        subject, message, html_message = self.build_email()
+        enqueue_email(self.recipient.email, subject, message, html_message, notification=self)
+        return True
     
     def mark_as_read(self):
-        """Mark notification as read"""
+        """Mark notification as read (and drop it from the unread counter if it was unread)"""
+        from .counters import adjust_unread
+        
+        updated = Notification.objects.filter(pk=self.pk, is_read=False).update(is_read=True)
         self.is_read = True
-        self.save(update_fields=['is_read'])
+        if updated:
+            adjust_unread({self.recipient_id: -1})
     
     def __str__(self):
         return f"{self.recipient.username} - {self.title}"
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread filter and unread count
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_inbox_unread'),
+            # Keyset pages of the whole inbox, newest first
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_inbox_page'),
+            # Digest job: only the few rows still waiting for a digest are indexed
+            models.Index(
+                fields=['recipient', 'created_at'],
+                name='notification_digest_pending',
+                condition=models.Q(digest_pending=True),
+            ),
+        ]
 
 class EmailLog(models.Model):
     """Log of all email attempts"""
@@ -138,3 +167,119 @@ class EmailLog(models.Model):
     
     class Meta:
         ordering = ['-sent_at']
+
+class EmailOutbox(models.Model):
+    """Email waiting to be delivered by the outbox worker (see outbox.py)"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    recipient_email = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='outbox_emails'
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.status} {self.recipient_email} - {self.subject}"
+    
+    class Meta:
+        ordering = ['next_attempt_at', 'id']
+        verbose_name_plural = 'email outbox'
+        indexes = [
+            # The worker's claim query: due pending messages, oldest first
+            models.Index(fields=['status', 'next_attempt_at'], name='emailoutbox_due'),
+        ]
+
+class Broadcast(models.Model):
+    """A notification stored once for a whole audience instead of once per user
+    
+    Read state lives in BroadcastReadState (a per-user watermark) and
+    BroadcastRead (markers above the watermark); see broadcasts.py.
+    """
+    AUDIENCE_CHOICES = (
+        ('all', 'All users'),
+        ('role', 'Role'),
+        ('department', 'Department'),
+    )
+    
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES, default='general')
+    priority = models.CharField(max_length=10, choices=Notification.PRIORITY_CHOICES, default='normal')
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='all')
+    audience_value = models.CharField(max_length=100, blank=True, help_text="Role or department name for targeted audiences")
+    related_activity = models.ForeignKey(
+        'activities.Activity',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='broadcasts'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='broadcasts_sent'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Email held back for the audience's next digest (digests.py)
+    digest_pending = models.BooleanField(default=False)
+    
+    def build_email(self, user):
+        from .rendering import render_email
+        return render_email(user, self)
+    
+    def __str__(self):
+        audience = self.audience if self.audience == 'all' else f"{self.audience}={self.audience_value}"
+        return f"[{audience}] {self.title}"
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['audience', 'audience_value', 'created_at'], name='broadcast_audience'),
+        ]
+
+class BroadcastReadState(models.Model):
+    """Every broadcast with an id up to ``read_through_id`` is read for this user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='broadcast_read_state')
+    read_through_id = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user.username} read through broadcast {self.read_through_id}"
+
+class BroadcastRead(models.Model):
+    """One broadcast read individually, above the user's watermark"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='broadcast_reads')
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='reads')
+    read_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('user', 'broadcast')
+
+class UnreadNotificationCounter(models.Model):
+    """Durable copy of a user's unread direct-notification count (see counters.py)"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='unread_notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.unread} unread"
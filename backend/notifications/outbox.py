@@ -0,0 +1,266 @@
+# notifications/outbox.py - Durable email outbox with retries and rate limiting
+"""
+Nothing sends email inline any more. Callers add rows to EmailOutbox
+(``enqueue_email`` / ``enqueue_emails``), and the ``send_outbox_emails``
+worker delivers them.
+
+* Claiming: a worker marks up to EMAIL_OUTBOX_BATCH_SIZE due ``pending``
+  rows as ``sending`` with one conditional UPDATE. Several workers can run
+  side by side without sending a message twice. Rows left ``sending`` by a
+  crashed worker become claimable again after EMAIL_OUTBOX_CLAIM_TIMEOUT.
+* Delivery: each claimed batch goes over one pooled connection, paced by a
+  token bucket (EMAIL_OUTBOX_RATE_PER_SECOND, EMAIL_OUTBOX_BURST).
+* Failures: a failed message is retried after EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+  doubling each time up to EMAIL_OUTBOX_RETRY_MAX_SECONDS. After
+  EMAIL_OUTBOX_MAX_ATTEMPTS attempts it is marked ``failed``.
+* Bookkeeping: each batch's outcomes are written with one bulk_update of
+  the outbox rows, one bulk_create of EmailLog rows (one per attempt) and
+  one UPDATE of the emailed notifications (including those delivered in a
+  digest, see digests.py).
+
+Any Django email backend works, including locmem and filebased for tests.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailLog, EmailOutbox, Notification
+from .rendering import render_notification_emails
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'[:64]
+
+
+def _outbox_row(recipient_email, subject, body, html_body='', notification=None):
+    return EmailOutbox(
+        recipient_email=recipient_email,
+        subject=subject[:200],
+        body=body,
+        html_body=html_body,
+        notification=notification,
+    )
+
+
+def enqueue_email(recipient_email, subject, body, html_body='', notification=None):
+    row = _outbox_row(recipient_email, subject, body, html_body, notification)
+    row.save()
+    return row
+
+
+def send_now(recipient_email, subject, body, html_body='', notification=None):
+    """Queue a message already claimed by us and try it right away
+
+    A failed first attempt stays in the outbox and is retried by the worker.
+    Returns the outbox row.
+    """
+    row = _outbox_row(recipient_email, subject, body, html_body, notification)
+    row.status = 'sending'
+    row.claimed_by = worker_id()
+    row.claimed_at = timezone.now()
+    row.save()
+    deliver_batch([row])
+    return row
+
+
+def enqueue_emails(messages):
+    """Queue many messages with one INSERT
+
+    ``messages`` are dicts of enqueue_email's arguments.
+    """
+    return EmailOutbox.objects.bulk_create(
+        [_outbox_row(**message) for message in messages],
+        batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+    )
+
+
+def enqueue_notification_emails(notifications):
+    """Queue the email of every notification whose recipient has an address
+
+    The emails are rendered together (rendering.render_many), so a chunk
+    costs one template lookup. Callers route digest-priority notifications to the digest instead (digests.py).
+    """
+    notifications = [notification for notification in notifications if notification.recipient.email]
+    messages = [
+        {
+            'recipient_email': notification.recipient.email,
+            'subject': email.subject,
+            'body': email.body,
+            'html_body': email.html_body,
+            'notification': notification,
+        }
+        for notification, email in zip(notifications, render_notification_emails(notifications))
+    ]
+    return enqueue_emails(messages)
+
+
+class TokenBucket:
+    """Allows ``rate`` sends per second on average, with bursts of up to ``burst``"""
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self):
+        """Block until a token is available, then consume it"""
+        if not self.rate:
+            return
+        self._refill()
+        if self.tokens < 1:
+            self._sleep((1 - self.tokens) / self.rate)
+            self._refill()
+        self.tokens -= 1
+
+
+def retry_delay(attempts):
+    """Backoff before the next try, after ``attempts`` failed attempts"""
+    delay = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def claim_batch(claimed_by, batch_size=None, now=None):
+    """Mark up to ``batch_size`` due messages as ours and return them"""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    now = now or timezone.now()
+    stale = now - timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_TIMEOUT)
+    claimable = (
+        Q(status='pending', next_attempt_at__lte=now)
+        | Q(status='sending', claimed_at__lt=stale)
+    )
+    candidate_ids = list(
+        EmailOutbox.objects.filter(claimable).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size]
+    )
+    if not candidate_ids:
+        return []
+
+    # Re-checking the condition in the UPDATE makes the claim safe against other workers
+    EmailOutbox.objects.filter(claimable, id__in=candidate_ids).update(
+        status='sending', claimed_by=claimed_by, claimed_at=now
+    )
+    return list(
+        EmailOutbox.objects.filter(id__in=candidate_ids, status='sending', claimed_by=claimed_by, claimed_at=now)
+        .order_by('next_attempt_at', 'id')
+    )
+
+
+def _email_message(row):
+    message = EmailMultiAlternatives(
+        subject=row.subject,
+        body=row.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[row.recipient_email],
+    )
+    if row.html_body:
+        message.attach_alternative(row.html_body, 'text/html')
+    return message
+
+
+def deliver_batch(rows, bucket=None, connection=None):
+    """Send claimed rows over one connection and record every outcome; returns ``(sent, failed)``"""
+    if not rows:
+        return 0, 0
+    bucket = bucket or TokenBucket(settings.EMAIL_OUTBOX_RATE_PER_SECOND, settings.EMAIL_OUTBOX_BURST)
+    email_connection = connection or get_connection()
+
+    logs = []
+    sent_notification_ids = []
+    sent_row_ids = []
+    sent = failed = 0
+    try:
+        try:
+            email_connection.open()
+        except Exception:
+            pass  # Each send retries the connection and records the error
+        for row in rows:
+            bucket.take()
+            row.attempts += 1
+            error = ''
+            try:
+                if not email_connection.send_messages([_email_message(row)]):
+                    error = 'Email backend reported the message as not sent'
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+                # A broken SMTP session fails every later message too; start a fresh one
+                email_connection.close()
+                try:
+                    email_connection.open()
+                except Exception:
+                    pass  # The next send reports it
+
+            now = timezone.now()
+            if error:
+                failed += 1
+                row.last_error = error
+                if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    row.status = 'failed'
+                    logger.error(f"Giving up on email to {row.recipient_email} after {row.attempts} attempts: {error}")
+                else:
+                    row.status = 'pending'
+                    row.next_attempt_at = now + retry_delay(row.attempts)
+            else:
+                sent += 1
+                row.status = 'sent'
+                row.sent_at = now
+                row.last_error = ''
+                sent_row_ids.append(row.id)
+                if row.notification_id:
+                    sent_notification_ids.append(row.notification_id)
+            row.claimed_by = ''
+            row.claimed_at = None
+            logs.append(EmailLog(
+                recipient_email=row.recipient_email,
+                subject=row.subject,
+                message=row.body,
+                sent_successfully=not error,
+                error_message=error,
+                notification_id=row.notification_id,
+            ))
+    finally:
+        email_connection.close()
+        with transaction.atomic():
+            EmailOutbox.objects.bulk_update(
+                rows, ['status', 'attempts', 'next_attempt_at', 'claimed_by', 'claimed_at', 'last_error', 'sent_at']
+            )
+            EmailLog.objects.bulk_create(logs)
+            if sent_row_ids:
+                Notification.objects.filter(
+                    Q(pk__in=sent_notification_ids) | Q(digest_email_id__in=sent_row_ids)
+                ).update(email_sent=True, email_sent_at=timezone.now())
+    return sent, failed
+
+
+def process_outbox(max_batches=None, batch_size=None, bucket=None, claimed_by=None):
+    """Deliver due messages batch by batch until none are left; returns ``(sent, failed)``"""
+    claimed_by = claimed_by or worker_id()
+    bucket = bucket or TokenBucket(settings.EMAIL_OUTBOX_RATE_PER_SECOND, settings.EMAIL_OUTBOX_BURST)
+    totals = [0, 0]
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_batch(claimed_by, batch_size)
+        if not rows:
+            break
+        sent, failed = deliver_batch(rows, bucket)
+        totals[0] += sent
+        totals[1] += failed
+        batches += 1
+    return tuple(totals)
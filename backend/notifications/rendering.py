@@ -0,0 +1,160 @@
+# notifications/rendering.py - Render notification emails from NotificationTemplate rows
+"""
+An active NotificationTemplate named after a notification type (``activity``,
+``reminder``, ...) renders that type's emails; one named ``default`` covers
+the other types. Without either, emails use the built-in plain-text layout
+(models.notification_email).
+
+``subject`` and ``email_template`` are Django template source. The body is
+HTML; the plain-text part of the multipart email is the same rendering with
+the tags stripped. Templates see:
+
+* ``user``: the recipient
+* ``notification``: the notification or broadcast (``title``, ``message``,
+  ``notification_type``, ``priority``, ``related_activity``)
+* ``site_name``
+
+Each template is compiled once per process and kept until its
+``updated_at`` changes. A render call checks that with one query, so
+``render_many`` renders a whole fan-out chunk on one lookup and one parse.
+"""
+import html
+import logging
+import re
+import threading
+from typing import NamedTuple
+
+from django.core.exceptions import ValidationError
+from django.template import Context, Template, TemplateSyntaxError
+from django.utils.html import strip_tags
+
+from .models import NotificationTemplate, notification_email
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMPLATE = 'default'
+SITE_NAME = 'Beyond EAMS'
+
+_BLANK_LINES = re.compile(r'\n\s*\n\s*\n+')
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    body: str
+    html_body: str
+
+
+class CompiledTemplate:
+    def __init__(self, template):
+        self.name = template.name
+        self.subject = Template(template.subject)
+        self.body = Template(template.email_template)
+
+    def render(self, user, notification):
+        context = {'user': user, 'notification': notification, 'site_name': SITE_NAME}
+        subject = self.subject.render(Context(context, autoescape=False))
+        html_body = self.body.render(Context(context))
+        return RenderedEmail(' '.join(subject.split()), html_to_text(html_body), html_body)
+
+
+def html_to_text(html_body):
+    text = html.unescape(strip_tags(html_body))
+    return _BLANK_LINES.sub('\n\n', '\n'.join(line.rstrip() for line in text.splitlines())).strip() + '\n'
+
+
+def validate_template(template):
+    """Raise ValidationError if a NotificationTemplate doesn't compile"""
+    errors = {}
+    for field in ('subject', 'email_template'):
+        try:
+            Template(getattr(template, field))
+        except TemplateSyntaxError as e:
+            errors[field] = str(e)
+    if errors:
+        raise ValidationError(errors)
+
+
+class TemplateCache:
+    """Compiled templates of this process: ``{name: (updated_at, CompiledTemplate or None)}``"""
+
+    def __init__(self):
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def get(self, notification_type):
+        """The compiled template for a notification type, or None for the built-in layout"""
+        current = dict(
+            NotificationTemplate.objects.filter(
+                name__in=[notification_type, DEFAULT_TEMPLATE], is_active=True
+            ).values_list('name', 'updated_at')
+        )
+        name = notification_type if notification_type in current else DEFAULT_TEMPLATE
+        if name not in current:
+            return None
+
+        with self._lock:
+            entry = self._compiled.get(name)
+        if entry is not None and entry[0] == current[name]:
+            return entry[1]
+
+        template = NotificationTemplate.objects.filter(name=name).first()
+        if template is None:
+            return None
+        try:
+            compiled = CompiledTemplate(template)
+        except TemplateSyntaxError as e:
+            # Remembered as broken until the template is edited, so it isn't reparsed per email
+            logger.error(f"Notification template '{name}' does not compile, using the built-in layout: {str(e)}")
+            compiled = None
+        with self._lock:
+            self._compiled[name] = (template.updated_at, compiled)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._compiled.clear()
+
+
+template_cache = TemplateCache()
+
+
+def _builtin(user, notification):
+    subject, body = notification_email(user, notification.title, notification.message)
+    return RenderedEmail(subject, body, '')
+
+
+def render_many(notification_type, recipients):
+    """Render one email per ``(user, notification)`` pair, all of the same type
+
+    Looks the template up once for the whole list.
+    """
+    compiled = template_cache.get(notification_type)
+    rendered = []
+    for user, notification in recipients:
+        if compiled is None:
+            rendered.append(_builtin(user, notification))
+            continue
+        try:
+            rendered.append(compiled.render(user, notification))
+        except Exception as e:
+            logger.error(f"Rendering notification template '{compiled.name}' failed: {str(e)}")
+            rendered.append(_builtin(user, notification))
+    return rendered
+
+
+def render_notification_emails(notifications):
+    """Render the emails of direct notifications (recipients loaded), in order"""
+    by_type = {}
+    for index, notification in enumerate(notifications):
+        by_type.setdefault(notification.notification_type, []).append(index)
+
+    rendered = [None] * len(notifications)
+    for notification_type, indexes in by_type.items():
+        pairs = [(notifications[i].recipient, notifications[i]) for i in indexes]
+        for i, email in zip(indexes, render_many(notification_type, pairs)):
+            rendered[i] = email
+    return rendered
+
+
+def render_email(user, notification):
+    return render_many(notification.notification_type, [(user, notification)])[0]
@@ -0,0 +1,144 @@
+# notifications/retention.py - Batched purge of old notifications and email records
+"""
+NOTIFICATION_RETENTION_POLICIES lists what is removed and when. Each policy
+names a model, an optional filter (read notifications only, one
+notification type, delivered outbox rows, ...), the date field it ages by,
+how many days rows are kept and whether they are archived first. Policies
+run in order. Email logs come before notifications because deleting a
+notification also deletes its logs.
+
+Each policy runs in primary-key order, a small batch at a time:
+
+* The run is bounded by the first primary key at or after the cutoff date.
+  Ids grow with creation time, so batches never have to scan the recent
+  rows, and rows created during the run are never touched.
+* A batch is one short transaction. It selects up to
+  NOTIFICATION_RETENTION_BATCH_SIZE ids, optionally appends the rows to
+  ``<policy>-<run start>.ndjson.gz`` (beyond_eams/archiving.py), then
+  deletes the id range with the policy's conditions checked again. The job
+  pauses NOTIFICATION_RETENTION_PAUSE_MS between batches so request
+  traffic gets the write lock, which makes it safe to run during the day.
+
+Deletes go through the ORM, so cascades and signals (unread counters)
+still apply. Archiving is at least once: a run killed between writing a
+batch and committing its delete archives those rows again next time. Every
+record carries its id, so duplicates are easy to drop.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from beyond_eams.archiving import append_ndjson_gz
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    def __init__(self, name, model, days, date_field='created_at', filter=None, archive=False):
+        self.name = name
+        self.model = apps.get_model(model)
+        self.days = days
+        self.date_field = date_field
+        self.filter = filter or {}
+        self.archive = archive
+
+    @classmethod
+    def configured(cls):
+        return [cls(**policy) for policy in settings.NOTIFICATION_RETENTION_POLICIES]
+
+    def cutoff(self, now=None):
+        return (now or timezone.now()) - timedelta(days=self.days)
+
+    def expired(self, cutoff):
+        return self.model.objects.filter(**{f'{self.date_field}__lt': cutoff}, **self.filter)
+
+    def pk_bound(self, cutoff):
+        """First primary key created at or after the cutoff; the run stops below it"""
+        return (
+            self.model.objects.filter(**{f'{self.date_field}__gte': cutoff})
+            .order_by('pk').values_list('pk', flat=True).first()
+        )
+
+    def purgeable(self, cutoff):
+        """Expired rows below the pk bound: what a run (or a dry run) removes"""
+        expired = self.expired(cutoff)
+        bound = self.pk_bound(cutoff)
+        return expired if bound is None else expired.filter(pk__lt=bound)
+
+    def archive_fields(self):
+        return [field.attname for field in self.model._meta.concrete_fields]
+
+    def __str__(self):
+        return f"{self.name} ({self.model._meta.label}, {self.days} days{', archived' if self.archive else ''})"
+
+
+class PurgeResult:
+    def __init__(self, policy):
+        self.policy = policy
+        self.deleted = 0
+        self.archived = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.archive_path = None
+
+    @property
+    def rows_per_second(self):
+        return self.deleted / self.seconds if self.seconds else 0.0
+
+
+def purge_policy(policy, now=None, archive_dir=None, batch_size=None, pause_ms=None):
+    """Delete (and optionally archive) one policy's expired rows batch by batch"""
+    now = now or timezone.now()
+    archive_dir = archive_dir or settings.NOTIFICATION_RETENTION_ARCHIVE_DIR
+    batch_size = batch_size or settings.NOTIFICATION_RETENTION_BATCH_SIZE
+    pause_ms = settings.NOTIFICATION_RETENTION_PAUSE_MS if pause_ms is None else pause_ms
+
+    result = PurgeResult(policy)
+    started = time.monotonic()
+    cutoff = policy.cutoff(now)
+    expired = policy.purgeable(cutoff)
+    if policy.archive:
+        os.makedirs(str(archive_dir), exist_ok=True)
+        result.archive_path = os.path.join(str(archive_dir), f"{policy.name}-{now:%Y%m%d-%H%M%S}.ndjson.gz")
+
+    last_pk = None
+    while True:
+        batch = expired if last_pk is None else expired.filter(pk__gt=last_pk)
+        with transaction.atomic():
+            if policy.archive:
+                rows = list(batch.order_by('pk').values(*policy.archive_fields())[:batch_size])
+                ids = [row[policy.model._meta.pk.attname] for row in rows]
+            else:
+                ids = list(batch.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            if policy.archive:
+                append_ndjson_gz(result.archive_path, rows)
+                result.archived += len(rows)
+            # Range delete with the conditions re-checked; rows that changed since the select are kept
+            _, deleted = expired.filter(pk__gte=ids[0], pk__lte=ids[-1]).delete()
+        result.deleted += deleted.get(policy.model._meta.label, 0)
+        result.batches += 1
+        last_pk = ids[-1]
+        if len(ids) < batch_size:
+            break
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+
+    result.seconds = time.monotonic() - started
+    logger.info(
+        f"Retention {policy.name}: deleted {result.deleted} rows in {result.batches} batches "
+        f"({result.rows_per_second:.0f} rows/s)"
+    )
+    return result
+
+
+def purge_expired(policies=None, **options):
+    """Run every policy in order; returns their PurgeResults"""
+    return [purge_policy(policy, **options) for policy in (policies or RetentionPolicy.configured())]
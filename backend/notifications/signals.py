@@ -0,0 +1,42 @@
+# notifications/signals.py - Keep the unread counters and live streams in step with notifications and broadcasts
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .counters import adjust_unread, broadcast_read_changed, broadcasts_changed
+from .live import publish_broadcast, publish_notifications, publish_unread_changed
+from .models import Broadcast, BroadcastRead, BroadcastReadState, Notification
+
+
+@receiver(post_save, sender=Notification)
+def count_new_notification(sender, instance, created, **kwargs):
+    if created and not instance.is_read:
+        adjust_unread({instance.recipient_id: 1})
+        publish_notifications([instance])
+
+
+@receiver(post_delete, sender=Notification)
+def uncount_deleted_notification(sender, instance, **kwargs):
+    if not instance.is_read:
+        adjust_unread({instance.recipient_id: -1})
+
+
+@receiver(post_save, sender=Broadcast)
+def announce_broadcast(sender, instance, created, **kwargs):
+    transaction.on_commit(broadcasts_changed)
+    if created:
+        publish_broadcast(instance)
+
+
+@receiver(post_delete, sender=Broadcast)
+def invalidate_broadcast_counts(sender, instance, **kwargs):
+    transaction.on_commit(broadcasts_changed)
+
+
+@receiver(post_save, sender=BroadcastRead)
+@receiver(post_save, sender=BroadcastReadState)
+def invalidate_user_broadcast_count(sender, instance, **kwargs):
+    def changed():
+        broadcast_read_changed(instance.user_id)
+        publish_unread_changed([instance.user_id])
+    transaction.on_commit(changed)
@@ -1,3 +1,684 @@
-from django.test import TestCase
+import asyncio
+import glob
+import gzip
+import io
+import json
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from beyond_eams import archiving
+from beyond_eams.pubsub import broker
+from . import retention
+from .counters import UNREAD_KEY, mark_notifications_read, reconcile_unread_counters, unread_notification_count
+from .digests import send_digests
+from .fanout import create_notifications, fan_out_notifications
+from .inbox import InvalidCursor, decode_cursor, encode_cursor, inbox_page
+from .jobs import NotificationJobQueue, get_job
+from .live import BROADCAST_TOPIC, USER_TOPIC, notification_events
+from .models import Broadcast, EmailLog, EmailOutbox, Notification, NotificationTemplate, UnreadNotificationCounter
+from .outbox import TokenBucket, claim_batch, deliver_batch, enqueue_email, enqueue_emails, process_outbox, retry_delay
+from .rendering import CompiledTemplate, render_many, template_cache
+
+User = get_user_model()
+
+
+@override_settings(NOTIFICATION_JOBS_ASYNC=False, NOTIFICATION_DIGEST_WINDOW='daily')
+class BroadcastDigestTests(TestCase):
+    def setUp(self):
+        self.coordinator = User.objects.create(username='coordinator', role='coordinator')
+        self.students = [
+            User.objects.create(username=f'student{i}', email=f'student{i}@example.com', role='student')
+            for i in range(3)
+        ]
+        self.instructor = User.objects.create(username='instructor', email='instructor@example.com', role='instructor')
+        self.client = APIClient()
+        self.client.force_authenticate(self.coordinator)
+
+    def _broadcast(self, priority):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('notifications:send_notification'), {
+                'title': 'Library closed',
+                'message': 'The library is closed on Friday.',
+                'priority': priority,
+                'audience': 'role',
+                'audience_value': 'student',
+            }, format='json')
+
+    def _digest_run(self):
+        return send_digests(now=timezone.now() + timedelta(days=1), window='daily')
+
+    def test_low_priority_broadcast_waits_for_the_digest(self):
+        response = self._broadcast('normal')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['email'], 'digest')
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertTrue(Broadcast.objects.get().digest_pending)
+
+        users, items, emails = self._digest_run()
+
+        self.assertEqual((users, items, emails), (3, 3, 3))
+        self.assertEqual(
+            sorted(EmailOutbox.objects.values_list('recipient_email', flat=True)),
+            [student.email for student in self.students],
+        )
+        self.assertIn('Library closed', EmailOutbox.objects.first().body)
+        self.assertFalse(Broadcast.objects.get().digest_pending)
+        self.assertEqual(self._digest_run(), (0, 0, 0))
+
+    def test_broadcast_shares_a_digest_with_pending_notifications(self):
+        Notification.objects.create(
+            recipient=self.students[0], title='Enrollment confirmed', message='See you there.', digest_pending=True,
+        )
+        self._broadcast('low')
+
+        self._digest_run()
+
+        body = EmailOutbox.objects.get(recipient_email=self.students[0].email).body
+        self.assertIn('Enrollment confirmed', body)
+        self.assertIn('Library closed', body)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_notifications_alone_are_digested_per_recipient(self):
+        for title in ('First', 'Second'):
+            Notification.objects.create(recipient=self.students[1], title=title, message='-', digest_pending=True)
+
+        self.assertEqual(self._digest_run(), (1, 2, 1))
+        self.assertFalse(Notification.objects.filter(digest_pending=True).exists())
+        self.assertEqual(Notification.objects.filter(digest_email__isnull=False).count(), 2)
+
+    def test_users_who_joined_later_are_left_out(self):
+        self._broadcast('normal')
+        User.objects.filter(pk=self.students[2].pk).update(date_joined=timezone.now() + timedelta(hours=1))
+
+        self._digest_run()
+
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW=None)
+    def test_without_a_digest_window_every_broadcast_is_emailed_right_away(self):
+        response = self._broadcast('low')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+
+    def test_high_priority_broadcast_is_emailed_right_away(self):
+        response = self._broadcast('high')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(EmailOutbox.objects.count(), 3)
+        self.assertFalse(Broadcast.objects.get().digest_pending)
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """locmem backend whose first ``failures`` sends raise, like a dropped SMTP session"""
+
+    def __init__(self, failures=0, **kwargs):
+        super().__init__(**kwargs)
+        self.failures = failures
+        self.opened = 0
+
+    def open(self):
+        self.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+class SilentBackend(locmem.EmailBackend):
+    """Reports every message as not sent without raising"""
+
+    def send_messages(self, messages):
+        return 0
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_BASE_SECONDS=60, EMAIL_OUTBOX_RETRY_MAX_SECONDS=300)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        # No pacing; the token bucket has its own arithmetic and would only make the tests sleep
+        self.bucket = TokenBucket(0, 1)
+
+    def _queue(self, count, **fields):
+        return enqueue_emails([
+            {'recipient_email': f'user{i}@example.com', 'subject': f'Message {i}', 'body': 'Hello', **fields}
+            for i in range(count)
+        ])
+
+    def test_claim_batch_takes_due_rows_once(self):
+        due = self._queue(2)
+        later = enqueue_email('later@example.com', 'Later', 'Hello')
+        EmailOutbox.objects.filter(pk=later.pk).update(next_attempt_at=timezone.now() + timedelta(minutes=5))
+
+        claimed = claim_batch('worker-a')
+
+        self.assertEqual([row.pk for row in claimed], [row.pk for row in due])
+        self.assertTrue(all(row.status == 'sending' and row.claimed_by == 'worker-a' for row in claimed))
+        self.assertEqual(claim_batch('worker-b'), [])
+
+    def test_claims_of_a_crashed_worker_expire(self):
+        self._queue(1)
+        claim_batch('crashed', now=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(len(claim_batch('worker-b')), 1)
+
+    def test_process_outbox_delivers_everything_due(self):
+        recipient = User.objects.create(username='reader', email='reader@example.com')
+        notification = Notification.objects.create(recipient=recipient, title='Hi', message='Hello')
+        enqueue_email(recipient.email, 'Hi', 'Hello', html_body='<p>Hello</p>', notification=notification)
+        self._queue(4)
+
+        self.assertEqual(process_outbox(batch_size=2, bucket=self.bucket), (5, 0))
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives[0][0], '<p>Hello</p>')
+        self.assertFalse(EmailOutbox.objects.exclude(status='sent').exists())
+        self.assertEqual(EmailLog.objects.filter(sent_successfully=True).count(), 5)
+        notification.refresh_from_db()
+        self.assertTrue(notification.email_sent)
+
+    def test_batch_outcomes_are_written_in_bulk(self):
+        rows = self._queue(5)
+        claimed = claim_batch('worker-a')
+
+        with CaptureQueriesContext(connection) as queries:
+            deliver_batch(claimed, self.bucket, connection=FlakyBackend())
+
+        log_inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "notifications_emaillog"')]
+        self.assertEqual(len(log_inserts), 1)
+        self.assertEqual(EmailLog.objects.count(), len(rows))
+
+    def test_a_dropped_connection_is_reopened_and_the_message_retried_later(self):
+        first, second = self._queue(2)
+        backend = FlakyBackend(failures=1)
+        started = timezone.now()
+
+        self.assertEqual(deliver_batch(claim_batch('worker-a'), self.bucket, connection=backend), (1, 1))
+
+        self.assertEqual(backend.opened, 2)
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.claimed_by), ('pending', 1, ''))
+        self.assertIn('Connection unexpectedly closed', first.last_error)
+        self.assertGreaterEqual(first.next_attempt_at, started + timedelta(seconds=60))
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'sent')
+        self.assertEqual(
+            list(EmailLog.objects.order_by('id').values_list('sent_successfully', flat=True)), [False, True]
+        )
+        # Not due yet
+        self.assertEqual(claim_batch('worker-a'), [])
+
+    def test_backoff_doubles_up_to_the_maximum(self):
+        self.assertEqual(
+            [retry_delay(attempts).total_seconds() for attempts in range(1, 6)],
+            [60, 120, 240, 300, 300],
+        )
+
+    def test_gives_up_after_max_attempts(self):
+        row = self._queue(1)[0]
+        with self.assertLogs('notifications.outbox', 'ERROR'):
+            for _ in range(3):
+                EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+                deliver_batch(claim_batch('worker-a'), self.bucket, connection=FlakyBackend(failures=1))
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('failed', 3))
+        self.assertEqual(EmailLog.objects.filter(sent_successfully=False).count(), 3)
+        EmailOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(claim_batch('worker-a'), [])
+
+    def test_backend_reporting_nothing_sent_counts_as_a_failure(self):
+        row = self._queue(1)[0]
+
+        self.assertEqual(deliver_batch(claim_batch('worker-a'), self.bucket, connection=SilentBackend()), (0, 1))
+
+        row.refresh_from_db()
+        self.assertEqual((row.status, row.attempts), ('pending', 1))
+        self.assertEqual(row.last_error, 'Email backend reported the message as not sent')
+
+
+class InboxPaginationTests(TestCase):
+    def setUp(self):
+        self.tied = timezone.now() - timedelta(hours=1)
+        self.user = User.objects.create(
+            username='reader', role='student', date_joined=self.tied - timedelta(days=1),
+        )
+        # Direct and broadcast items sharing one timestamp, with a few older and newer ones around them
+        for offset in (0, 0, 0, 0, -5, 5):
+            Notification.objects.filter(
+                pk=Notification.objects.create(recipient=self.user, title='direct', message='-').pk
+            ).update(created_at=self.tied + timedelta(minutes=offset))
+        for offset in (0, 0, 0, -5):
+            Broadcast.objects.filter(
+                pk=Broadcast.objects.create(title='broadcast', message='-').pk
+            ).update(created_at=self.tied + timedelta(minutes=offset))
+
+    def _expected(self):
+        items = [('direct', pk, created_at) for pk, created_at in Notification.objects.values_list('pk', 'created_at')]
+        items += [('broadcast', pk, created_at) for pk, created_at in Broadcast.objects.values_list('pk', 'created_at')]
+        rank = {'direct': 1, 'broadcast': 0}
+        items.sort(key=lambda item: (item[2], rank[item[0]], item[1]), reverse=True)
+        return [(source, pk) for source, pk, _ in items]
+
+    def test_every_item_appears_exactly_once_across_pages(self):
+        for limit in (1, 2, 3, 4):
+            with self.subTest(limit=limit):
+                seen = []
+                cursor = None
+                while True:
+                    items, next_cursor = inbox_page(self.user, limit, cursor and decode_cursor(cursor))
+                    seen += [(item['source'], item['id']) for item in items]
+                    if next_cursor is None:
+                        break
+                    cursor = next_cursor
+
+                self.assertEqual(seen, self._expected())
+
+    def _page_through(self, url, limit):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        seen = []
+        params = {'limit': limit}
+        while True:
+            response = client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            seen += response.json()['notifications']
+            if not response.data['has_more']:
+                return seen
+            params['cursor'] = response.data['next_cursor']
+
+    def test_view_pages_through_with_next_cursor(self):
+        items = self._page_through(reverse('notifications:notification_inbox'), 3)
+
+        self.assertEqual([(item['source'], item['id']) for item in items], self._expected())
+
+    def test_legacy_list_is_paged_like_the_inbox(self):
+        legacy = self._page_through(reverse('notifications:get_notifications'), 3)
+
+        self.assertEqual([(item['source'], item['id']) for item in legacy], self._expected())
+        self.assertEqual(legacy, self._page_through(reverse('notifications:notification_inbox'), 50))
+
+    @override_settings(NOTIFICATION_INBOX_PAGE_SIZE=4)
+    def test_legacy_list_returns_one_page_by_default(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get(reverse('notifications:get_notifications'))
+
+        self.assertEqual(len(response.data['notifications']), 4)
+        self.assertTrue(response.data['has_more'])
+        self.assertEqual(response.data['unread_count'], 10)
+
+    def test_invalid_cursors_are_rejected(self):
+        valid = encode_cursor({'created_at': self.tied, 'source': 'direct', 'id': 1})
+        self.assertEqual(decode_cursor(valid), (self.tied, 'direct', 1))
+
+        for cursor in ('not-a-cursor', valid[:-3], encode_cursor({'created_at': self.tied, 'source': 'email', 'id': 1})):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(reverse('notifications:notification_inbox'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(NOTIFICATION_UNREAD_COUNTER_DURABLE=True)
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='reader', role='student')
+        self.other = User.objects.create(username='other', role='student')
+        # Warm both counters (zero) so every change below has something to adjust
+        for user in (self.user, self.other):
+            unread_notification_count(user)
+
+    def _counters(self, user):
+        """``(cached, durable)`` unread count of ``user``'s direct notifications"""
+        return (
+            cache.get(UNREAD_KEY.format(user.id)),
+            UnreadNotificationCounter.objects.get(user=user).unread,
+        )
+
+    def _notify(self, user, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(recipient=user, title='Hi', message='Hello', **fields)
+
+    def test_new_notification_is_counted_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Notification.objects.create(recipient=self.user, title='Hi', message='Hello')
+            self.assertEqual(self._counters(self.user), (0, 0))
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(self._counters(self.user), (1, 1))
+        self._notify(self.user, is_read=True)
+        self.assertEqual(self._counters(self.user), (1, 1))
+
+    def test_fan_out_counts_every_recipient(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notifications([self.user, self.other], title='Hi', message='Hello')
+
+        self.assertEqual(self._counters(self.user), (1, 1))
+        self.assertEqual(self._counters(self.other), (1, 1))
+
+    def test_mark_as_read_decrements_once(self):
+        notification = self._notify(self.user)
+        self._notify(self.user)
+
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.get(pk=notification.pk).mark_as_read()
+
+        self.assertEqual(self._counters(self.user), (1, 1))
+
+    def test_mark_all_read_resets_to_zero(self):
+        for _ in range(3):
+            self._notify(self.user)
+        self._notify(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_notifications_read(self.user), 3)
+
+        self.assertEqual(self._counters(self.user), (0, 0))
+        self.assertEqual(self._counters(self.other), (1, 1))
+
+    def test_deleting_only_unread_notifications_decrements(self):
+        unread = self._notify(self.user)
+        read = self._notify(self.user, is_read=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            read.delete()
+        self.assertEqual(self._counters(self.user), (1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            unread.delete()
+        self.assertEqual(self._counters(self.user), (0, 0))
+
+    def test_reconcile_repairs_drifted_counters(self):
+        for _ in range(2):
+            self._notify(self.user)
+        # Changes behind the hooks: a bulk update and a stale cache value
+        Notification.objects.filter(recipient=self.user).update(is_read=True)
+        cache.set(UNREAD_KEY.format(self.other.id), 7)
+
+        checked, repaired = reconcile_unread_counters(User.objects.all())
+
+        self.assertEqual((checked, repaired), (2, 2))
+        self.assertEqual(self._counters(self.user), (0, 0))
+        self.assertEqual(self._counters(self.other), (0, 0))
+        self.assertEqual(reconcile_unread_counters(User.objects.all()), (2, 0))
+
+    def test_warm_poll_runs_no_queries(self):
+        self._notify(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Broadcast.objects.create(title='All hands', message='-')
+        self.assertEqual(unread_notification_count(self.user), 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_notification_count(self.user), 2)
+
+    def test_cold_poll_reads_the_durable_counter(self):
+        self._notify(self.user)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread_notification_count(self.user), 1)
+
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertIn(UnreadNotificationCounter._meta.db_table, tables)
+        self.assertNotIn(f'"{Notification._meta.db_table}"', tables)
+
+
+OLD_NOTIFICATIONS = {'name': 'old-notifications', 'model': 'notifications.Notification', 'days': 365, 'archive': True}
+
+
+@override_settings(NOTIFICATION_RETENTION_POLICIES=[OLD_NOTIFICATIONS])
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        self.user = User.objects.create(username='keeper', role='student')
+        self.policy = retention.RetentionPolicy(**OLD_NOTIFICATIONS)
+        self.old_ids = [self._notification(days_ago=400).pk for _ in range(5)]
+        self.recent = self._notification(days_ago=0)
+
+    def _notification(self, days_ago):
+        notification = Notification.objects.create(recipient=self.user, title='Hi', message='Hello')
+        Notification.objects.filter(pk=notification.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return notification
+
+    def _purge(self, **options):
+        return retention.purge_policy(self.policy, archive_dir=self.archive_dir, batch_size=2, pause_ms=0, **options)
+
+    def _archived_ids(self):
+        ids = []
+        for path in sorted(glob.glob(os.path.join(self.archive_dir, '*.ndjson.gz'))):
+            with gzip.open(path, 'rt', encoding='utf-8') as archive:
+                ids += [json.loads(line)['id'] for line in archive]
+        return ids
+
+    def test_archives_exactly_the_deleted_rows(self):
+        result = self._purge()
+
+        self.assertEqual((result.deleted, result.archived, result.batches), (5, 5, 3))
+        self.assertEqual(self._archived_ids(), self.old_ids)
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [self.recent.pk])
+
+    def test_rerun_after_an_interrupted_batch_finishes_the_job(self):
+        writes = []
+
+        def crash_after_second_write(path, records):
+            size = archiving.append_ndjson_gz(path, records)
+            writes.append(records)
+            if len(writes) == 2:
+                raise RuntimeError('killed before the delete committed')
+            return size
+
+        with mock.patch.object(retention, 'append_ndjson_gz', crash_after_second_write):
+            with self.assertRaises(RuntimeError):
+                self._purge()
+        self.assertEqual(Notification.objects.filter(pk__in=self.old_ids).count(), 3)
+
+        self._purge(now=timezone.now() + timedelta(seconds=1))
+
+        self.assertFalse(Notification.objects.filter(pk__in=self.old_ids).exists())
+        # At least once: only the batch in flight is archived twice
+        archived = self._archived_ids()
+        self.assertEqual(sorted(set(archived)), self.old_ids)
+        self.assertEqual(sorted(archived), sorted(self.old_ids + self.old_ids[2:4]))
+
+    def test_dry_run_deletes_nothing_and_counts_what_a_run_would(self):
+        # Backdated after the recent row, so its id is above the run's pk bound
+        self._notification(days_ago=400)
+        out = io.StringIO()
+
+        call_command('purge_notifications', dry_run=True, archive_dir=self.archive_dir, stdout=out)
+
+        self.assertIn('Would delete 5 rows', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 7)
+        self.assertEqual(self._archived_ids(), [])
+        self.assertEqual(self._purge().deleted, 5)
+
+
+@override_settings(NOTIFICATION_JOBS_ASYNC=False, NOTIFICATION_FANOUT_CHUNK_SIZE=2, EMAIL_OUTBOX_RATE_PER_SECOND=0)
+class FanOutJobTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.coordinator = User.objects.create(username='coordinator', role='coordinator')
+        self.students = [
+            User.objects.create(username=f'student{i}', email=f'student{i}@example.com', role='student')
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.coordinator)
+
+    def test_fan_out_notifies_every_recipient_in_chunks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('notifications:send_notification'), {
+                'title': 'Room change',
+                'message': 'We moved to Hall B.',
+                'priority': 'high',
+                'recipient_ids': [student.id for student in self.students],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 202)
+        job = self.client.get(response.data['status_url']).data['job']
+        self.assertEqual(job['status'], 'completed')
+        self.assertEqual(
+            (job['recipients'], job['notifications_created'], job['emails_queued']), (5, 5, 5)
+        )
+        self.assertEqual(Notification.objects.filter(title='Room change').count(), 5)
+        self.assertEqual(EmailOutbox.objects.count(), 5)
+        self.assertEqual(unread_notification_count(self.students[0]), 1)
+
+    def test_failing_job_is_reported(self):
+        def broken(progress):
+            raise RuntimeError('template missing')
+
+        job = NotificationJobQueue().submit('broken', broken, created_by=self.coordinator.id)
+
+        self.assertEqual(get_job(job['id'])['status'], 'failed')
+        self.assertEqual(get_job(job['id'])['error'], 'template missing')
+
+    @override_settings(NOTIFICATION_JOBS_ASYNC=True)
+    def test_jobs_left_queued_at_shutdown_are_marked_failed(self):
+        jobs = NotificationJobQueue()
+        running, release = threading.Event(), threading.Event()
+
+        def slow(progress):
+            running.set()
+            release.wait(5)
+
+        first = jobs.submit('slow', slow)
+        self.assertTrue(running.wait(5))
+        second = jobs.submit('slow', slow)
+
+        jobs.shutdown(timeout=0.05)
+        release.set()
+
+        self.assertEqual(get_job(second['id'])['status'], 'failed')
+        self.assertEqual(get_job(second['id'])['error'], 'Stopped before the job ran')
+        self.assertEqual(get_job(first['id'])['status'], 'running')
+
+
+@override_settings(NOTIFICATION_JOBS_ASYNC=True, NOTIFICATION_FANOUT_CHUNK_SIZE=2)
+class BackgroundFanOutTests(TransactionTestCase):
+    def test_worker_runs_queued_fan_out_jobs(self):
+        cache.clear()
+        for i in range(3):
+            User.objects.create(username=f'student{i}', role='student')
+        jobs = NotificationJobQueue()
+
+        job = jobs.submit(
+            'send_notification',
+            fan_out_notifications,
+            recipients=User.objects.filter(role='student'),
+            fields={'title': 'Reminder', 'message': 'Bring your ID.'},
+            send_email=False,
+        )
+        jobs.shutdown()
+
+        status = get_job(job['id'])
+        self.assertEqual(status['status'], 'completed')
+        self.assertEqual(status['notifications_created'], 3)
+        self.assertEqual(Notification.objects.filter(title='Reminder').count(), 3)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='watcher', role='student')
+        self.topic = USER_TOPIC.format(self.user.id)
+
+    def _notify(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.objects.create(recipient=self.user, title='Room change', message='Hall B')
+
+    def test_stream_pushes_new_notifications_and_unsubscribes_on_disconnect(self):
+        async def scenario():
+            events = notification_events(self.user)
+            opening = await asyncio.wait_for(events.__anext__(), 5)
+            await sync_to_async(self._notify)()
+            pushed = await asyncio.wait_for(events.__anext__(), 5)
+            subscribed = broker.subscriber_count(self.topic), broker.subscriber_count(BROADCAST_TOPIC)
+            # The ASGI handler closes the generator when the client goes away
+            await events.aclose()
+            return opening, pushed, subscribed
+
+        opening, pushed, subscribed = async_to_sync(scenario)()
+
+        self.assertIn('event: unread', opening)
+        self.assertIn('"unread_count":0', opening)
+        self.assertIn('event: notification', pushed)
+        self.assertIn('Room change', pushed)
+        self.assertIn('"unread_count":1', pushed)
+        self.assertEqual(subscribed, (1, 1))
+        self.assertEqual(broker.subscriber_count(self.topic), 0)
+        self.assertEqual(broker.subscriber_count(BROADCAST_TOPIC), 0)
+
+
+class TemplateRenderingTests(TestCase):
+    def setUp(self):
+        template_cache.clear()
+        self.addCleanup(template_cache.clear)
+        self.template = NotificationTemplate.objects.create(
+            name='activity',
+            subject='{{ notification.title }} for {{ user.first_name }}',
+            email_template='<p>Hi {{ user.first_name }},</p><p>{{ notification.message }}</p>',
+        )
+        self.users = [
+            User.objects.create(username=f'student{i}', first_name=f'Ada{i}', role='student') for i in range(3)
+        ]
+        self.notification = Notification(title='Room change', message='Hall B & C', notification_type='activity')
+
+    def _render(self, notification_type='activity'):
+        return render_many(notification_type, [(user, self.notification) for user in self.users])
+
+    def test_template_is_compiled_once_and_checked_with_one_query(self):
+        with mock.patch('notifications.rendering.CompiledTemplate', wraps=CompiledTemplate) as compile_template:
+            first = self._render()
+            with self.assertNumQueries(1):
+                again = self._render()
+
+        self.assertEqual(compile_template.call_count, 1)
+        self.assertEqual(first, again)
+        self.assertEqual(first[0].subject, 'Room change for Ada0')
+        self.assertEqual(first[0].html_body, '<p>Hi Ada0,</p><p>Hall B &amp; C</p>')
+        self.assertEqual(first[2].body, 'Hi Ada2,Hall B & C\n')
+
+    def test_edited_template_is_recompiled(self):
+        self._render()
+        self.template.subject = 'Update: {{ notification.title }}'
+        self.template.save()
+
+        self.assertEqual(self._render()[0].subject, 'Update: Room change')
+
+    def test_default_template_then_built_in_layout(self):
+        NotificationTemplate.objects.create(name='default', subject='[Default] {{ notification.title }}', email_template='-')
+
+        self.assertEqual(self._render('reminder')[0].subject, '[Default] Room change')
+        NotificationTemplate.objects.update(is_active=False)
+        self.assertNotIn('[Default]', self._render('reminder')[0].subject)
+        self.assertEqual(self._render('reminder')[0].html_body, '')
@@ -8,11 +8,15 @@ urlpatterns = [
     # User notification endpoints
     path('', views.get_user_notifications, name='get_notifications'),
     path('count/', views.get_notification_count, name='notification_count'),
+    path('inbox/', views.get_notification_inbox, name='notification_inbox'),
+    path('stream/', views.notification_stream, name='notification_stream'),
     path('<int:notification_id>/read/', views.mark_notification_read, name='mark_read'),
+    path('broadcasts/<int:broadcast_id>/read/', views.mark_broadcast_read_view, name='mark_broadcast_read'),
     
     # Admin notification endpoints
     path('send/', views.send_notification, name='send_notification'),
     path('send-activity/', views.send_activity_notification, name='send_activity_notification'),
+    path('jobs/<str:job_id>/', views.get_notification_job, name='notification_job'),
     
     # Email testing
     path('test-email/', views.test_email, name='test_email'),
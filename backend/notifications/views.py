@@ -4,46 +4,45 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth import get_user_model
-from .models import Notification, NotificationTemplate, EmailLog
-from django.core.mail import send_mail
+from .models import Broadcast, Notification, NotificationTemplate
 from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
 from django.utils import timezone
 import logging
 
+from beyond_eams.sse import authenticate_stream_request, event_stream_response, is_asgi_request
+from .broadcasts import (
+    audience_users, mark_all_broadcasts_read, mark_broadcast_read, visible_broadcasts,
+)
+from .counters import mark_notifications_read, unread_notification_count
+from .digests import uses_digest
+from .fanout import fan_out_notifications, queue_broadcast_emails
+from .inbox import InvalidCursor, decode_cursor, inbox_page
+from .jobs import get_job, notification_jobs
+from .live import notification_events
+from .outbox import send_now
+
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_notifications(request):
-    """Get notifications for the current user"""
+    """Get notifications for the current user (direct and broadcast, newest first)
+    
+    Paged like the inbox: the first NOTIFICATION_INBOX_PAGE_SIZE items, then
+    ``?cursor=<next_cursor>`` for the rest. ``mark_read=true`` marks
+    everything read first.
+    """
     try:
-        user = request.user
-        notifications = Notification.objects.filter(recipient=user)
-        
         # Mark notifications as read if requested
         mark_read = request.GET.get('mark_read', 'false').lower() == 'true'
         if mark_read:
-            notifications.filter(is_read=False).update(is_read=True)
-        
-        notifications_data = []
-        for notification in notifications:
-            notifications_data.append({
-                'id': notification.id,
-                'title': notification.title,
-                'message': notification.message,
-                'type': notification.notification_type,
-                'priority': notification.priority,
-                'is_read': notification.is_read,
-                'created_at': notification.created_at.isoformat(),
-                'related_activity_id': notification.related_activity.id if notification.related_activity else None,
-            })
+            mark_notifications_read(request.user)
+            mark_all_broadcasts_read(request.user)
         
-        return Response({
-            'success': True,
-            'notifications': notifications_data,
-            'unread_count': notifications.filter(is_read=False).count(),
-        })
+        return _inbox_response(request)
         
     except Exception as e:
         logger.error(f"Error getting user notifications: {str(e)}")
@@ -52,6 +51,71 @@ def get_user_notifications(request):
             'error': f'Failed to get notifications: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _inbox_response(request):
+    """One page of the merged inbox for ``request.user``, from the query params"""
+    try:
+        limit = min(int(request.GET.get('limit', settings.NOTIFICATION_INBOX_PAGE_SIZE)),
+                    settings.NOTIFICATION_INBOX_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError
+    except (TypeError, ValueError):
+        return Response({
+            'success': False,
+            'error': 'limit must be a positive integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except InvalidCursor as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    filters = {
+        'type': request.GET.get('type'),
+        'priority': request.GET.get('priority'),
+        'unread': request.GET.get('unread', 'false').lower() == 'true',
+    }
+    items, next_cursor = inbox_page(request.user, limit, cursor, filters)
+    
+    return Response({
+        'success': True,
+        'notifications': items,
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+        'unread_count': unread_notification_count(request.user),
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_notification_inbox(request):
+    """Cursor-paginated inbox (direct and broadcast notifications, newest first)
+    
+    Query params: ``cursor`` (from the previous page's next_cursor), ``limit``,
+    ``type``, ``priority`` and ``unread=true``.
+    """
+    return _inbox_response(request)
+
+async def notification_stream(request):
+    """Server-Sent Events: new notifications and unread count changes for the current user
+    
+    Replaces polling count/ and the list: the stream opens with an ``unread``
+    event, then sends ``notification`` events (new items plus the count),
+    ``unread`` events when the count drops, and ``resync`` when the client
+    should reload its inbox. Authenticates like the other streams (JWT in the
+    Authorization header or ``?token=``). Served by the ASGI app; under WSGI
+    it sends the count once and closes, which clients treat as a poll.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    user = await authenticate_stream_request(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return event_stream_response(notification_events(user, stream=is_asgi_request(request)))
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, notification_id):
@@ -79,6 +143,24 @@ def mark_notification_read(request, notification_id):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_broadcast_read_view(request, broadcast_id):
+    """Mark a broadcast notification as read for the current user"""
+    broadcast = visible_broadcasts(request.user).filter(id=broadcast_id).first()
+    if broadcast is None:
+        return Response({
+            'success': False,
+            'error': 'Notification not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if not broadcast.is_read:
+        mark_broadcast_read(request.user, broadcast)
+    return Response({
+        'success': True,
+        'message': 'Notification marked as read'
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def send_notification(request):
@@ -104,36 +186,35 @@ def send_notification(request):
                 'error': 'Title and message are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # If no specific recipients, send to all users
+        # Without specific recipients the message is stored once as a
+        # broadcast to an audience (everyone unless a role/department is given)
         if not recipient_ids:
-            recipients = User.objects.filter(is_active=True)
-        else:
-            recipients = User.objects.filter(id__in=recipient_ids, is_active=True)
+            return _send_broadcast(request, title, message, notification_type, priority, send_email)
         
-        notifications_created = 0
-        emails_sent = 0
+        recipients = User.objects.filter(id__in=recipient_ids, is_active=True)
         
-        for recipient in recipients:
-            # Create notification
-            notification = Notification.objects.create(
-                recipient=recipient,
-                title=title,
-                message=message,
-                notification_type=notification_type,
-                priority=priority,
-            )
-            notifications_created += 1
-            
-            # Send email if requested
-            if send_email and notification.send_email():
-                emails_sent += 1
+        # Fan-out and email run in the background; the client polls the job
+        job = notification_jobs.submit(
+            'send_notification',
+            fan_out_notifications,
+            created_by=request.user.id,
+            recipients=recipients,
+            fields={
+                'title': title,
+                'message': message,
+                'notification_type': notification_type,
+                'priority': priority,
+            },
+            send_email=send_email,
+        )
         
         return Response({
             'success': True,
-            'message': f'Notifications sent successfully',
-            'notifications_created': notifications_created,
-            'emails_sent': emails_sent,
-        })
+            'message': 'Notifications queued',
+            'job_id': job['id'],
+            'job_status': job['status'],
+            'status_url': reverse('notifications:notification_job', args=[job['id']]),
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Error sending notifications: {str(e)}")
@@ -142,12 +223,79 @@ def send_notification(request):
             'error': f'Failed to send notifications: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def _send_broadcast(request, title, message, notification_type, priority, send_email):
+    audience = request.data.get('audience', 'all')
+    audience_value = request.data.get('audience_value', '') or ''
+    if audience not in dict(Broadcast.AUDIENCE_CHOICES):
+        return Response({
+            'success': False,
+            'error': 'Audience must be one of: all, role, department'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if audience != 'all' and not audience_value:
+        return Response({
+            'success': False,
+            'error': f'audience_value is required for a {audience} audience'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Low-priority broadcasts are emailed in the audience's next digest instead
+    digest = bool(send_email) and uses_digest(priority)
+    broadcast = Broadcast.objects.create(
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        priority=priority,
+        audience=audience,
+        audience_value=audience_value if audience != 'all' else '',
+        created_by=request.user,
+        digest_pending=digest,
+    )
+    data = {
+        'success': True,
+        'message': 'Broadcast sent successfully',
+        'broadcast_id': broadcast.id,
+    }
+    if digest:
+        data['email'] = 'digest'
+    if not send_email or digest:
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    # Only the emails are per user; they are queued in the background
+    job = notification_jobs.submit(
+        'broadcast_emails',
+        queue_broadcast_emails,
+        created_by=request.user.id,
+        broadcast=broadcast,
+        recipients=audience_users(broadcast, User.objects.filter(is_active=True)),
+    )
+    data.update({
+        'job_id': job['id'],
+        'job_status': job['status'],
+        'status_url': reverse('notifications:notification_job', args=[job['id']]),
+    })
+    return Response(data, status=status.HTTP_202_ACCEPTED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_notification_job(request, job_id):
+    """Progress of a queued notification fan-out job"""
+    job = get_job(job_id)
+    if job is None or (job['created_by'] != request.user.id and not request.user.is_staff):
+        return Response({
+            'success': False,
+            'error': 'Job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'job': job,
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def send_activity_notification(request):
     """Send notification about activity to enrolled users"""
     try:
-        from activities.models import Activity, ActivityEnrollment
+        from activities.models import Activity
         
         activity_id = request.data.get('activity_id')
         title = request.data.get('title')
@@ -169,32 +317,32 @@ def send_activity_notification(request):
             }, status=status.HTTP_404_NOT_FOUND)
         
         # Get enrolled users
-        enrollments = ActivityEnrollment.objects.filter(activity=activity)
-        
-        notifications_created = 0
-        emails_sent = 0
+        recipients = User.objects.filter(
+            user_enrollments__activity=activity,
+            user_enrollments__status__in=['enrolled', 'completed'],
+        )
         
-        for enrollment in enrollments:
-            # Create notification
-            notification = Notification.objects.create(
-                recipient=enrollment.user,
-                title=title,
-                message=message,
-                notification_type='activity',
-                related_activity=activity,
-            )
-            notifications_created += 1
-            
-            # Send email if requested
-            if send_email and notification.send_email():
-                emails_sent += 1
+        job = notification_jobs.submit(
+            'send_activity_notification',
+            fan_out_notifications,
+            created_by=request.user.id,
+            recipients=recipients,
+            fields={
+                'title': title,
+                'message': message,
+                'notification_type': 'activity',
+                'related_activity': activity,
+            },
+            send_email=send_email,
+        )
         
         return Response({
             'success': True,
-            'message': f'Activity notifications sent successfully',
-            'notifications_created': notifications_created,
-            'emails_sent': emails_sent,
-        })
+            'message': 'Activity notifications queued',
+            'job_id': job['id'],
+            'job_status': job['status'],
+            'status_url': reverse('notifications:notification_job', args=[job['id']]),
+        }, status=status.HTTP_202_ACCEPTED)
         
     except Exception as e:
         logger.error(f"Error sending activity notifications: {str(e)}")
@@ -206,16 +354,15 @@ def send_activity_notification(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_notification_count(request):
-    """Get unread notification count for the current user"""
+    """Get unread notification count for the current user
+    
+    Polled on a timer, so it reads the write-maintained counters (counters.py)
+    instead of counting the notifications table.
+    """
     try:
-        unread_count = Notification.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).count()
-        
         return Response({
             'success': True,
-            'unread_count': unread_count,
+            'unread_count': unread_notification_count(request.user),
         })
         
     except Exception as e:
@@ -249,23 +396,10 @@ Best regards,
 Beyond EAMS Team
         """
         
-        success = send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient_email],
-            fail_silently=False,
-        )
-        
-        # Log the email attempt
-        EmailLog.objects.create(
-            recipient_email=recipient_email,
-            subject=subject,
-            message=message,
-            sent_successfully=success,
-        )
+        # Goes through the outbox so the attempt is logged and a failure is retried
+        outbox_email = send_now(recipient_email, subject, message)
         
-        if success:
+        if outbox_email.status == 'sent':
             return Response({
                 'success': True,
                 'message': f'Test email sent successfully to {recipient_email}',
@@ -273,21 +407,13 @@ Beyond EAMS Team
         else:
             return Response({
                 'success': False,
-                'error': 'Failed to send test email',
+                'error': f'Failed to send test email: {outbox_email.last_error}',
+                'retry_at': outbox_email.next_attempt_at if outbox_email.status == 'pending' else None,
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
     except Exception as e:
         logger.error(f"Error sending test email: {str(e)}")
         
-        # Log the failed attempt
-        EmailLog.objects.create(
-            recipient_email=request.data.get('email', request.user.email),
-            subject="Beyond EAMS Email Test",
-            message="Test email",
-            sent_successfully=False,
-            error_message=str(e),
-        )
-        
         return Response({
             'success': False,
             'error': f'Failed to send test email: {str(e)}'